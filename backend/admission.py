@@ -0,0 +1,208 @@
+# admission.py
+#
+# Admission control in front of the API, as a plain ASGI middleware:
+#
+# - Token buckets per client IP and route rule. A rule is a path prefix
+#   with a refill rate and a burst ("/api/terminal=10:30" allows bursts of
+#   30 commands, then 10 a second); the longest matching prefix applies and
+#   unmatched paths are not limited. A client that runs dry gets a 429 with
+#   Retry-After set to when its next token arrives.
+#
+# - A global concurrency limit. Past max_inflight requests being served,
+#   newcomers wait in a short queue; when the queue is full, or a request
+#   has waited queue_timeout without getting in, it gets a 503 right away.
+#   Under overload clients see fast refusals instead of latency that grows
+#   without bound.
+#
+# Both run on the event loop, so the state needs no locks. Limits are per
+# worker process: with gunicorn, a client may get up to WEB_CONCURRENCY
+# times the configured rate. Long-lived streams (exempt prefixes) and
+# WebSockets are neither rate limited nor counted against the limit;
+# unlimited prefixes skip the buckets but still take a serving slot.
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+# Buckets are kept for this many (rule, client) pairs, least recently used first out
+MAX_BUCKETS = 10000
+
+
+class Rate:
+    __slots__ = ("per_second", "burst")
+
+    def __init__(self, per_second: float, burst: float):
+        self.per_second = per_second
+        self.burst = burst
+
+    @classmethod
+    def parse(cls, text: str) -> "Rate":
+        """"10:30" (tokens per second, then burst); the burst defaults to one second's worth."""
+        rate, _, burst = text.partition(":")
+        return cls(float(rate), float(burst) if burst else max(1.0, float(rate)))
+
+    def to_dict(self) -> dict:
+        return {"per_second": self.per_second, "burst": self.burst}
+
+
+def parse_rates(spec: str) -> Dict[str, Rate]:
+    """"/api/terminal=10:30,/api/files=50:100" -> {path prefix: Rate}; "" or "off" disables limiting."""
+    if spec.strip().lower() == "off":
+        return {}
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        prefix, _, rate = item.partition("=")
+        rates["/" + prefix.strip().strip("/")] = Rate.parse(rate)
+    return rates
+
+
+class AdmissionControl:
+    def __init__(self, rates: Dict[str, Rate], max_inflight: int = 64, max_queue: int = 64,
+                 queue_timeout: float = 0.25, exempt: Iterable[str] = (), unlimited: Iterable[str] = (),
+                 trust_proxy: bool = False):
+        # Longest prefix first, so the most specific rule wins
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.exempt = tuple(exempt)
+        self.unlimited = tuple(unlimited)
+        self.trust_proxy = trust_proxy
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()  # (rule, ip) -> [tokens, stamp]
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_in_flight = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rate_limited: Dict[str, int] = {prefix: 0 for prefix, _ in self.rates}
+        self.shed = 0
+        self.evictions = 0
+
+    def client(self, scope) -> str:
+        if self.trust_proxy:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-forwarded-for":
+                    # The proxy appends the address it saw; earlier hops are the client's word
+                    return value.decode("latin-1").rsplit(",", 1)[-1].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def is_exempt(self, path: str) -> bool:
+        return path.startswith(self.exempt) if self.exempt else False
+
+    # ---- rate limiting ----
+
+    def rule(self, path: str) -> Optional[Tuple[str, Rate]]:
+        for prefix, rate in self.rates:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return prefix, rate
+        return None
+
+    def take(self, path: str, ip: str) -> float:
+        """Spend a token for ``ip`` on ``path``; 0 if admitted, else seconds until the next token."""
+        match = self.rule(path) if not (self.unlimited and path.startswith(self.unlimited)) else None
+        if match is None:
+            return 0.0
+        prefix, rate = match
+        now = time.monotonic()
+        key = (prefix, ip)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [rate.burst, now]
+            if len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(rate.burst, bucket[0] + (now - bucket[1]) * rate.per_second)
+            bucket[1] = now
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        self.rate_limited[prefix] += 1
+        return (1.0 - bucket[0]) / rate.per_second if rate.per_second > 0 else 60.0
+
+    # ---- concurrency ----
+
+    async def acquire(self) -> bool:
+        """Take a serving slot, waiting in the queue if need be; False means shed the request."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_inflight)
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                self.shed += 1
+                return False
+            self.waiting += 1
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "rates": {prefix: rate.to_dict() for prefix, rate in self.rates},
+            "rate_limited": dict(self.rate_limited),
+            "buckets": len(self._buckets),
+            "bucket_evictions": self.evictions,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "queue_timeout_ms": round(self.queue_timeout * 1000, 3),
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+        }
+
+
+async def _refuse(send, status: int, detail: str, retry_after: float):
+    body = b'{"detail":"' + detail.encode() + b'"}'
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(max(1, math.ceil(retry_after))).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, control: AdmissionControl):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        control = self.control
+        if scope["type"] != "http" or control.is_exempt(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        wait = control.take(scope["path"], control.client(scope))
+        if wait:
+            await _refuse(send, 429, "Too many requests", wait)
+            return
+        if not await control.acquire():
+            await _refuse(send, 503, "Server busy, try again shortly", 1)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            control.release()
@@ -0,0 +1,313 @@
+# archive.py
+#
+# Streaming tar / tar.gz / zip of a directory tree, for /api/files/export and
+# the tar and zip commands, and the matching readers for imports.
+#
+# Writers are generators over (arcname, real path, is_dir) entries that
+# yield archive bytes as they are produced: each tar header is followed by
+# the file read in CHUNK_SIZE blocks, and zipfile writes into a sink that is
+# drained after every block. Nothing is staged in temp files and memory
+# stays at a few blocks whatever the size of the tree. Files are opened one
+# at a time; writes to the tree replace files by rename, so each file is
+# archived either wholly before or wholly after a concurrent save.
+#
+# gzip can be compressed on several threads, the way pigz does it: the
+# stream is cut into BLOCK_SIZE blocks, each deflated independently
+# with the previous block's last 32 KiB as its dictionary and ended with a
+# sync flush, and the pieces are concatenated in order. The result is one
+# ordinary gzip member. zlib releases the GIL while it compresses, so the
+# blocks really do run in parallel.
+
+import io
+import os
+import queue
+import struct
+import tarfile
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+
+# Unit of work for parallel gzip, and how much history each block borrows
+BLOCK_SIZE = 128 * 1024
+WINDOW_SIZE = 32 * 1024
+
+FORMATS = {
+    "tar": ("application/x-tar", ".tar"),
+    "tgz": ("application/gzip", ".tar.gz"),
+    "zip": ("application/zip", ".zip"),
+}
+
+# Shared by all exports; each stream bounds its own share by what it keeps in flight
+MAX_WORKERS = min(os.cpu_count() or 1, 8)
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="gzip")
+    return _pool
+
+
+Entry = Tuple[str, str, bool]       # arcname, real path, is_dir
+
+
+def _read_exact(real_path: str, size: int) -> Iterator[bytes]:
+    """``size`` bytes of the file in blocks: cut short if it grew, zero-padded if it shrank."""
+    left = size
+    try:
+        with open(real_path, "rb") as f:
+            while left:
+                block = f.read(min(CHUNK_SIZE, left))
+                if not block:
+                    break
+                left -= len(block)
+                yield block
+    except OSError:
+        pass
+    while left:
+        pad = min(CHUNK_SIZE, left)
+        left -= pad
+        yield b"\0" * pad
+
+
+# ---- tar ----
+
+def iter_tar(entries: Iterable[Entry]) -> Iterator[bytes]:
+    written = 0
+    for arcname, real_path, is_dir in entries:
+        try:
+            st = os.stat(real_path)
+        except OSError:
+            continue    # deleted since it was listed
+        info = tarfile.TarInfo(arcname)
+        info.mtime = int(st.st_mtime)
+        info.mode = st.st_mode & 0o777
+        if is_dir:
+            info.type = tarfile.DIRTYPE
+        else:
+            info.size = st.st_size
+        header = info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        written += len(header)
+        yield header
+        if not is_dir:
+            for block in _read_exact(real_path, st.st_size):
+                written += len(block)
+                yield block
+            pad = -st.st_size % tarfile.BLOCKSIZE
+            if pad:
+                written += pad
+                yield b"\0" * pad
+    # Two zero blocks end the archive; GNU tar pads to a whole record
+    end = 2 * tarfile.BLOCKSIZE
+    yield b"\0" * (end + -(written + end) % tarfile.RECORDSIZE)
+
+
+# ---- gzip ----
+
+def _rechunk(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    buf = bytearray()
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) >= size:
+            yield bytes(buf[:size])
+            del buf[:size]
+    if buf:
+        yield bytes(buf)
+
+
+def _deflate_block(block: bytes, history: bytes, level: int) -> bytes:
+    z = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=history) if history else \
+        zlib.compressobj(level, zlib.DEFLATED, -15)
+    return z.compress(block) + z.flush(zlib.Z_SYNC_FLUSH)
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6, workers: int = 1) -> Iterator[bytes]:
+    """gzip ``chunks`` as they come; with ``workers`` > 1, deflate blocks in parallel."""
+    yield struct.pack("<BBBBIBB", 0x1F, 0x8B, 8, 0, int(time.time()), 0, 255)
+    crc = size = 0
+    if workers <= 1:
+        z = zlib.compressobj(level, zlib.DEFLATED, -15)
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            out = z.compress(chunk)
+            if out:
+                yield out
+        yield z.flush()
+    else:
+        pool = _executor()
+        pending: deque = deque()
+        history = b""
+        for block in _rechunk(chunks, BLOCK_SIZE):
+            crc = zlib.crc32(block, crc)
+            size += len(block)
+            pending.append(pool.submit(_deflate_block, block, history, level))
+            history = (history + block)[-WINDOW_SIZE:]
+            # Keep a couple of blocks per worker in flight, so memory stays bounded
+            while len(pending) > 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+        # An empty final block closes the deflate stream
+        yield zlib.compressobj(level, zlib.DEFLATED, -15).flush()
+    yield struct.pack("<II", crc & 0xFFFFFFFF, size & 0xFFFFFFFF)
+
+
+# ---- zip ----
+
+class _Sink:
+    """Write-only, unseekable file for zipfile; take() hands over what was written."""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def write(self, data) -> int:
+        self._buf += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        out = bytes(self._buf)
+        self._buf.clear()
+        return out
+
+
+def iter_zip(entries: Iterable[Entry], level: int = 6) -> Iterator[bytes]:
+    sink = _Sink()
+    # An unseekable target makes zipfile write sizes in data descriptors after each file
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=level) as zf:
+        for arcname, real_path, is_dir in entries:
+            try:
+                # Dates before 1980 (which zip can't store) are clamped instead of refused
+                info = zipfile.ZipInfo.from_file(real_path, arcname, strict_timestamps=False)
+            except (OSError, ValueError):
+                continue    # deleted since it was listed, or a name zip can't take
+            info.compress_type = zipfile.ZIP_DEFLATED
+            if is_dir:
+                zf.writestr(info, b"")
+            else:
+                with zf.open(info, "w") as out:
+                    for block in _read_exact(real_path, info.file_size):
+                        out.write(block)
+                        yield sink.take()
+            yield sink.take()
+    yield sink.take()
+
+
+def export_stream(entries: Iterable[Entry], fmt: str, level: int = 6, workers: int = 1) -> Iterator[bytes]:
+    if fmt == "zip":
+        return iter_zip(entries, level)
+    if fmt == "tgz":
+        return gzip_stream(iter_tar(entries), level, workers)
+    return iter_tar(entries)
+
+
+# ---- reading ----
+
+class StreamPipe(io.RawIOBase):
+    """Readable end of a bounded queue, so a thread can read a body as the event loop receives it.
+
+    feed() blocks while the queue is full, which holds back the upload to the
+    pace of extraction. Once the reader gives up (abandon()), feed() returns
+    False instead of blocking forever.
+    """
+
+    def __init__(self, depth: int = 8):
+        super().__init__()
+        self._queue: queue.Queue = queue.Queue(depth)
+        self._buf = b""
+        self._eof = False
+        self._abandoned = False
+
+    def readable(self) -> bool:
+        return True
+
+    def feed(self, data: Optional[bytes]) -> bool:
+        """Queue ``data`` for the reader; None marks the end of the body."""
+        while not self._abandoned:
+            try:
+                self._queue.put(data, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def abandon(self):
+        self._abandoned = True
+
+    def readinto(self, b) -> int:
+        while not self._buf and not self._eof:
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+            else:
+                self._buf = item
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+class Member(NamedTuple):
+    name: str                   # normalized relative path
+    is_dir: bool
+    size: int
+    stream: Optional[IO[bytes]]
+
+
+def member_path(name: str) -> Optional[str]:
+    """Relative path for an archive member, or None if it would climb out of the target."""
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".")]
+    if not parts or ".." in parts:
+        return None
+    return "/".join(parts)
+
+
+class ArchiveReader:
+    """Iterates the regular files and folders of a tar (any compression) or zip.
+
+    Tars are read as a stream, so ``fileobj`` may be a pipe. Zips keep their
+    directory at the end and need a seekable ``fileobj``. Links, devices and
+    names escaping the target are left out and listed in ``skipped``.
+    """
+
+    def __init__(self, fileobj: IO[bytes], fmt: str):
+        self.fileobj = fileobj
+        self.fmt = fmt
+        self.skipped: List[str] = []
+
+    def __iter__(self) -> Iterator[Member]:
+        if self.fmt == "zip":
+            yield from self._zip()
+        else:
+            yield from self._tar()
+
+    def _tar(self) -> Iterator[Member]:
+        with tarfile.open(fileobj=self.fileobj, mode="r|*") as tar:
+            for info in tar:
+                name = member_path(info.name)
+                if name is None or not (info.isfile() or info.isdir()):
+                    self.skipped.append(info.name)
+                    continue
+                yield Member(name, info.isdir(), info.size, tar.extractfile(info) if info.isfile() else None)
+
+    def _zip(self) -> Iterator[Member]:
+        with zipfile.ZipFile(self.fileobj) as zf:
+            for info in zf.infolist():
+                name = member_path(info.filename)
+                if name is None:
+                    self.skipped.append(info.filename)
+                    continue
+                if info.is_dir():
+                    yield Member(name, True, 0, None)
+                    continue
+                with zf.open(info) as stream:
+                    yield Member(name, False, info.file_size, stream)
@@ -0,0 +1,132 @@
+# batch.py
+#
+# Scheduler for /api/files/batch. Operations run on a shared thread pool; an
+# operation waits only for earlier operations whose paths overlap its own, so
+# independent steps run concurrently while same-path steps keep request order.
+# In atomic mode each step snapshots the paths it mutates first, and a failure
+# rolls completed steps back in reverse order. Rollback goes through the
+# storage backend like the forward path, so blob reference counts stay right;
+# snapshots are kept under backup_root, which should be on the same
+# filesystem as the tree so restoring them is a rename.
+
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+
+def paths_overlap(a: str, b: str) -> bool:
+    return a == b or a.startswith(b + os.sep) or b.startswith(a + os.sep)
+
+
+class Step:
+    def __init__(self, fn: Callable[[], dict], reads: List[str] = (), writes: List[str] = ()):
+        self.fn = fn
+        self.reads = list(reads)
+        self.writes = list(writes)
+        self.deps: List[int] = []
+        self.snapshots: List[tuple] = []
+        self.result: Optional[dict] = None
+
+    def conflicts_with(self, other: "Step") -> bool:
+        mine = self.reads + self.writes
+        theirs = other.reads + other.writes
+        return (any(paths_overlap(a, b) for a in self.writes for b in theirs)
+                or any(paths_overlap(a, b) for a in mine for b in other.writes))
+
+
+def _snapshot(path: str, backup_dir: str) -> tuple:
+    if not os.path.lexists(path):
+        return (path, None)
+    backup = os.path.join(backup_dir, uuid.uuid4().hex)
+    if os.path.isdir(path):
+        shutil.copytree(path, backup, symlinks=True)
+    else:
+        shutil.copy2(path, backup)
+    return (path, backup)
+
+
+def _restore(storage, path: str, backup: Optional[str]):
+    if os.path.lexists(path):
+        storage.delete(path)
+    if backup is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.isdir(backup) or os.path.islink(backup):
+        storage.adopt(path, backup)
+        return
+    for dirpath, _, filenames in os.walk(backup):
+        rel = os.path.relpath(dirpath, backup)
+        target_dir = os.path.normpath(os.path.join(path, rel))
+        os.makedirs(target_dir, exist_ok=True)
+        for name in filenames:
+            src, dst = os.path.join(dirpath, name), os.path.join(target_dir, name)
+            if os.path.islink(src):
+                os.replace(src, dst)
+            else:
+                storage.adopt(dst, src)
+
+
+def run_batch(steps: List[Step], pool: ThreadPoolExecutor, storage, atomic: bool = False,
+              backup_root: Optional[str] = None, on_restore: Optional[Callable[[str], None]] = None) -> str:
+    """Run ``steps`` and fill in each ``step.result``; returns the batch status."""
+    for i, step in enumerate(steps):
+        step.deps = [j for j in range(i) if step.conflicts_with(steps[j])]
+
+    failed = threading.Event()
+    if atomic and backup_root is not None:
+        os.makedirs(backup_root, exist_ok=True)
+    backup_dir = tempfile.mkdtemp(prefix="cyber_batch_", dir=backup_root) if atomic else None
+    futures = []
+
+    def run(i: int):
+        step = steps[i]
+        # Dependencies were submitted earlier, so they are already running or done
+        for j in step.deps:
+            futures[j].result()
+        if atomic and failed.is_set():
+            step.result = {"status": "skipped"}
+            return
+        if any(steps[j].result.get("status") != "success" for j in step.deps):
+            step.result = {"status": "skipped", "error": "Depends on a failed operation"}
+            return
+        try:
+            if atomic:
+                step.snapshots = [_snapshot(p, backup_dir) for p in step.writes]
+            result = step.fn()
+        except Exception as e:
+            result = {"error": getattr(e, "detail", None) or str(e)}
+        if "error" in result:
+            result["status"] = "error"
+            failed.set()
+        else:
+            result.setdefault("status", "success")
+        step.result = result
+
+    try:
+        for i in range(len(steps)):
+            futures.append(pool.submit(run, i))
+        for future in futures:
+            future.result()
+
+        if not failed.is_set():
+            return "success"
+        if not atomic:
+            return "partial"
+
+        # The failed step may have half-applied (e.g. an interrupted copytree), so it
+        # is restored along with the completed ones
+        for step in reversed(steps):
+            for path, backup in reversed(step.snapshots):
+                _restore(storage, path, backup)
+                if on_restore is not None:
+                    on_restore(path)
+            if step.result.get("status") == "success":
+                step.result["status"] = "rolled_back"
+        return "rolled_back"
+    finally:
+        if backup_dir is not None:
+            shutil.rmtree(backup_dir, ignore_errors=True)
@@ -0,0 +1,105 @@
+# cold_start.py
+#
+# Startup time of the API, measured the way a fresh worker pays it: spawn
+# uvicorn on a throwaway copy of the backend and time the process until the
+# first request is answered. Each run also reads the per-phase gauges from
+# /api/metrics (import, seed, ready).
+#
+#   python benchmarks/cold_start.py [--runs 5] [--max-ms 3000]
+#
+# Modes:
+#   fresh     empty copy: the seed snapshot is built and the tree unpacked
+#   snapshot  snapshot prebuilt by an earlier start, files/ removed again
+#   warm      files/ already present, seeding is skipped
+#
+# The exit status is 1 if the median time to first response of any mode is
+# above --max-ms, so cold-start regressions fail loudly.
+
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from suite import free_port, prepare_workdir  # noqa: E402
+
+PHASE_RE = re.compile(r'^cyber_os_startup_seconds\{phase="(\w+)"\} ([\d.]+)$', re.M)
+
+
+def start_once(workdir: str, timeout: float = 30.0) -> dict:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                               "--log-level", "warning"], cwd=workdir)
+    try:
+        deadline = time.monotonic() + timeout
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while True:
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("uvicorn did not come up")
+                time.sleep(0.005)
+            first_response_ms = (time.perf_counter() - started) * 1000
+            phases = {phase: round(float(s) * 1000, 2)
+                      for phase, s in PHASE_RE.findall(client.get("/api/metrics").text)}
+    finally:
+        server.terminate()
+        server.wait()
+    return {"first_response_ms": round(first_response_ms, 2), **{f"{k}_ms": v for k, v in phases.items()}}
+
+
+def summarize(runs) -> dict:
+    keys = runs[0].keys()
+    return {k: round(statistics.median(r[k] for r in runs), 2) for k in keys}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API cold-start time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=3000.0,
+                        help="fail if a mode's median time to first response is above this")
+    args = parser.parse_args()
+
+    workdir = prepare_workdir()
+    files_dir = os.path.join(workdir, "files")
+    snapshot_dir = os.path.join(workdir, ".seed")
+    results = {}
+    try:
+        for mode in ("fresh", "snapshot", "warm"):
+            runs = []
+            for _ in range(args.runs):
+                if mode != "warm":
+                    shutil.rmtree(files_dir, ignore_errors=True)
+                if mode == "fresh":
+                    shutil.rmtree(snapshot_dir, ignore_errors=True)
+                runs.append(start_once(workdir))
+            results[mode] = summarize(runs)
+            print(f"{mode:<9} {results[mode]['first_response_ms']:>9} ms to first response", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = [f"{mode}: {r['first_response_ms']} ms > {args.max_ms}"
+                   for mode, r in results.items() if r["first_response_ms"] > args.max_ms]
+    print(json.dumps({
+        "benchmark": "cold_start",
+        "runs": args.runs,
+        "results": results,
+        "regressions": regressions,
+    }, indent=2))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# journal_bench.py
+#
+# Write throughput for small concurrent writes, with and without group commit.
+#
+#   python benchmarks/journal_bench.py [--threads 16] [--writes 50] [--size 256]
+#
+# Modes:
+#   atomic          temp file + rename, no fsync (the default without a journal)
+#   journal_serial  journaled, every write pays for its own fsync
+#   journal_group   journaled with group commit, concurrent writes share fsyncs
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import Journal  # noqa: E402
+from storage import PlainStorage  # noqa: E402
+
+
+def run(mode: str, threads: int, writes: int, size: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="journal_bench_") as tmp:
+        root = os.path.join(tmp, "files")
+        os.makedirs(root)
+        storage = PlainStorage()
+        journal = None
+        write = storage.write
+        if mode != "atomic":
+            journal = Journal(os.path.join(tmp, "journal"), root, storage.write,
+                              group_commit=(mode == "journal_group"))
+            write = journal.write
+
+        payload = os.urandom(size // 2).hex().encode()
+        barrier = threading.Barrier(threads + 1)
+
+        def worker(n: int):
+            barrier.wait()
+            for i in range(writes):
+                write(os.path.join(root, f"t{n}_{i % 8}.txt"), payload)
+
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for t in pool:
+            t.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        result = {
+            "mode": mode,
+            "threads": threads,
+            "writes": threads * writes,
+            "seconds": round(elapsed, 4),
+            "writes_per_sec": round(threads * writes / elapsed, 1),
+        }
+        if journal is not None:
+            stats = journal.stats()
+            result["fsyncs"] = stats["flushes"]
+            result["records_per_fsync"] = stats["records_per_flush"]
+            journal.close()
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=50, help="writes per thread")
+    parser.add_argument("--size", type=int, default=256, help="bytes per write")
+    args = parser.parse_args()
+
+    results = [run(mode, args.threads, args.writes, args.size)
+               for mode in ("atomic", "journal_serial", "journal_group")]
+    print(json.dumps({"benchmark": "journal", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
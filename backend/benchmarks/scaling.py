@@ -0,0 +1,125 @@
+# scaling.py
+#
+# Throughput of the desktop mix as the number of gunicorn workers grows, plus
+# a consistency check that only holds if workers coordinate: every client
+# appends to the same log with `echo ... >> file` at once, and afterwards the
+# file must contain exactly one line per request.
+#
+#   python benchmarks/scaling.py [--workers 1,2,4] [--clients 4] [--requests 2000]
+#
+# Load comes from --clients separate processes (one asyncio client each), so
+# the load generator isn't the single-core bottleneck being measured. The
+# server runs on a throwaway copy of the backend, started with
+# gunicorn.conf.py and WEB_CONCURRENCY set to each worker count.
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from suite import free_port, mix_scenarios, prepare_workdir, run_scenario, setup_bench_dir, wait_ready  # noqa: E402
+
+APPEND_PATH = "/bench/append.log"
+
+
+def client_process(args):
+    base_url, mode, requests, concurrency, seed = args
+
+    async def go():
+        limits = httpx.Limits(max_connections=concurrency * 2)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            if mode == "append":
+                def append(rng, w, i):
+                    line = f"{seed}-{w}-{i}"
+                    return "POST", "/api/terminal/command", {"json": {"command": f"echo {line} >> {APPEND_PATH}"}}
+                return await run_scenario(client, "append", append, None, requests, concurrency, seed)
+            name, make_request, _ = next(s for s in mix_scenarios() if s[0] == "mix.desktop")
+            return await run_scenario(client, name, make_request, None, requests, concurrency, seed)
+
+    return asyncio.run(go())
+
+
+def run_load(pool, base_url, mode, clients, requests, concurrency):
+    per_client = max(1, requests // clients)
+    start = time.perf_counter()
+    results = pool.map(client_process, [(base_url, mode, per_client, concurrency, c) for c in range(clients)])
+    elapsed = time.perf_counter() - start
+    total = sum(r["requests"] for r in results)
+    return {
+        "requests": total,
+        "errors": sum(r["errors"] for r in results),
+        "rps": round(total / elapsed, 1),
+        "p95_ms": max(r["p95_ms"] for r in results),
+    }
+
+
+async def prepare(base_url, concurrency):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await wait_ready(client)
+        await setup_bench_dir(client, concurrency)
+        await client.post("/api/files/write", json={"path": APPEND_PATH, "content": ""})
+
+
+def count_lines(base_url) -> int:
+    r = httpx.post(f"{base_url}/api/files/read", json={"path": APPEND_PATH}, timeout=60)
+    return len(r.json()["content"].splitlines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-worker throughput scaling")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="connections per client process")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per run, split across clients")
+    args = parser.parse_args()
+
+    workdir = prepare_workdir()
+    shutil.copy2(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gunicorn.conf.py"), workdir)
+    results = {}
+    try:
+        with multiprocessing.Pool(args.clients) as pool:
+            for workers in (int(n) for n in args.workers.split(",")):
+                port = free_port()
+                base_url = f"http://127.0.0.1:{port}"
+                env = {**os.environ, "PORT": str(port), "WEB_CONCURRENCY": str(workers)}
+                server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                                           "--log-level", "warning", "main:app"], cwd=workdir, env=env)
+                try:
+                    asyncio.run(prepare(base_url, args.concurrency))
+                    mix = run_load(pool, base_url, "mix", args.clients, args.requests, args.concurrency)
+                    appends = run_load(pool, base_url, "append", args.clients, args.requests, args.concurrency)
+                    lines = count_lines(base_url)
+                finally:
+                    server.terminate()
+                    server.wait()
+                results[workers] = {
+                    "mix.desktop": mix,
+                    "append": {**appends, "lines": lines, "lost": appends["requests"] - lines},
+                }
+                print(f"{workers:>2} workers  {mix['rps']:>9} rps  p95 {mix['p95_ms']:>8} ms  "
+                      f"appends lost {appends['requests'] - lines}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    base = results[min(results)]["mix.desktop"]["rps"]
+    print(json.dumps({
+        "benchmark": "scaling",
+        "cpus": multiprocessing.cpu_count(),
+        "clients": args.clients,
+        "concurrency": args.concurrency,
+        "results": {str(n): {**r, "speedup": round(r["mix.desktop"]["rps"] / base, 2)} for n, r in results.items()},
+    }, indent=2))
+    sys.exit(1 if any(r["append"]["lost"] for r in results.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
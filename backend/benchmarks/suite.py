@@ -0,0 +1,426 @@
+# suite.py
+#
+# Load test for the whole API: every terminal command, every /api/files/*
+# operation, and weighted mixes modelled on the desktop UI (FileExplorer
+# browsing, TextEditor saves, terminal use). Runs in process over ASGI or
+# against a local uvicorn, and reports throughput and p50/p95/p99 latency
+# per scenario as JSON, plus sha256 throughput in MB/s ("hashing", skipped
+# unless --only is empty or "hash").
+#
+#   python benchmarks/suite.py [--target asgi|uvicorn] [--requests 300] [--concurrency 8]
+#                              [--only PREFIX] [--seed 1] [--update-thresholds] [--no-check]
+#                              [--rate-limits off]
+#
+# The server runs on a throwaway copy of the backend so the real files/ tree
+# is never touched, and seeding starts from scratch each run. Request streams
+# are drawn from a seeded RNG, so two runs send the same requests.
+#
+# Results are compared with benchmarks/thresholds.json (per target, per
+# scenario: min_rps and max_p95_ms) and the exit status is 1 if any scenario
+# regressed. --update-thresholds rewrites the file from this run, leaving
+# --headroom (default 2x) slack for machine noise.
+
+import argparse
+import asyncio
+import glob
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+THRESHOLDS_PATH = os.path.join(BENCH_DIR, "thresholds.json")
+
+# Arguments for terminal commands that need them; everything else runs bare
+COMMAND_ARGS = {
+    "cat": "/welcome.txt",
+    "cd": "/logs",
+    "decrypt": "about_me.enc",
+    "du": "-s /",
+    "echo": "hello world",
+    "export": "BENCH=1",
+    "find": "-name *.log",
+    "grep": "WARN",
+    "head": "-n 2 /logs/system_boot.log",
+    "ls": "/diary",
+    "sha256sum": "/welcome.txt /logs/system_boot.log",
+    "sort": "/logs/system_boot.log",
+    "ssh": "ghost@dark-node",
+    "sudo": "ls",
+    "tail": "-n 2 /logs/system_boot.log",
+    "tar": "czf /diary.tgz /diary",
+    "uniq": "/logs/system_boot.log",
+    "unset": "BENCH",
+    "unzip": "-l /diary.zip",
+    "verify": "/logs",
+    "wc": "/logs/system_boot.log",
+    "zip": "/diary.zip /diary",
+}
+
+# Files hashed by the hashing throughput measurement
+HASH_FILES = 4
+HASH_FILE_BYTES = 8 * 1024 * 1024
+
+PIPELINES = [
+    "cat /logs/system_boot.log | grep WARN | wc -l",
+    "ps | grep -i ghost | head -3",
+    "cat /diary/entry_001.log /diary/entry_042.log | sort | uniq -c",
+    "nmap | tail -3",
+]
+
+# Partial lines as typed before Tab: commands, paths, and near misses that only get suggestions
+COMPLETE_LINES = ["", "n", "ca", "cat /logs/sy", "ls di", "cd /diary/entry_0", "cat /lgos", "nmpa", "cat x | gr"]
+
+EXPLORER_DIRS = ["/", "/documents", "/diary", "/logs", "/bin", "/trash"]
+EXPLORER_FILES = ["/welcome.txt", "/projects.txt", "/about_me.enc", "/diary/entry_001.log",
+                  "/logs/system_boot.log", "/bin/readme.md"]
+
+
+# ---- scenarios ----
+# A scenario is (name, make_request, setup). make_request(rng, worker, i)
+# returns (method, url, kwargs) for one request.
+
+def session_headers(w):
+    # Commands like cd and export need terminal state, so each worker is its own session
+    return {"X-Session-Id": f"bench-worker-{w:04d}"}
+
+
+def command(cmd):
+    return lambda rng, w, i: ("POST", "/api/terminal/command",
+                              {"json": {"command": cmd}, "headers": session_headers(w)})
+
+
+def weighted(choices):
+    population = [fn for fn, _ in choices]
+    weights = [w for _, w in choices]
+    return lambda rng, w, i: rng.choices(population, weights)[0](rng, w, i)
+
+
+def list_dir(rng, w, i):
+    return "GET", "/api/files/list", {"params": {"path": rng.choice(EXPLORER_DIRS)}}
+
+
+def read_file(rng, w, i):
+    return "POST", "/api/files/read", {"json": {"path": rng.choice(EXPLORER_FILES)}}
+
+
+def stream_file(rng, w, i):
+    return "GET", "/api/files/stream", {"params": {"path": rng.choice(EXPLORER_FILES)}}
+
+
+def save_draft(rng, w, i):
+    text = "".join(rng.choices("abcdefghij \n", k=rng.randint(512, 4096)))
+    return "POST", "/api/files/write", {"json": {"path": f"/bench/draft_{w}.txt", "content": text}}
+
+
+def read_draft(rng, w, i):
+    return "POST", "/api/files/read", {"json": {"path": f"/bench/draft_{w}.txt"}}
+
+
+def terminal_session(rng, w, i):
+    cmd = rng.choice(["ls", "whoami", "neofetch", "help", "ps", "status", "cat /welcome.txt",
+                      "ping dark-node", "grep WARN", PIPELINES[0]])
+    return "POST", "/api/terminal/command", {"json": {"command": cmd}, "headers": session_headers(w)}
+
+
+async def setup_bench_dir(client, workers):
+    await client.post("/api/files/create", json={"path": "/bench", "type": "folder"})
+    for w in range(workers):
+        await client.post("/api/files/write", json={"path": f"/bench/draft_{w}.txt", "content": "draft"})
+        await client.post("/api/files/write", json={"path": f"/bench/move_{w}.txt", "content": "move me"})
+
+
+async def setup_zip(client, workers):
+    await client.post("/api/terminal/command", json={"command": "zip /diary.zip /diary"})
+
+
+# Setup for command scenarios that need something on disk first
+COMMAND_SETUP = {
+    "unzip": setup_zip,
+}
+
+
+async def setup_hash_dir(client, workers):
+    await client.post("/api/files/create", json={"path": "/bench_hash", "type": "folder"})
+    rng = random.Random(0)
+    for n in range(HASH_FILES):
+        text = "".join(rng.choices("0123456789abcdef", k=4096)) * (HASH_FILE_BYTES // 4096)
+        await client.post("/api/files/write", json={"path": f"/bench_hash/blob_{n}.txt", "content": text})
+
+
+def file_scenarios():
+    def move(rng, w, i):
+        a, b = f"/bench/move_{w}.txt", f"/bench/moved_{w}.txt"
+        src, dst = (a, b) if i % 2 == 0 else (b, a)
+        return "POST", "/api/files/move", {"json": {"path": src, "destination": dst}}
+
+    def create(rng, w, i):
+        return "POST", "/api/files/create", {"json": {"path": f"/bench/new_{w}_{i}.txt", "type": "file"}}
+
+    def create_delete(rng, w, i):
+        # Even requests create, odd ones delete what the previous one made
+        path = f"/bench/tmp_{w}_{i // 2}.txt"
+        if i % 2 == 0:
+            return "POST", "/api/files/create", {"json": {"path": path, "type": "file", "content": "x"}}
+        return "POST", "/api/files/delete", {"json": {"path": path}}
+
+    def copy(rng, w, i):
+        return "POST", "/api/files/copy", {"json": {"path": "/welcome.txt", "destination": f"/bench/copy_{w}_{i}.txt"}}
+
+    def batch(rng, w, i):
+        ops = [{"op": "read", "path": p} for p in rng.sample(EXPLORER_FILES, 3)]
+        ops.append({"op": "write", "path": f"/bench/draft_{w}.txt", "content": "batched"})
+        return "POST", "/api/files/batch", {"json": {"operations": ops}}
+
+    return [
+        ("files.list", list_dir, None),
+        ("files.list_deep", lambda rng, w, i: ("GET", "/api/files/list",
+                                               {"params": {"path": "/", "depth": 3, "sort": "size", "limit": 50}}), None),
+        ("files.list_stream", lambda rng, w, i: ("GET", "/api/files/list/stream",
+                                                 {"params": {"path": "/", "depth": 3}}), None),
+        ("files.read", read_file, None),
+        # Everyone opening the same file at once, as from a shared link
+        ("files.read_hot", lambda rng, w, i: ("POST", "/api/files/read", {"json": {"path": "/about_me.enc"}}), None),
+        ("files.stream", stream_file, None),
+        ("files.search", lambda rng, w, i: ("GET", "/api/files/search",
+                                            {"params": {"q": rng.choice(["network", "key", "warn", "node"])}}), None),
+        ("files.write", save_draft, setup_bench_dir),
+        ("files.create", create, setup_bench_dir),
+        ("files.create_delete", create_delete, setup_bench_dir),
+        ("files.copy", copy, setup_bench_dir),
+        ("files.move", move, setup_bench_dir),
+        ("files.batch", batch, setup_bench_dir),
+        ("files.checksum", lambda rng, w, i: ("GET", "/api/files/checksum",
+                                              {"params": {"path": "/logs"}}), None),
+        ("files.verify", lambda rng, w, i: ("GET", "/api/files/checksum",
+                                            {"params": {"path": "/", "verify": "true"}}), None),
+    ]
+
+
+def mix_scenarios():
+    explorer = weighted([(list_dir, 70), (read_file, 20), (stream_file, 10)])
+    editor = weighted([(read_draft, 50), (save_draft, 50)])
+    return [
+        ("mix.explorer", explorer, None),
+        ("mix.editor", editor, setup_bench_dir),
+        ("mix.terminal", terminal_session, None),
+        ("mix.desktop", weighted([(explorer, 50), (editor, 20), (terminal_session, 30)]), setup_bench_dir),
+    ]
+
+
+async def command_scenarios(client):
+    r = await client.get("/api/terminal/commands")
+    names = sorted(r.json()["commands"])
+    scenarios = []
+    for name in names:
+        cmd = f"{name} {COMMAND_ARGS[name]}" if name in COMMAND_ARGS else name
+        scenarios.append((f"cmd.{name}", command(cmd), COMMAND_SETUP.get(name)))
+    for n, line in enumerate(PIPELINES):
+        scenarios.append((f"pipe.{n}", command(line), None))
+    scenarios.append(("complete", lambda rng, w, i: ("GET", "/api/terminal/complete",
+                                                     {"params": {"line": rng.choice(COMPLETE_LINES)}}), None))
+    return scenarios
+
+
+# ---- running ----
+
+async def measure_hashing(client, rounds=3):
+    """sha256 throughput over HASH_FILES fresh files, forcing a full rehash each round."""
+    await setup_hash_dir(client, 0)
+    rates = []
+    for _ in range(rounds):
+        r = await client.get("/api/files/checksum", params={"path": "/bench_hash", "full": "true"})
+        rates.append(r.json()["mb_per_s"] or 0.0)
+    rates.sort()
+    return {"files": HASH_FILES, "bytes": HASH_FILES * HASH_FILE_BYTES, "rounds": rounds,
+            "mb_per_s": rates[len(rates) // 2], "best_mb_per_s": rates[-1]}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    k = math.ceil(p / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(k, len(sorted_values) - 1))]
+
+
+async def run_scenario(client, name, make_request, setup, requests, concurrency, seed):
+    if setup is not None:
+        await setup(client, concurrency)
+    latencies = []
+    errors = 0
+    per_worker = max(1, requests // concurrency)
+
+    async def worker(w):
+        nonlocal errors
+        rng = random.Random(f"{seed}:{name}:{w}")
+        for i in range(per_worker):
+            method, url, kwargs = make_request(rng, w, i)
+            start = time.perf_counter()
+            r = await client.request(method, url, **kwargs)
+            await r.aread()
+            latencies.append(time.perf_counter() - start)
+            body = r.content[:200]
+            if r.status_code >= 400 or b'"error"' in body:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+def prepare_workdir() -> str:
+    """Copy the backend sources (not files/ or any state) into a temp directory."""
+    workdir = tempfile.mkdtemp(prefix="cyber_os_bench_")
+    for path in glob.glob(os.path.join(BACKEND_DIR, "*.py")):
+        shutil.copy2(path, workdir)
+    return workdir
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(client, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("uvicorn did not come up")
+        await asyncio.sleep(0.1)
+
+
+async def run_suite(args, workdir):
+    server = None
+    if args.target == "asgi":
+        sys.path.insert(0, workdir)
+        import main
+        transport = httpx.ASGITransport(app=main.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+        lifespan = main.app.router.lifespan_context(main.app)
+        await lifespan.__aenter__()
+    else:
+        port = free_port()
+        server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                                   "--log-level", "warning"], cwd=workdir)
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60)
+        lifespan = None
+
+    try:
+        await wait_ready(client)
+        scenarios = await command_scenarios(client) + file_scenarios() + mix_scenarios()
+        if args.only:
+            scenarios = [s for s in scenarios if s[0].startswith(args.only)]
+        results = {}
+        for name, make_request, setup in scenarios:
+            results[name] = await run_scenario(client, name, make_request, setup,
+                                               args.requests, args.concurrency, args.seed)
+            print(f"{name:<24} {results[name]['rps']:>9} rps  p95 {results[name]['p95_ms']:>8} ms",
+                  file=sys.stderr)
+        hashing = None
+        if args.only in (None, "hash"):
+            hashing = await measure_hashing(client)
+            print(f"{'hashing':<24} {hashing['mb_per_s']:>9} MB/s", file=sys.stderr)
+        return results, hashing
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def check(results, thresholds):
+    regressions = []
+    for name, limits in thresholds.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        if result["rps"] < limits["min_rps"]:
+            regressions.append(f"{name}: {result['rps']} rps < {limits['min_rps']}")
+        if result["p95_ms"] > limits["max_p95_ms"]:
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms > {limits['max_p95_ms']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API load test")
+    parser.add_argument("--target", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--requests", type=int, default=300, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", help="run scenarios whose name starts with this")
+    parser.add_argument("--update-thresholds", action="store_true")
+    parser.add_argument("--headroom", type=float, default=2.0)
+    parser.add_argument("--no-check", action="store_true")
+    parser.add_argument("--rate-limits", default="off",
+                        help="CYBER_OS_RATE_LIMITS for the server; off by default, since every "
+                             "request comes from one client and would drain its buckets")
+    args = parser.parse_args()
+    os.environ["CYBER_OS_RATE_LIMITS"] = args.rate_limits
+
+    workdir = prepare_workdir()
+    try:
+        results, hashing = asyncio.run(run_suite(args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stored = {}
+    if os.path.exists(THRESHOLDS_PATH):
+        with open(THRESHOLDS_PATH) as f:
+            stored = json.load(f)
+    regressions = [] if args.no_check else check(results, stored.get(args.target, {}))
+
+    if args.update_thresholds:
+        stored.setdefault(args.target, {}).update({
+            name: {"min_rps": round(r["rps"] / args.headroom, 1),
+                   "max_p95_ms": round(r["p95_ms"] * args.headroom, 3)}
+            for name, r in results.items()
+        })
+        with open(THRESHOLDS_PATH, "w") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    print(json.dumps({
+        "benchmark": "suite",
+        "target": args.target,
+        "requests_per_scenario": args.requests,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "results": results,
+        "hashing": hashing,
+        "regressions": regressions,
+    }, indent=2))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
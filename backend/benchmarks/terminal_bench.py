@@ -0,0 +1,83 @@
+# terminal_bench.py
+#
+# Requests per second for POST /api/terminal/command, in process over ASGI
+# (no sockets, so the numbers isolate the framework and handler cost).
+#
+#   python benchmarks/terminal_bench.py [--seconds 3] [--concurrency 16] [--commands neofetch,help,whoami]
+#
+# Modes:
+#   before  every call dispatched and encoded with FastAPI's stock JSONResponse
+#   after   the live endpoint: static commands served pre-rendered with an ETag
+#   etag    the live endpoint with If-None-Match set, answered with 304
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import main as server  # noqa: E402
+
+
+@server.app.post("/bench/terminal/command", response_class=JSONResponse)
+def baseline_command(request: server.CommandRequest):
+    parts = request.command.strip().split()
+    operation = parts[0].lower() if parts else ""
+    return server.registry.dispatch(operation, parts[1:])
+
+
+async def run(mode: str, commands, seconds: float, concurrency: int) -> dict:
+    url = "/bench/terminal/command" if mode == "before" else "/api/terminal/command"
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {}
+        if mode == "etag":
+            r = await client.post(url, json={"command": commands[0]})
+            headers["If-None-Match"] = r.headers["etag"]
+        deadline = time.perf_counter() + seconds
+        done = 0
+
+        async def worker(n: int):
+            nonlocal done
+            i = n
+            while time.perf_counter() < deadline:
+                r = await client.post(url, json={"command": commands[i % len(commands)]}, headers=headers)
+                assert r.status_code in (200, 304), r.status_code
+                done += 1
+                i += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "requests": done,
+        "seconds": round(elapsed, 3),
+        "rps": round(done / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--commands", default="neofetch,help,whoami,uname,hostname,df,clear")
+    args = parser.parse_args()
+
+    commands = args.commands.split(",")
+    results = [asyncio.run(run(mode, commands, args.seconds, args.concurrency))
+               for mode in ("before", "after", "etag")]
+    before = results[0]["rps"]
+    for r in results[1:]:
+        r["speedup"] = round(r["rps"] / before, 2) if before else None
+    print(json.dumps({"benchmark": "terminal", "commands": commands, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
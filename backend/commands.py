@@ -0,0 +1,217 @@
+# commands.py
+#
+# Registry behind /api/terminal/command. Each terminal operation is a small
+# handler registered with @registry.command(...); dispatch is a single dict
+# lookup instead of walking an if/elif chain.
+#
+# A handler written as a generator yields its output one line at a time.
+# dispatch() joins the lines into a single text result for the HTTP endpoint;
+# stream() hands them out as they are produced, for the WebSocket terminal.
+
+import inspect
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class Command:
+    def __init__(self, name: str, handler: Callable, aliases=(), usage: str = "",
+                 description: str = "", category: str = "SYSTEM", min_args: int = 0,
+                 max_args: Optional[int] = None, detail: str = "", context: bool = False,
+                 static: bool = False):
+        self.name = name
+        self.handler = handler
+        self.aliases = tuple(aliases)
+        self.usage = usage or name
+        self.description = description
+        self.category = category
+        self.min_args = min_args
+        self.max_args = max_args
+        self.detail = detail
+        self.context = context    # handler takes (args, ctx) instead of (args)
+        self.static = static      # same output for every call; served from prerender()
+        self.streaming = inspect.isgeneratorfunction(handler)
+        self.rendered: Optional[Tuple[bytes, str]] = None
+        # Timing counters, updated on every dispatch
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # Answers served from prerender(); not timed, so kept out of the figures above
+        self.cached_hits = 0
+
+    def usage_error(self) -> dict:
+        text = f"Usage: {self.usage}"
+        if self.detail:
+            text += f"\n  {self.detail}"
+        return {"type": "error", "content": text}
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.total_time * 1000, 3),
+            "avg_ms": round(self.total_time * 1000 / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_time * 1000, 3),
+            "cached_hits": self.cached_hits,
+        }
+
+
+class CommandRegistry:
+    def __init__(self):
+        self._commands: Dict[str, Command] = {}   # name and aliases -> Command
+        self._ordered: List[Command] = []         # registration order, for help
+        self._hooks: List[Callable] = []
+        self._cached_hooks: List[Callable] = []
+        self.fallback: Optional[Callable] = None
+
+    def command(self, name: str, **spec):
+        """Decorator registering ``handler(args)`` under ``name`` and its aliases.
+
+        With ``context=True`` the handler is called as ``handler(args, ctx)``
+        and receives the per-request context passed to dispatch().
+        """
+        def decorator(handler):
+            self.add(Command(name, handler, **spec))
+            return handler
+        return decorator
+
+    def add(self, cmd: Command):
+        for key in (cmd.name,) + cmd.aliases:
+            if key in self._commands:
+                raise ValueError(f"Command '{key}' is already registered")
+        for key in (cmd.name,) + cmd.aliases:
+            self._commands[key] = cmd
+        self._ordered.append(cmd)
+
+    def document(self, name: str, usage: str, description: str, category: str):
+        """List a command in help that is executed by the client, not here."""
+        self._ordered.append(Command(name, None, usage=usage, description=description, category=category))
+
+    def add_hook(self, hook: Callable):
+        """Register ``hook(name, elapsed_seconds, ok)``, called after every dispatch.
+
+        ``ok`` is False when the handler raised or returned an error result.
+        """
+        self._hooks.append(hook)
+
+    def add_cached_hook(self, hook: Callable):
+        """Register ``hook(name)``, called for every answer served pre-rendered instead of dispatched."""
+        self._cached_hooks.append(hook)
+
+    def get(self, name: str) -> Optional[Command]:
+        return self._commands.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._commands
+
+    def names(self, documented: bool = False) -> List[str]:
+        """Registered names and aliases; with ``documented``, also those the client runs."""
+        names = list(self._commands)
+        if documented:
+            names += [cmd.name for cmd in self._ordered if cmd.handler is None]
+        return names
+
+    def prerender(self, serialize: Callable[[dict], bytes], etag: Callable[[bytes], str]):
+        """Run every static command once and keep its serialized response and ETag.
+
+        Call after all commands are registered, since help lists them.
+        """
+        for cmd in self._ordered:
+            if cmd.static and cmd.handler:
+                body = serialize(cmd.handler([]))
+                cmd.rendered = (body, etag(body))
+
+    def rendered(self, operation: str) -> Optional[Tuple[bytes, str]]:
+        """Pre-rendered (body, etag) for a static command, or None to dispatch normally."""
+        cmd = self._commands.get(operation)
+        if cmd is None or cmd.rendered is None:
+            return None
+        cmd.cached_hits += 1
+        for hook in self._cached_hooks:
+            hook(cmd.name)
+        return cmd.rendered
+
+    @staticmethod
+    def _bad_args(cmd: Command, args: List[str]) -> bool:
+        return len(args) < cmd.min_args or (cmd.max_args is not None and len(args) > cmd.max_args)
+
+    def _record(self, cmd: Command, elapsed: float, ok: bool, error: bool):
+        cmd.calls += 1
+        cmd.total_time += elapsed
+        if elapsed > cmd.max_time:
+            cmd.max_time = elapsed
+        if error:
+            cmd.errors += 1
+        for hook in self._hooks:
+            hook(cmd.name, elapsed, not error)
+
+    def dispatch(self, operation: str, args: List[str], ctx=None) -> dict:
+        cmd = self._commands.get(operation)
+        if cmd is None:
+            return self.fallback(operation, args)
+
+        if self._bad_args(cmd, args):
+            return cmd.usage_error()
+
+        ok = True
+        start = time.perf_counter()
+        try:
+            result = cmd.handler(args, ctx) if cmd.context else cmd.handler(args)
+            if cmd.streaming:
+                result = {"type": "text", "content": "\n".join(result)}
+        except Exception as e:
+            ok = False
+            result = {"type": "error", "content": str(e)}
+        self._record(cmd, time.perf_counter() - start, ok, not ok or result.get("type") == "error")
+        return result
+
+    def stream(self, operation: str, args: List[str], ctx=None):
+        """Yield a command's output as messages.
+
+        Generator handlers produce one ``{"type": "line"}`` message per line as
+        it is yielded; everything else produces the single dispatch() result.
+        Only time spent inside the handler is counted, not time the consumer
+        keeps the generator suspended.
+        """
+        cmd = self._commands.get(operation)
+        if cmd is None or not cmd.streaming or self._bad_args(cmd, args):
+            yield self.dispatch(operation, args, ctx)
+            return
+
+        ok = True
+        elapsed = 0.0
+        start = time.perf_counter()
+        try:
+            lines = cmd.handler(args, ctx) if cmd.context else cmd.handler(args)
+            for line in lines:
+                elapsed += time.perf_counter() - start
+                yield {"type": "line", "content": line}
+                start = time.perf_counter()
+            elapsed += time.perf_counter() - start
+        except Exception as e:
+            elapsed += time.perf_counter() - start
+            ok = False
+            yield {"type": "error", "content": str(e)}
+        finally:
+            self._record(cmd, elapsed, ok, not ok)
+
+    def help_text(self) -> str:
+        categories: Dict[str, List[Command]] = {}
+        for cmd in self._ordered:
+            if cmd.description:
+                categories.setdefault(cmd.category, []).append(cmd)
+
+        # The usage column fits the longest usage, so descriptions line up
+        width = max([15] + [len(cmd.usage) for cmds in categories.values() for cmd in cmds])
+        lines = ["Available Commands:", "─" * 34]
+        for category, cmds in categories.items():
+            lines.append(f"  {category}:")
+            for cmd in cmds:
+                lines.append(f"    {cmd.usage:<{width}} {cmd.description}")
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> dict:
+        return {cmd.name: cmd.stats() for cmd in self._ordered if cmd.handler}
+
+
+registry = CommandRegistry()
@@ -0,0 +1,262 @@
+# completion.py
+#
+# Tab completion and "did you mean" for the terminal, behind
+# /api/terminal/complete and the command-not-found message.
+#
+# Command names live in a prefix trie, so completing a prefix costs the
+# prefix length plus the matches returned, whatever the number of commands.
+# Suggestions for a mistyped name come from a BK-tree: a tree over the
+# names in which each child edge is labelled with its edit distance to the
+# parent. By the triangle inequality a search for names within distance d
+# of a word only has to follow edges labelled within d of the distance to
+# the current node, so most of the tree is never visited.
+#
+# Distances are Levenshtein, computed bit-parallel (Myers/Hyyrö): the
+# query's characters become bitmasks once, and each candidate then costs a
+# dozen integer operations per character instead of a full DP table.
+# Names that all look alike (file_000001, file_000002, ...) still make a
+# BK-tree visit most of its nodes, so a search stops after MAX_VISITS
+# nodes, nearest branches first: suggestions are best effort, their cost
+# is bounded.
+#
+# Paths are completed from PathIndex: per directory, the names sorted once,
+# a bisect finding the run that starts with a prefix, and a BK-tree built
+# on first use for suggestions (only up to SUGGEST_MAX_NAMES names, as
+# building one costs a distance per level per name). Entries are validated
+# against the directory's mtime on every lookup, so changes from anywhere
+# (other workers, the host) show up without being told, and are evicted LRU.
+
+import bisect
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# Nodes a BK-tree search may visit before it settles for what it has found
+MAX_VISITS = 96
+
+# Directories with more names than this get completions but no suggestions
+SUGGEST_MAX_NAMES = 1000
+
+
+# How far a suggestion may be from the word typed, by the word's length
+def max_distance(word: str) -> int:
+    return 1 if len(word) <= 3 else 2
+
+
+def distance_from(word: str) -> Callable[[str], int]:
+    """Levenshtein distance to ``word``, as a function of the other string.
+
+    A BK-tree needs a true metric, so an adjacent swap counts as two edits.
+    """
+    m = len(word)
+    if not m:
+        return len
+    peq: Dict[str, int] = {}
+    for i, ch in enumerate(word):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+    full, last = (1 << m) - 1, 1 << (m - 1)
+    get = peq.get
+
+    def distance(text: str) -> int:
+        pv, mv, score = full, 0, m
+        for ch in text:
+            eq = get(ch, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & full)
+            mh = pv & xh
+            if ph & last:
+                score += 1
+            elif mh & last:
+                score -= 1
+            ph = ((ph << 1) | 1) & full
+            mh = (mh << 1) & full
+            pv = mh | (~(xv | ph) & full)
+            mv = ph & xv
+        return score
+    return distance
+
+
+def edit_distance(a: str, b: str) -> int:
+    return distance_from(a)(b)
+
+
+class BKTree:
+    __slots__ = ("_root", "size")
+
+    def __init__(self, words: Iterable[str] = ()):
+        self._root: Optional[Tuple[str, Dict[int, tuple]]] = None     # (word, {distance: child})
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        if self._root is None:
+            self._root = (word, {})
+            self.size = 1
+            return
+        node = self._root
+        distance = distance_from(word)
+        while True:
+            d = distance(node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = (word, {})
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word: str, limit: int, max_visits: int = MAX_VISITS) -> List[Tuple[int, str]]:
+        """(distance, word) for words within ``limit`` of ``word``, closest first.
+
+        Complete unless more than ``max_visits`` nodes would have to be visited.
+        """
+        if self._root is None:
+            return []
+        distance = distance_from(word)
+        found, stack = [], [self._root]
+        while stack and max_visits:
+            max_visits -= 1
+            node_word, children = stack.pop()
+            d = distance(node_word)
+            if d <= limit:
+                found.append((d, node_word))
+            # Branches whose edge is nearest d hold the nearest words; they go on top
+            stack.extend(child for _, child in sorted(
+                ((abs(edge - d), child) for edge, child in children.items() if abs(edge - d) <= limit),
+                key=lambda pair: pair[0], reverse=True))
+        found.sort()
+        return found
+
+
+class PrefixTrie:
+    __slots__ = ("_root", "size")
+
+    def __init__(self, words: Iterable[str] = ()):
+        self._root: dict = {}       # char -> node; "" marks the end of a word
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        node = self._root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        if "" not in node:
+            node[""] = word
+            self.size += 1
+
+    def complete(self, prefix: str, limit: int = 50) -> List[str]:
+        """Words starting with ``prefix`` in sorted order, at most ``limit``."""
+        node = self._root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        found, stack = [], [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            if "" in node:
+                found.append(node[""])
+            # Pushed in reverse so the smallest branch is visited next
+            stack.extend(node[ch] for ch in sorted((k for k in node if k), reverse=True))
+        return found
+
+
+class CommandIndex:
+    def __init__(self, names: Iterable[str], suggest_names: Optional[Iterable[str]] = None):
+        """Completes from ``names``; suggests from ``suggest_names`` (default: the same)."""
+        names = sorted(set(names))
+        self.trie = PrefixTrie(names)
+        self.tree = BKTree(names if suggest_names is None else sorted(set(suggest_names)))
+
+    def complete(self, prefix: str, limit: int = 50) -> List[str]:
+        return self.trie.complete(prefix.lower(), limit)
+
+    def suggest(self, word: str, limit: int = 5) -> List[str]:
+        """Names near ``word``, never ``word`` itself."""
+        word = word.lower()
+        return [name for d, name in self.tree.search(word, max_distance(word)) if d][:limit]
+
+
+class DirNames:
+    __slots__ = ("mtime", "names", "folders", "tree")
+
+    def __init__(self, mtime: int, items: List[dict]):
+        self.mtime = mtime
+        self.names = sorted(item["name"] for item in items)
+        self.folders = {item["name"] for item in items if item["type"] == "folder"}
+        self.tree: Optional[BKTree] = None      # built on the first suggestion
+
+
+class PathIndex:
+    def __init__(self, list_dir: Callable[[str], List[dict]], max_dirs: int = 1024):
+        self.list_dir = list_dir
+        self.max_dirs = max_dirs
+        self._dirs: "OrderedDict[str, DirNames]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, path: str) -> Optional[DirNames]:
+        """The entry for ``path`` if it is current, without listing the directory."""
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._dirs.get(path)
+            if cached is not None and cached.mtime == mtime:
+                self._dirs.move_to_end(path)
+                self.hits += 1
+                return cached
+        return None
+
+    def get(self, path: str) -> DirNames:
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._dirs.get(path)
+            if cached is not None and cached.mtime == mtime:
+                self._dirs.move_to_end(path)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        entry = DirNames(mtime, self.list_dir(path))
+        with self._lock:
+            self._dirs[path] = entry
+            self._dirs.move_to_end(path)
+            while len(self._dirs) > self.max_dirs:
+                self._dirs.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def complete(entry: DirNames, prefix: str, limit: int = 50) -> List[str]:
+        """Names in the directory starting with ``prefix``, folders ending in "/"."""
+        names = entry.names
+        found = []
+        for i in range(bisect.bisect_left(names, prefix), len(names)):
+            name = names[i]
+            if not name.startswith(prefix) or len(found) >= limit:
+                break
+            if name.startswith(".") and not prefix.startswith("."):
+                continue
+            found.append(name + "/" if name in entry.folders else name)
+        return found
+
+    @staticmethod
+    def suggest(entry: DirNames, name: str, limit: int = 5) -> List[str]:
+        if len(entry.names) > SUGGEST_MAX_NAMES:
+            return []
+        if entry.tree is None:
+            entry.tree = BKTree(entry.names)
+        return [n + "/" if n in entry.folders else n
+                for _, n in entry.tree.search(name, max_distance(name))[:limit]]
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._dirs.pop(path, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"dirs": len(self._dirs), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,141 @@
+# compression.py
+#
+# Response compression negotiated from Accept-Encoding: brotli when the
+# brotli package is installed and the client takes it, gzip otherwise.
+# Responses smaller than minimum_size go out as they are, since the framing
+# would eat most of the saving.
+#
+# Streaming responses (ndjson listings) are compressed chunk by chunk with a
+# sync flush after each one, so every line still reaches the client as soon
+# as it is produced. Ranged file downloads (anything advertising
+# Accept-Ranges), media that is already compressed, event streams, 304s
+# and WebSocket traffic pass through untouched. A compressed response's
+# ETag is weakened (W/"..."), as the bytes on the wire no longer match the
+# strong validator.
+
+import zlib
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types worth compressing; images, archives and octet streams are not
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "application/javascript",
+                      "image/svg+xml")
+
+# Event streams stay uncompressed: their events are tiny, and some proxies
+# hold back compressed streams until enough bytes have accumulated
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    for encoding in (("br",) if brotli is not None else ()) + ("gzip",):
+        if offered.get(encoding, offered.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)     # wbits 31: gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, level: int):
+        # Brotli quality runs 0-11 against gzip's 1-9; mid levels trade about the same
+        self._c = brotli.Compressor(quality=min(level, 11))
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._c.process(data) + self._c.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, level: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = next((v.decode("latin-1") for k, v in scope["headers"] if k == b"accept-encoding"), "")
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, encoder, passthrough
+            kind = message["type"]
+            if kind == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                passthrough = (message["status"] != 200 or b"content-encoding" in headers
+                               or b"accept-ranges" in headers
+                               or not content_type.startswith(COMPRESSIBLE_TYPES)
+                               or content_type.startswith(UNCOMPRESSED_TYPES))
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message     # held until the first body chunk shows the size
+                return
+            if kind != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if start is not None:
+                if not more and len(body) < self.minimum_size:
+                    passthrough = True
+                    headers = list(start.get("headers", [])) + [(b"vary", b"Accept-Encoding")]
+                    await send({**start, "headers": headers})
+                    start = None
+                    await send(message)
+                    return
+                encoder = _Brotli(self.level) if encoding == "br" else _Gzip(self.level)
+                headers = [(k, v) for k, v in start.get("headers", [])
+                           if k.lower() not in (b"content-length", b"etag")]
+                for k, v in start.get("headers", []):
+                    if k.lower() == b"etag":
+                        headers.append((k, v if v.startswith(b"W/") else b"W/" + v))
+                headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+                if not more:
+                    compressed = encoder.finish(body)
+                    headers.append((b"content-length", str(len(compressed)).encode()))
+                await send({**start, "headers": headers})
+                start = None
+                if not more:
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+            out = encoder.chunk(body) if more else encoder.finish(body)
+            await send({"type": "http.response.body", "body": out, "more_body": more})
+
+        await self.app(scope, receive, compressing_send)
@@ -0,0 +1,107 @@
+# dircache.py
+#
+# In-memory index of directory listings behind /api/files/list. Entries are
+# keyed by absolute path, evicted LRU once the entry or memory budget is
+# exceeded, dropped explicitly by the API's own mutation endpoints, and
+# revalidated against the directory mtime so changes made outside the API
+# are picked up on the next lookup.
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import List
+
+# Rough per-entry overhead of a {"name", "type", "size"} dict, on top of the name itself
+_ENTRY_OVERHEAD = sys.getsizeof({}) + 3 * sys.getsizeof(0) + 64
+
+
+def scan_directory(path: str) -> List[dict]:
+    items = []
+    for entry in os.scandir(path):
+        items.append({
+            "name": entry.name,
+            "type": "folder" if entry.is_dir() else "file",
+            "size": entry.stat().st_size if entry.is_file() else 0
+        })
+    return items
+
+
+class DirectoryIndex:
+    def __init__(self, max_dirs: int = 1024, max_bytes: int = 8 * 1024 * 1024):
+        self.max_dirs = max_dirs
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # path -> (mtime_ns, items, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def list(self, path: str) -> List[dict]:
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None:
+                if cached[0] == mtime:
+                    self._entries.move_to_end(path)
+                    self.hits += 1
+                    return cached[1]
+                self.stale += 1
+                self._drop(path)
+            self.misses += 1
+
+        items = scan_directory(path)
+        nbytes = sum(_ENTRY_OVERHEAD + len(item["name"]) for item in items)
+        if nbytes > self.max_bytes:
+            return items
+
+        with self._lock:
+            if path in self._entries:
+                self._drop(path)
+            self._entries[path] = (mtime, items, nbytes)
+            self._bytes += nbytes
+            while len(self._entries) > self.max_dirs or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+        return items
+
+    def invalidate(self, path: str):
+        """Forget ``path``, its parent directory and everything below it."""
+        path = os.path.normpath(path)
+        parent = os.path.dirname(path)
+        prefix = path + os.sep
+        with self._lock:
+            doomed = [p for p in self._entries if p == path or p == parent or p.startswith(prefix)]
+            for p in doomed:
+                self._drop(p)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_dirs": self.max_dirs,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
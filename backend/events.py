@@ -0,0 +1,123 @@
+# events.py
+#
+# Change feed for the shared file tree, behind /api/files/events. Mutating
+# endpoints and the terminal's redirections publish events directly; the
+# inotify watcher (watcher.py) publishes what changed behind the API's back,
+# including writes made by other worker processes.
+#
+# Events carry an increasing id and live in a fixed-size ring, so a client
+# that reconnects with its last id (the SSE Last-Event-ID) gets exactly what
+# it missed. If the ring has already moved past that id, the client is told
+# to reset, i.e. relist, instead. Readers are woken from any thread.
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Events kept for resuming clients
+EVENT_RING_SIZE = 4096
+
+# A watcher event for a path the API itself changed this recently, with the
+# same outcome (the path now exists / is gone), is the echo of that change
+ECHO_SECONDS = 1.0
+
+
+def under(path: str, prefix: str) -> bool:
+    return prefix == "/" or path == prefix or path.startswith(prefix + "/")
+
+
+def outcomes(op: str, path: str, dest: Optional[str]) -> List[Tuple[str, bool]]:
+    """(path, exists afterwards) for each path an event touches."""
+    if op == "move":
+        return [(path, False), (dest, True)]
+    if op == "copy":
+        return [(dest, True)]
+    return [(path, op != "delete")]
+
+
+class ChangeBus:
+    def __init__(self, capacity: int = EVENT_RING_SIZE):
+        self._events: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._waiters: Dict[asyncio.Event, asyncio.AbstractEventLoop] = {}
+        self._recent: Dict[Tuple[str, bool], float] = {}     # (path, exists) -> when the API published it
+        self.published = 0
+        self.echoes = 0
+
+    def publish(self, op: str, path: str, dest: Optional[str] = None, source: str = "api") -> Optional[int]:
+        """Record a change to ``path`` ('/'-rooted); returns its id, or None for a dropped echo."""
+        now = time.monotonic()
+        with self._lock:
+            results = outcomes(op, path, dest)
+            if source == "api":
+                for result in results:
+                    self._recent[result] = now
+                if len(self._recent) > 4 * self._events.maxlen:
+                    self._recent = {k: t for k, t in self._recent.items() if now - t < ECHO_SECONDS}
+            elif all(now - self._recent.get(r, float("-inf")) < ECHO_SECONDS for r in results):
+                self.echoes += 1
+                return None
+            event = {"id": self._next_id, "op": op, "path": path}
+            if dest is not None:
+                event["dest"] = dest
+            event["source"] = source
+            self._next_id += 1
+            self._events.append(event)
+            self.published += 1
+            waiters = list(self._waiters.items())
+        for waiter, loop in waiters:
+            loop.call_soon_threadsafe(waiter.set)
+        return event["id"]
+
+    @property
+    def last_id(self) -> int:
+        with self._lock:
+            return self._next_id - 1
+
+    def since(self, cursor: int) -> Tuple[List[dict], bool]:
+        """Events after ``cursor``, and whether some were already dropped from the ring."""
+        with self._lock:
+            first = self._events[0]["id"] if self._events else self._next_id
+            missed = cursor < first - 1
+            events = [e for e in self._events if e["id"] > cursor]
+        return events, missed
+
+    def subscribe(self) -> asyncio.Event:
+        waiter = asyncio.Event()
+        with self._lock:
+            self._waiters[waiter] = asyncio.get_running_loop()
+        return waiter
+
+    def unsubscribe(self, waiter: asyncio.Event):
+        with self._lock:
+            self._waiters.pop(waiter, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "last_id": self._next_id - 1,
+                "buffered": len(self._events),
+                "capacity": self._events.maxlen,
+                "subscribers": len(self._waiters),
+                "published": self.published,
+                "echoes_dropped": self.echoes,
+            }
+
+
+def coalesce(events: Iterable[dict], paths: List[str]) -> List[dict]:
+    """Events touching ``paths``, keeping only the newest event per path.
+
+    Moves and copies name two paths, so they are never merged away.
+    """
+    latest: Dict[object, dict] = {}
+    for event in events:
+        touched = [event["path"]] + ([event["dest"]] if "dest" in event else [])
+        if not any(under(p, prefix) for p in touched for prefix in paths):
+            continue
+        key = event["id"] if "dest" in event else event["path"]
+        latest.pop(key, None)       # re-insert, so dict order follows the newest id
+        latest[key] = event
+    return list(latest.values())
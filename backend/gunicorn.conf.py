@@ -0,0 +1,39 @@
+# gunicorn.conf.py
+#
+# Multi-worker deployment: gunicorn supervises uvicorn workers sharing one
+# listening socket.
+#
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# Workers coordinate through the file system only: shared-tree operations
+# take cross-process path locks (pathlock.py), and startup seeding waits on
+# the snapshot lock (seed.py). State that lives in memory stays per worker:
+# terminal sessions (cwd, history, env), each session overlay's whiteouts
+# (loaded once when the overlay becomes resident), and the search index,
+# which each worker builds itself. Every visitor has a session, so with
+# round-robin routing a file deleted through one worker would still show on
+# the next, and a cd would be forgotten. A single worker is therefore the
+# default; raise WEB_CONCURRENCY only behind sticky routing by X-Session-Id.
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# One worker until session state is shared between processes (see above)
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+# The write-ahead journal (CYBER_OS_JOURNAL=1) is owned by a single process:
+# checkpoints only fsync the writing worker's own files, and recovery would
+# replay records over files live workers serve. Journal.__init__ refuses a
+# second process anyway; failing here gives the reason before any worker boots.
+if os.environ.get("CYBER_OS_JOURNAL") == "1" and workers > 1:
+    raise RuntimeError("CYBER_OS_JOURNAL=1 needs a single worker; set WEB_CONCURRENCY=1")
+
+# Each worker imports main.py and runs its own lifespan; main.py sets up
+# thread pools and locks at import time, which should not be forked
+preload_app = False
+
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
@@ -0,0 +1,320 @@
+# integrity.py
+#
+# sha256 manifest of the shared file tree, behind sha256sum, verify and
+# /api/files/checksum. The manifest maps each file to the size, mtime and
+# digest it had after the last change made through the API. verify() then
+# compares the disk against it: anything edited, dropped in or deleted behind
+# the API's back (say, a rewritten .shadow/cipher.key) shows up as modified,
+# untracked or missing. The first start on a tree with no manifest takes the
+# files as they are as the baseline.
+#
+# Mutation endpoints call record(path) after they succeed. The updater
+# thread coalesces those paths, rehashes only the files whose size or mtime
+# moved, and rewrites the manifest file under a cross-process lock. Every
+# worker reloads the file whenever its mtime changes, so a change recorded
+# by one worker is known to all of them.
+#
+# Files are hashed through mmap on a thread pool: hashlib releases the GIL
+# while it digests a buffer, so several files hash in parallel without being
+# copied into Python. The tree's writes replace files by rename, so a mapped
+# file is never truncated underneath the hash.
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from seed import file_lock
+from storage import atomic_write
+from watcher import TEMP_NAME_RE
+
+MANIFEST_VERSION = 1
+HASH_WORKERS = min(os.cpu_count() or 1, 4)
+
+# Slice of a mapping handed to hashlib per call, so huge files still report progress in pieces
+MMAP_SLICE = 16 * 1024 * 1024
+
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+def sha256_file(path: str) -> str:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return EMPTY_SHA256     # an empty file can't be mapped
+        h = hashlib.sha256()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, len(view), MMAP_SLICE):
+                    h.update(view[offset:offset + MMAP_SLICE])
+            finally:
+                view.release()
+        return h.hexdigest()
+
+
+def throughput(files: int, nbytes: int, seconds: float) -> dict:
+    return {
+        "hashed_files": files,
+        "hashed_bytes": nbytes,
+        "hash_ms": round(seconds * 1000, 3),
+        "mb_per_s": round(nbytes / seconds / 1e6, 1) if seconds > 0 and nbytes else None,
+    }
+
+
+class Manifest:
+    def __init__(self, root: str, path: str, workers: int = HASH_WORKERS):
+        self.root = os.path.normpath(root)
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash")
+        self._entries: Dict[str, list] = {}         # rel -> [size, mtime_ns, sha256]
+        self._loaded_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._pending: Set[str] = set()
+        self._busy = False
+        self.ready = threading.Event()
+        self.recorded = 0
+        self.saves = 0
+        self.hashed_files = 0
+        self.hashed_bytes = 0
+        self.hash_seconds = 0.0
+
+    # ---- paths ----
+
+    def rel(self, path: str) -> Optional[str]:
+        path = os.path.normpath(path)
+        if path == self.root:
+            return ""
+        if not path.startswith(self.root + os.sep):
+            return None
+        return path[len(self.root) + 1:].replace(os.sep, "/")
+
+    def _walk(self, rel: str) -> Iterator[Tuple[str, str, os.stat_result]]:
+        """(rel, real path, stat) for every file at or below ``rel``."""
+        top = os.path.join(self.root, *rel.split("/")) if rel else self.root
+        try:
+            st = os.stat(top)
+        except OSError:
+            return
+        if not os.path.isdir(top):
+            yield rel, top, st
+            return
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if TEMP_NAME_RE.match(name):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield self.rel(path), path, st
+
+    @staticmethod
+    def _under(rel: str, scope: str) -> bool:
+        return not scope or rel == scope or rel.startswith(scope + "/")
+
+    # ---- hashing ----
+
+    def hash_files(self, paths: List[str]) -> Tuple[List[Optional[str]], int, float]:
+        """Digests of ``paths`` (None for any that vanished), bytes hashed, seconds taken."""
+        def one(path):
+            try:
+                return sha256_file(path), os.path.getsize(path)
+            except OSError:
+                return None, 0
+        start = time.perf_counter()
+        results = list(self._pool.map(one, paths))
+        elapsed = time.perf_counter() - start
+        nbytes = sum(size for _, size in results)
+        with self._lock:
+            self.hashed_files += len(paths)
+            self.hashed_bytes += nbytes
+            self.hash_seconds += elapsed
+        return [digest for digest, _ in results], nbytes, elapsed
+
+    # ---- persistence ----
+
+    def _load(self):
+        """Reload the manifest file if another worker (or we) rewrote it since the last read."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._loaded_mtime:
+            return True
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != MANIFEST_VERSION:
+            return False
+        self._entries = data["files"]
+        self._loaded_mtime = mtime
+        return True
+
+    def _save(self):
+        data = {"version": MANIFEST_VERSION, "updated": time.time(), "files": self._entries}
+        atomic_write(self.path, json.dumps(data, separators=(",", ":"), sort_keys=True).encode())
+        self._loaded_mtime = os.stat(self.path).st_mtime_ns
+        self.saves += 1
+
+    def _apply(self, scopes: Set[str]):
+        """Bring the entries at or below each of ``scopes`` in line with the disk."""
+        stale, paths = [], []
+        for scope in scopes:
+            old = {r: e for r, e in self._entries.items() if self._under(r, scope)}
+            for r in old:
+                del self._entries[r]
+            for r, path, st in self._walk(scope):
+                entry = old.get(r)
+                if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                    self._entries[r] = entry
+                else:
+                    stale.append((r, st))
+                    paths.append(path)
+        digests, _, _ = self.hash_files(paths)
+        for (r, st), digest in zip(stale, digests):
+            if digest is not None:
+                self._entries[r] = [st.st_size, st.st_mtime_ns, digest]
+
+    # ---- updates ----
+
+    def start(self):
+        threading.Thread(target=self._run, name="manifest-updater", daemon=True).start()
+
+    def _run(self):
+        with file_lock(self.lock_path):
+            if not self._load():
+                self._entries = {}
+                self._apply({""})
+                self._save()
+        self.ready.set()
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                scopes, self._pending = self._pending, set()
+                self._busy = True
+            try:
+                with file_lock(self.lock_path):
+                    self._load()
+                    self._apply(scopes)
+                    self._save()
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def record(self, path: str):
+        """Take the current state of ``path`` (file, folder or now gone) as trusted."""
+        rel = self.rel(path)
+        if rel is None:
+            return
+        with self._cond:
+            self._pending.add(rel)
+            self.recorded += 1
+            self._cond.notify_all()
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until recorded changes are in the manifest."""
+        if not self.ready.wait(timeout):
+            return False
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._busy:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    # ---- queries ----
+
+    def _snapshot(self) -> Dict[str, list]:
+        self.flush()
+        with file_lock(self.lock_path):
+            self._load()
+            return dict(self._entries)
+
+    def digests(self, path: str, full: bool = False) -> dict:
+        """sha256 of every file at or below ``path``.
+
+        Files whose size and mtime still match the manifest take its digest
+        unless ``full``; the rest are hashed now.
+        """
+        scope = self.rel(path)
+        entries = self._snapshot()
+        files, stale = [], []
+        for r, real, st in self._walk(scope):
+            entry = entries.get(r)
+            if not full and entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                files.append({"path": "/" + r, "size": st.st_size, "sha256": entry[2]})
+            else:
+                files.append({"path": "/" + r, "size": st.st_size, "sha256": None})
+                stale.append((len(files) - 1, real))
+        digests, nbytes, elapsed = self.hash_files([real for _, real in stale])
+        for (i, _), digest in zip(stale, digests):
+            files[i]["sha256"] = digest
+        return {"files": files, **throughput(len(stale), nbytes, elapsed)}
+
+    def verify(self, path: str, full: bool = False) -> dict:
+        """Compare the disk at or below ``path`` with the manifest.
+
+        Without ``full``, files whose size and mtime match are trusted as
+        they are; ``full`` rehashes everything, catching edits that kept
+        the mtime.
+        """
+        scope = self.rel(path)
+        entries = self._snapshot()
+        ok, modified, untracked, suspects = 0, [], [], []
+        seen = set()
+        for r, real, st in self._walk(scope):
+            seen.add(r)
+            entry = entries.get(r)
+            if entry is None:
+                untracked.append("/" + r)
+            elif not full and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                ok += 1
+            else:
+                suspects.append((r, real, entry[2]))
+        digests, nbytes, elapsed = self.hash_files([real for _, real, _ in suspects])
+        for (r, _, expected), digest in zip(suspects, digests):
+            if digest == expected:
+                ok += 1
+            else:
+                modified.append("/" + r)
+        missing = sorted("/" + r for r in entries if self._under(r, scope) and r not in seen)
+        return {
+            "checked": ok + len(modified) + len(untracked),
+            "ok": ok,
+            "modified": modified,
+            "missing": missing,
+            "untracked": untracked,
+            "intact": not (modified or missing or untracked),
+            **throughput(len(suspects), nbytes, elapsed),
+        }
+
+    def recorded_digest(self, path: str) -> Optional[str]:
+        entry = self._snapshot().get(self.rel(path))
+        return entry[2] if entry is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready.is_set(),
+                "files": len(self._entries),
+                "pending": len(self._pending),
+                "recorded": self.recorded,
+                "saves": self.saves,
+                "workers": self.workers,
+                **throughput(self.hashed_files, self.hashed_bytes, self.hash_seconds),
+            }
@@ -0,0 +1,238 @@
+# journal.py
+#
+# Optional write-ahead journal for file writes. A write is appended to the
+# journal and fsynced before it is applied, so once the API reports success
+# the new content survives a crash. Appends use group commit: while one
+# thread is inside fsync, later writers queue their records and the next
+# flush makes all of them durable with a single fsync.
+#
+# Applied files are not fsynced individually. A checkpoint fsyncs every file
+# written since the last one and then truncates the journal; recover() replays
+# whatever the journal still holds at startup. Deletes, moves and copies are
+# not journaled, so they run under exclusive() which checkpoints first;
+# replaying older writes can then never resurrect a file removed after them.
+#
+# The journal belongs to one process. A checkpoint only knows (and fsyncs)
+# the files its own process wrote before truncating, and recover() would
+# replay records over files other processes are serving, so the journal
+# file is locked exclusively when opened and a second process is refused.
+# Run a single worker with CYBER_OS_JOURNAL=1 (see gunicorn.conf.py).
+
+import base64
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional, Set
+
+try:
+    import fcntl
+except ImportError:     # Windows: no flock, a single process is assumed
+    fcntl = None
+
+
+class RWLock:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._writer:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            while self._writer:
+                self._cond.wait()
+            self._writer = True
+            while self._readers:
+                self._cond.wait()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class JournalError(IOError):
+    pass
+
+
+class Journal:
+    def __init__(self, path: str, root: str, apply: Callable[[str, bytes], None],
+                 group_commit: bool = True, checkpoint_bytes: int = 4 * 1024 * 1024):
+        self.path = path
+        self.root = root
+        self.apply = apply
+        self.group_commit = group_commit
+        self.checkpoint_bytes = checkpoint_bytes
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(self._fd)
+                raise JournalError(f"Journal {path} is in use by another process; "
+                                   "the journal needs a single worker (WEB_CONCURRENCY=1)") from None
+        self._barrier = RWLock()
+        self._cond = threading.Condition()
+        self._pending = []
+        self._seq = 0           # last sequence number handed out
+        self._durable = 0       # last sequence number known to be on disk
+        self._failed = 0        # sequence numbers up to here were lost to a flush error
+        self._error: Optional[BaseException] = None
+        self._flushing = False
+        self._size = os.fstat(self._fd).st_size
+        self._dirty: Set[str] = set()
+        self.records = 0
+        self.flushes = 0
+        self.checkpoints = 0
+        self.recovered = 0
+
+    # ---- group commit ----
+
+    def _append(self, line: bytes):
+        with self._cond:
+            self._seq += 1
+            seq = self._seq
+            self._pending.append(line)
+            while self._durable < seq:
+                if seq <= self._failed:
+                    raise JournalError(f"Journal flush failed: {self._error}")
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                # Become the leader: flush everything queued so far with one fsync
+                self._flushing = True
+                batch, self._pending = self._pending, []
+                upto = self._seq
+                self._cond.release()
+                error = None
+                try:
+                    data = b"".join(batch)
+                    os.write(self._fd, data)
+                    os.fsync(self._fd)
+                except OSError as e:
+                    error = e
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+                if error is None:
+                    self._durable = upto
+                    self._size += len(data)
+                    self.records += len(batch)
+                    self.flushes += 1
+                else:
+                    self._failed, self._error = upto, error
+                self._cond.notify_all()
+
+    def _append_serial(self, line: bytes):
+        with self._cond:
+            os.write(self._fd, line)
+            os.fsync(self._fd)
+            self._size += len(line)
+            self.records += 1
+            self.flushes += 1
+
+    # ---- public API ----
+
+    def write(self, path: str, data: bytes):
+        rel = os.path.relpath(path, self.root)
+        line = (json.dumps({"op": "write", "path": rel, "data": base64.b64encode(data).decode()}) + "\n").encode()
+        with self._barrier.shared():
+            # Reject what apply() would, so the journal never holds a write that failed
+            if not os.path.isdir(os.path.dirname(path)):
+                raise FileNotFoundError(f"No such directory: '{os.path.dirname(rel)}'")
+            if os.path.isdir(path):
+                raise IsADirectoryError(f"Is a directory: '{rel}'")
+            if self.group_commit:
+                self._append(line)
+            else:
+                self._append_serial(line)
+            self.apply(path, data)
+            with self._cond:
+                self._dirty.add(path)
+        if self._size > self.checkpoint_bytes:
+            self.checkpoint()
+
+    @contextmanager
+    def exclusive(self):
+        """Run a non-journaled mutation with writers paused and the journal checkpointed."""
+        with self._barrier.exclusive():
+            self._checkpoint()
+            yield
+
+    def checkpoint(self):
+        with self._barrier.exclusive():
+            self._checkpoint()
+
+    def _checkpoint(self):
+        with self._cond:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty and self._size == 0:
+            return
+        for path in dirty | {os.path.dirname(p) for p in dirty}:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        os.ftruncate(self._fd, 0)
+        os.fsync(self._fd)
+        with self._cond:
+            self._size = 0
+        self.checkpoints += 1
+
+    def recover(self) -> int:
+        """Replay journaled writes left by a crash, then checkpoint them."""
+        with self._barrier.exclusive():
+            with open(self.path, "rb") as f:
+                for raw in f:
+                    try:
+                        record = json.loads(raw)
+                    except ValueError:
+                        # Torn tail from a crash mid-append; it was never acknowledged
+                        break
+                    if record.get("op") != "write":
+                        continue
+                    path = os.path.join(self.root, record["path"])
+                    try:
+                        self.apply(path, base64.b64decode(record["data"]))
+                    except OSError:
+                        continue
+                    self._dirty.add(path)
+                    self.recovered += 1
+            self._size = os.fstat(self._fd).st_size
+            self._checkpoint()
+        return self.recovered
+
+    def close(self):
+        os.close(self._fd)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "group_commit": self.group_commit,
+                "records": self.records,
+                "flushes": self.flushes,
+                "records_per_flush": round(self.records / self.flushes, 2) if self.flushes else 0.0,
+                "checkpoints": self.checkpoints,
+                "recovered": self.recovered,
+                "journal_bytes": self._size,
+            }
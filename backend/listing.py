@@ -0,0 +1,123 @@
+# listing.py
+#
+# Recursive walking, sorting and cursor pagination for /api/files/list, plus
+# the generator behind the NDJSON variant that emits entries straight from
+# os.scandir without building the listing first.
+
+import base64
+import json
+import os
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Callable, Iterator, List, Optional, Tuple
+
+SORT_KEYS = {
+    "name": lambda e: (e.get("path", e["name"]),),
+    "size": lambda e: (e["size"], e.get("path", e["name"])),
+    "type": lambda e: (e["type"] != "folder", e.get("path", e["name"])),
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort: str, key: tuple) -> str:
+    raw = json.dumps([sort, list(key)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, key = json.loads(raw)
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if cursor_sort != sort:
+        raise InvalidCursor("Cursor was issued for a different sort order")
+    return tuple(key)
+
+
+def collect_tree(root: str, depth: int, list_dir: Callable[[str], List[dict]]) -> List[dict]:
+    """Breadth-first listing of ``root`` down to ``depth`` levels via ``list_dir``.
+
+    Entries below the first level carry a ``path`` relative to ``root``; the
+    dicts returned by ``list_dir`` may be shared with a cache, so they are
+    copied rather than modified.
+    """
+    items = []
+    queue = deque([("", root, 1)])
+    while queue:
+        rel, path, level = queue.popleft()
+        for entry in list_dir(path):
+            if depth > 1:
+                entry = {**entry, "path": f"{rel}/{entry['name']}" if rel else entry["name"]}
+            items.append(entry)
+            if entry["type"] == "folder" and level < depth:
+                child_rel = entry.get("path", entry["name"])
+                queue.append((child_rel, os.path.join(path, entry["name"]), level + 1))
+    return items
+
+
+def paginate(items: List[dict], sort: str, reverse: bool, cursor: Optional[str],
+             limit: Optional[int]) -> Tuple[List[dict], Optional[str]]:
+    key = SORT_KEYS[sort]
+    ordered = sorted(items, key=key)
+    keys = [key(e) for e in ordered]
+    after = decode_cursor(cursor, sort) if cursor else None
+    limit = limit or len(ordered)
+
+    try:
+        if not reverse:
+            start = bisect_right(keys, after) if after is not None else 0
+            page = ordered[start:start + limit]
+            more = start + limit < len(ordered)
+        else:
+            end = bisect_left(keys, after) if after is not None else len(ordered)
+            start = max(0, end - limit)
+            page = ordered[start:end][::-1]
+            more = start > 0
+    except TypeError:
+        raise InvalidCursor("Malformed cursor")
+
+    next_cursor = encode_cursor(sort, key(page[-1])) if more and page else None
+    return page, next_cursor
+
+
+def iter_tree(root: str, depth: int) -> Iterator[dict]:
+    """Yield entries depth-first as os.scandir produces them."""
+    stack = [("", root, 1)]
+    while stack:
+        rel, path, level = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    is_dir = entry.is_dir()
+                    rel_path = f"{rel}/{entry.name}" if rel else entry.name
+                    yield {
+                        "name": entry.name,
+                        "path": rel_path,
+                        "type": "folder" if is_dir else "file",
+                        "size": entry.stat().st_size if entry.is_file() else 0
+                    }
+                    if is_dir and level < depth:
+                        stack.append((rel_path, entry.path, level + 1))
+        except OSError:
+            # Directory vanished or became unreadable mid-walk; keep streaming the rest
+            continue
+
+
+def iter_listing(root: str, depth: int, list_dir: Callable[[str], List[dict]]) -> Iterator[dict]:
+    """Like iter_tree, but reading each directory through ``list_dir``."""
+    stack = [("", root, 1)]
+    while stack:
+        rel, path, level = stack.pop()
+        try:
+            entries = list_dir(path)
+        except OSError:
+            continue
+        for entry in entries:
+            rel_path = f"{rel}/{entry['name']}" if rel else entry["name"]
+            yield {**entry, "path": rel_path}
+            if entry["type"] == "folder" and level < depth:
+                stack.append((rel_path, os.path.join(path, entry["name"]), level + 1))
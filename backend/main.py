@@ -1,14 +1,97 @@
-from fastapi import FastAPI, HTTPException
+import time
+BOOT_STARTED = time.perf_counter()     # before the framework imports, so they count towards startup
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import json
 import random
-import content
+import secrets
+import seed
+from commands import registry
+from completion import CommandIndex, DirNames, PathIndex
+from dircache import DirectoryIndex
+from events import ChangeBus, coalesce, outcomes
+from batch import Step, run_batch
+from listing import SORT_KEYS, InvalidCursor, collect_tree, iter_listing, iter_tree, paginate
+from archive import CHUNK_SIZE, FORMATS, MAX_WORKERS, ArchiveReader, StreamPipe, export_stream
+from search import SearchIndex
+from storage import BlobStorage, PlainStorage
+from journal import Journal
+from integrity import Manifest, throughput
+from pathlock import PathLocks
+from sessions import SESSION_ID_RE, SessionManager, new_id
+from terminal import DEFAULT_ENV, TerminalSessions, normalize
+from usage import Quota, QuotaExceeded, UsageLedger, human, parse_quotas
+from uploads import UploadError, UploadManager
+from shell import FILTERS, Shell, ShellError, parse, simple_command
+from metrics import Metrics, MetricsMiddleware
+from admission import AdmissionControl, AdmissionMiddleware, parse_rates
+from singleflight import SingleFlight
+from profiler import StackSampler
+from watcher import InotifyWatcher
+from compression import CompressionMiddleware
+from responses import (FastJSONResponse, cached_json, conditional_json, dumps, etag_for, not_modified,
+                       stat_etag, validators)
 import os
 import shutil
+import tarfile
+import zipfile
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, nullcontext
+from functools import partial
+from types import SimpleNamespace
 from typing import List, Optional
 from datetime import datetime
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app):
+    # The seed tree is unpacked from the prebuilt snapshot only on a fresh disk;
+    # concurrent workers wait on the snapshot lock instead of racing
+    metrics.startup["seed"] = seed.materialize(FILES_DIR)["ms"] / 1000
+    seed.materialize(SEED_BASE)
+    seed_usage.build()
+    seed_index.build()
+    if journal is not None:
+        journal.recover()
+    search_index.start_background_build()
+    files_usage.start()
+    sessions_usage.start()
+    uploads.start_reaper()
+    manifest.start()
+    if os.environ.get("CYBER_OS_WATCH", "1") == "1":
+        watcher.start()
+    metrics.startup["ready"] = time.perf_counter() - BOOT_STARTED
+    yield
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Admission control: a cap on requests served at once (CYBER_OS_MAX_INFLIGHT)
+# with a short queue in front of it, answered with 503 once full or after
+# CYBER_OS_QUEUE_TIMEOUT_MS; and, when CYBER_OS_RATE_LIMITS is set
+# ("/api/terminal=10:30,/api/files=50:100"), token buckets per client IP and
+# route prefix answered with 429. Rate limits are off by default: behind a
+# reverse proxy (Render) every visitor arrives from the proxy's address and
+# would share one bucket, so enable them together with CYBER_OS_TRUST_PROXY=1,
+# which tells clients apart by X-Forwarded-For. Tab completion is never rate
+# limited, as it fires on every keypress. Added before CORS, so refusals still
+# carry the CORS headers the browser needs to read them.
+admission = AdmissionControl(
+    parse_rates(os.environ.get("CYBER_OS_RATE_LIMITS", "off")),
+    max_inflight=int(os.environ.get("CYBER_OS_MAX_INFLIGHT", "64")),
+    max_queue=int(os.environ.get("CYBER_OS_MAX_QUEUE", "64")),
+    queue_timeout=int(os.environ.get("CYBER_OS_QUEUE_TIMEOUT_MS", "250")) / 1000,
+    exempt=("/api/files/events", "/api/metrics"),
+    unlimited=("/api/terminal/complete",),
+    trust_proxy=os.environ.get("CYBER_OS_TRUST_PROXY") == "1",
+)
+app.add_middleware(AdmissionMiddleware, control=admission)
 
 # CORS - Allow frontend to connect
 app.add_middleware(
@@ -19,62 +102,142 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip (or brotli, when installed) for JSON and text responses above this size.
+# Added before the metrics middleware, so byte counts there are wire bytes.
+COMPRESS_MIN_BYTES = 1024
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+# Per-route and per-command latency histograms, served at /api/metrics.
+# CYBER_OS_PROFILE_RATE (0..1) turns on the stack sampler for that fraction
+# of requests; its folded stacks are served at /api/metrics/profile. Reading
+# them or changing the rate needs the X-Admin-Token header to match
+# CYBER_OS_ADMIN_TOKEN; without that variable both are refused.
+metrics = Metrics()
+ADMIN_TOKEN = os.environ.get("CYBER_OS_ADMIN_TOKEN", "")
+profiler = StackSampler(rate=float(os.environ.get("CYBER_OS_PROFILE_RATE", "0")))
+registry.add_hook(metrics.observe_command)
+registry.add_cached_hook(metrics.observe_cached_command)
+app.add_middleware(MetricsMiddleware, metrics=metrics, profiler=profiler)
+
 # File System Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FILES_DIR = os.path.join(BASE_DIR, "files")
 
-# Ensure files directory exists
-if not os.path.exists(FILES_DIR):
-    os.makedirs(FILES_DIR)
-    with open(os.path.join(FILES_DIR, "projects.txt"), "w") as f:
-        f.write(content.PROJECTS_LORE)
-    with open(os.path.join(FILES_DIR, "welcome.txt"), "w") as f:
-        f.write("WELCOME TO CYBER_OS v2.1\n\nThis is your personal file space.\nYou can create, edit, and delete files here.")
-    with open(os.path.join(FILES_DIR, "about_me.enc"), "w") as f:
-        f.write(content.ABOUT_ME_LORE)
-    with open(os.path.join(FILES_DIR, "contact.hex"), "w") as f:
-        f.write(content.CONTACT_LORE)
-
-    docs_dir = os.path.join(FILES_DIR, "documents")
-    if not os.path.exists(docs_dir):
-        os.makedirs(docs_dir)
-        with open(os.path.join(docs_dir, "notes.txt"), "w") as f:
-            f.write("Meeting notes: TBD")
-
-    diary_dir = os.path.join(FILES_DIR, "diary")
-    if not os.path.exists(diary_dir):
-        os.makedirs(diary_dir)
-        with open(os.path.join(diary_dir, "entry_001.log"), "w") as f:
-            f.write("DATE: 2077-01-12\nThey say the network is secure. I don't believe them. I saw the glimmers in the code today. Something is watching us from the sub-net.")
-        with open(os.path.join(diary_dir, "entry_042.log"), "w") as f:
-            f.write("DATE: 2077-02-04\nI hid the key in the image file. If they find me, at least the data is safe. 'blue_rabbit' is the trigger.")
-
-    trash_dir = os.path.join(FILES_DIR, "trash")
-    if not os.path.exists(trash_dir):
-        os.makedirs(trash_dir)
-        with open(os.path.join(trash_dir, ".recovered_frag"), "w") as f:
-            f.write("...SEGMENT CORRUPTED...\n...override protocol 9...\n...target identified: USER_01...")
-
-    logs_dir = os.path.join(FILES_DIR, "logs")
-    if not os.path.exists(logs_dir):
-        os.makedirs(logs_dir)
-        with open(os.path.join(logs_dir, "system_boot.log"), "w") as f:
-            f.write("[INFO] KERNEL LOADED\n[INFO] MOUNTING DRIVES... OK\n[WARN] UNKNOWN DEVICE CONNECTED")
-
-    bin_dir = os.path.join(FILES_DIR, "bin")
-    if not os.path.exists(bin_dir):
-        os.makedirs(bin_dir)
-        with open(os.path.join(bin_dir, "readme.md"), "w") as f:
-            f.write("# SYSTEM BINARIES\n\nDo not delete system files.")
-
-    # Secret hidden directory
-    secret_dir = os.path.join(FILES_DIR, ".shadow")
-    if not os.path.exists(secret_dir):
-        os.makedirs(secret_dir)
-        with open(os.path.join(secret_dir, "cipher.key"), "w") as f:
-            f.write("DECRYPT_KEY: X7-PHANTOM-ECHO-9\nACCESS_TOKEN: ██████████████\nWARNING: If you found this, they already know.")
-        with open(os.path.join(secret_dir, "blacklist.dat"), "w") as f:
-            f.write("NODE_01: COMPROMISED\nNODE_02: ACTIVE\nNODE_03: [REDACTED]\nNODE_04: OFFLINE SINCE 2076-11-30\nNODE_05: ...listening...")
+# Storage backend: "plain" writes files in place, "blob" keeps contents in a
+# deduplicating content-addressed store and hard-links them into FILES_DIR
+STORAGE_MODE = os.environ.get("CYBER_OS_STORAGE", "plain")
+BLOBS_DIR = os.path.join(BASE_DIR, ".blobs")
+# Writes are fsynced one by one unless the journal (below) makes them durable
+JOURNAL_ENABLED = os.environ.get("CYBER_OS_JOURNAL") == "1"
+storage = BlobStorage(BLOBS_DIR, sync=not JOURNAL_ENABLED) if STORAGE_MODE == "blob" \
+    else PlainStorage(sync=not JOURNAL_ENABLED)
+
+# Optional write-ahead journal (CYBER_OS_JOURNAL=1): writes are made durable with
+# group-committed fsyncs before they are applied, and replayed on startup
+JOURNAL_PATH = os.path.join(BASE_DIR, ".journal")
+journal = Journal(JOURNAL_PATH, FILES_DIR, storage.write) if JOURNAL_ENABLED else None
+
+# Cross-process reader/writer locks for the shared tree, so several workers
+# can serve it at once (see gunicorn.conf.py)
+LOCKS_DIR = os.path.join(BASE_DIR, ".locks")
+path_locks = PathLocks(FILES_DIR, LOCKS_DIR)
+
+# read_file returns content inline as JSON; anything larger goes through /api/files/stream
+READ_FILE_MAX_BYTES = 1024 * 1024
+
+# Cached directory listings for /api/files/list, dropped by every mutation below
+dir_index = DirectoryIndex()
+
+# Sorted names per directory for /api/terminal/complete, built from the
+# listings above and revalidated against the directory mtime
+path_index = PathIndex(dir_index.list)
+
+# Concurrent identical file reads and listings share one in-flight result;
+# every mutation starts a new generation, so nothing older than an
+# acknowledged write is ever shared
+flights = SingleFlight()
+
+# Full-text index for /api/files/search and the grep/find commands
+search_index = SearchIndex(FILES_DIR)
+
+# Per-visitor copy-on-write namespaces, selected with the X-Session-Id header
+# (ids come from POST /api/sessions). Their base is the pristine seed tree,
+# unpacked once per seed version, so nothing done in the shared tree or in
+# another session shows through. Requests without the header keep operating
+# on the shared tree.
+SESSIONS_DIR = os.path.join(BASE_DIR, ".sessions")
+SEED_BASE = seed.base_image()
+seed_index = SearchIndex(SEED_BASE)     # never changes, so indexed once at startup
+sessions = SessionManager(SEED_BASE, SESSIONS_DIR, storage, save=lambda path, data: save_file(path, data),
+                          list_dir=lambda path: dir_index.list(path),
+                          on_change=lambda path: (dir_index.invalidate(path), sessions_usage.refresh(path),
+                                                   flights.invalidate()))
+
+# Bytes, files and folders below every directory of the shared tree and of the
+# session overlays, for df, du and /api/files/usage. Kept current by touched()
+# and the session change hook, and reconciled with the disk by a background scan.
+files_usage = UsageLedger(FILES_DIR)
+sessions_usage = UsageLedger(SESSIONS_DIR)
+seed_usage = UsageLedger(SEED_BASE)      # never changes, so counted once at startup
+
+# Quotas as "bytes:inodes" limits. CYBER_OS_QUOTAS covers directories of the
+# shared tree ("/=256M:20000,/logs=8M"); CYBER_OS_SESSION_QUOTA covers what each
+# session may write into its overlay. Checked before a write, so concurrent
+# writers can overshoot a limit by what they have in flight.
+SHARED_QUOTAS = [(os.path.normpath(os.path.join(FILES_DIR, d.lstrip("/"))), q)
+                 for d, q in parse_quotas(os.environ.get("CYBER_OS_QUOTAS", "/=256M:20000")).items()]
+SESSION_QUOTA = Quota.parse(os.environ.get("CYBER_OS_SESSION_QUOTA", "16M:2000"))
+
+# sha256 manifest of the shared tree for sha256sum, verify and /api/files/checksum.
+# Changes made through the API are recorded as they happen; anything else
+# shows up as modified, missing or untracked when the tree is verified.
+manifest = Manifest(FILES_DIR, os.path.join(BASE_DIR, ".manifest.json"))
+
+# Chunked, resumable uploads (/api/files/uploads): chunks are streamed into a
+# preallocated file under UPLOADS_DIR and the finished file is renamed into
+# the tree on commit. Kept beside FILES_DIR so that rename stays on one filesystem.
+UPLOADS_DIR = os.path.join(BASE_DIR, ".uploads")
+uploads = UploadManager(UPLOADS_DIR)
+MAX_UPLOAD_BYTES = 1024 * 1024 * 1024
+
+# Archive export/import (/api/files/export, /api/files/import, tar and zip).
+# tar.gz exports of trees at least this large are compressed on several threads.
+PARALLEL_EXPORT_BYTES = 8 * 1024 * 1024
+ARCHIVE_MAX_DEPTH = 64
+
+# Change feed for /api/files/events: published by the mutating endpoints below
+# and by an inotify watch that catches everything else (other workers included).
+# CYBER_OS_WATCH=0 turns the watch off.
+change_bus = ChangeBus()
+watcher = InotifyWatcher(FILES_DIR, lambda op, path, dest=None: external_change(op, path, dest))
+MAX_EVENT_STREAMS = 256
+EVENT_COALESCE_SECONDS = 0.05       # a burst of changes within this window goes out as one batch
+EVENT_KEEPALIVE_SECONDS = 15
+
+# Terminal state (cwd, history, env) for the same session ids, kept in memory
+terminal_sessions = TerminalSessions()
+
+# WebSocket terminal: connections accepted per worker process, and how long a
+# single frame may wait on a client that stopped reading before it is dropped
+MAX_TERMINAL_SOCKETS = 256
+TERMINAL_SEND_TIMEOUT = 30
+
+# Pipelines run over POST are collected into one response; longer output is cut
+MAX_OUTPUT_LINES = 10000
+
+# Worker pool for /api/files/batch; independent operations in a batch run in parallel
+batch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="batch")
+# Rollback snapshots for atomic batches, beside FILES_DIR so restoring them is a rename
+BATCH_DIR = os.path.join(BASE_DIR, ".batch")
+MAX_BATCH_OPERATIONS = 256
+
+# Bounds for paginated / recursive listings
+MAX_LIST_LIMIT = 1000
+MAX_LIST_DEPTH = 8
+
+# Lore files use extensions the stdlib mimetypes table doesn't know about
+for _ext in (".log", ".dat", ".key", ".hex"):
+    mimetypes.add_type("text/plain", _ext)
 
 
 class FileOperationRequest(BaseModel):
@@ -88,119 +251,917 @@ class FileOperationRequest(BaseModel):
 # FILE SYSTEM API
 # ============================================================
 
+def safe_path(path: str) -> str:
+    target_path = os.path.normpath(os.path.join(FILES_DIR, path.lstrip('/')))
+    if not target_path.startswith(FILES_DIR):
+        raise HTTPException(status_code=403, detail="Access denied")
+    return target_path
+
+
+def save_file(target_path: str, data: bytes):
+    if journal is not None:
+        journal.write(target_path, data)
+    else:
+        storage.write(target_path, data)
+
+
+def structural_change():
+    """Guard for deletes/moves/copies, which the journal doesn't record."""
+    return journal.exclusive() if journal is not None else nullcontext()
+
+
+def restored(path: str):
+    touched(path)
+    changed("write", path)
+    if journal is not None:
+        # Batch rollback rewrote files behind the journal's back
+        journal.checkpoint()
+
+
+def session_overlay(session_id: Optional[str]):
+    if session_id is None:
+        return None
+    try:
+        return sessions.get(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def terminal_session(session_id: Optional[str]):
+    if session_id is None:
+        return None
+    if not SESSION_ID_RE.match(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session id")
+    return terminal_sessions.get(session_id)
+
+
+def cwd_path(path: str, session_id: Optional[str]) -> str:
+    """Resolve a relative ``path`` typed at the terminal against the session's cwd.
+
+    Only for the terminal: the /api/files endpoints take paths from the root, as the
+    apps name files without regard to where the terminal happens to be.
+    """
+    if session_id is None or path.startswith("/"):
+        return path
+    return normalize(terminal_sessions.cwd(session_id) + "/" + path)
+
+
+def rel_path(target_path: str) -> str:
+    rel = os.path.relpath(target_path, FILES_DIR)
+    return "" if rel == "." else rel.replace(os.sep, "/")
+
+
+def session_call(fn, *args):
+    try:
+        fn(*args)
+        return {"status": "success"}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def touched(*paths: str):
+    """Bring the in-memory indexes up to date after ``paths`` changed on disk."""
+    flights.invalidate()
+    for path in paths:
+        dir_index.invalidate(path)
+        search_index.update(path)
+        files_usage.refresh(path)
+
+
+def check_quota(overlay, target_path: str, nbytes: int, inodes: int = 1):
+    """Raise QuotaExceeded if storing ``nbytes`` / ``inodes`` at ``target_path`` would overflow a quota."""
+    if overlay is None:
+        files_usage.check(target_path, SHARED_QUOTAS, nbytes, inodes)
+    else:
+        sessions_usage.check(os.path.join(overlay.upper, rel_path(target_path)),
+                             [(overlay.root, SESSION_QUOTA)], nbytes, inodes)
+
+
+def usage_of(real_path: str):
+    """(bytes, files, folders) at ``real_path``, from whichever ledger tracks it."""
+    return (files_usage.totals(real_path) or sessions_usage.totals(real_path)
+            or seed_usage.totals(real_path) or (0, 0, 0))
+
+
+def changed(op: str, target_path: str, dest: Optional[str] = None):
+    """Publish a shared-tree change to /api/files/events and record it in the manifest."""
+    change_bus.publish(op, "/" + rel_path(target_path), "/" + rel_path(dest) if dest is not None else None)
+    for path, _ in outcomes(op, target_path, dest):
+        manifest.record(path)
+
+
+def external_change(op: str, path: str, dest: Optional[str] = None):
+    # Called from the watcher thread; echoes of our own writes come back as None
+    if change_bus.publish(op, path, dest, source="watch") is not None:
+        touched(*(os.path.join(FILES_DIR, p.lstrip("/")) for p in (path, dest) if p is not None))
+
+
 @app.get("/api/files/list")
-def list_files(path: str = ""):
+def list_files(path: str = "", cursor: Optional[str] = None,
+               limit: Optional[int] = Query(None, ge=1, le=MAX_LIST_LIMIT),
+               sort: Optional[str] = None, order: str = "asc",
+               depth: int = Query(1, ge=1, le=MAX_LIST_DEPTH),
+               x_session_id: Optional[str] = Header(None),
+               if_none_match: Optional[str] = Header(None)):
     target_path = os.path.normpath(os.path.join(FILES_DIR, path.lstrip('/')))
     if not target_path.startswith(FILES_DIR):
         raise HTTPException(status_code=403, detail="Access denied")
 
-    if not os.path.exists(target_path):
+    overlay = session_overlay(x_session_id)
+    if overlay is None:
+        root, list_dir, real_path = target_path, dir_index.list, target_path
+    else:
+        root, list_dir = rel_path(target_path), overlay.listdir
+        real_path = overlay.lookup(root)
+
+    if real_path is None or not os.path.exists(real_path):
         return {"error": "Directory not found"}
 
+    def listing():
+        if depth == 1 and cursor is None and limit is None and sort is None:
+            return {"files": list_dir(root)}
+        items = collect_tree(root, depth, list_dir)
+        page, next_cursor = paginate(items, sort, order == "desc", cursor, limit)
+        return {"files": page, "next_cursor": next_cursor, "total": len(items)}
+
     try:
-        items = []
-        if not os.path.isdir(target_path):
+        if not os.path.isdir(real_path):
             return {"error": "Not a directory"}
+        if sort is not None and sort not in SORT_KEYS:
+            return {"error": f"Unknown sort '{sort}', expected one of: {', '.join(SORT_KEYS)}"}
+        if depth > 1 or cursor is not None or limit is not None:
+            sort = sort or "name"
 
-        for entry in os.scandir(target_path):
-            items.append({
-                "name": entry.name,
-                "type": "folder" if entry.is_dir() else "file",
-                "size": entry.stat().st_size if entry.is_file() else 0
-            })
-        return {"files": items}
+        # Validated by a hash of the listing itself, not Last-Modified: file sizes
+        # and nested folders change without touching this directory's mtime
+        payload = flights.do(("list", x_session_id, real_path, depth, cursor, limit, sort, order), listing)
+        return conditional_json(payload, if_none_match=if_none_match)
+    except InvalidCursor as e:
+        return {"error": str(e)}
     except Exception as e:
         return {"error": str(e)}
 
 
-@app.post("/api/files/read")
-def read_file(request: FileOperationRequest):
-    target_path = os.path.normpath(os.path.join(FILES_DIR, request.path.lstrip('/')))
+@app.get("/api/files/list/stream")
+def stream_list_files(path: str = "", depth: int = Query(1, ge=1, le=MAX_LIST_DEPTH),
+                      x_session_id: Optional[str] = Header(None)):
+    # One JSON object per line, written as os.scandir yields entries, so the
+    # first byte goes out before the directory has been fully read
+    target_path = safe_path(path)
+    overlay = session_overlay(x_session_id)
+    if overlay is None:
+        if not os.path.isdir(target_path):
+            raise HTTPException(status_code=404, detail="Directory not found")
+        entries = iter_tree(target_path, depth)
+    else:
+        real_path = overlay.lookup(rel_path(target_path))
+        if real_path is None or not os.path.isdir(real_path):
+            raise HTTPException(status_code=404, detail="Directory not found")
+        # Merged session views are produced one directory at a time
+        entries = iter_listing(rel_path(target_path), depth, overlay.listdir)
+    lines = (dumps(entry) + b"\n" for entry in entries)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@app.get("/api/files/cache")
+def cache_stats():
+    return {
+        "dir_index": dir_index.stats(),
+        "search_index": search_index.stats(),
+        "storage": storage.stats(),
+        "journal": journal.stats() if journal is not None else None,
+        "path_locks": path_locks.stats(),
+        "usage": {"files": files_usage.stats(), "sessions": sessions_usage.stats()},
+        "uploads": uploads.stats(),
+        "manifest": manifest.stats(),
+        "coalescing": flights.stats(),
+        "path_index": path_index.stats(),
+        "admission": admission.stats(),
+        "events": {**change_bus.stats(), "streams": event_streams, "watcher": watcher.stats()},
+    }
+
+
+@app.get("/api/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def require_admin(token: Optional[str]):
+    if not ADMIN_TOKEN or not secrets.compare_digest((token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(403, "Admin token required")
+
+
+@app.get("/api/metrics/profile")
+def profile_stacks(reset: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """Folded stacks collected so far, ready for flamegraph.pl or speedscope."""
+    require_admin(x_admin_token)
+    text = profiler.folded()
+    if reset:
+        profiler.reset()
+    return PlainTextResponse(text)
+
+
+@app.post("/api/metrics/profile")
+def configure_profiler(rate: float = Query(..., ge=0.0, le=1.0), x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    profiler.rate = rate
+    return {"profiler": profiler.stats()}
+
+
+def usage_entry(totals) -> dict:
+    return {"bytes": totals[0], "files": totals[1], "folders": totals[2]}
+
+
+@app.get("/api/files/usage")
+def disk_usage(path: str = "", x_session_id: Optional[str] = Header(None)):
+    """Usage of the shared tree at ``path`` and of each entry in it, read from the ledger."""
+    target_path = safe_path(path)
+    if not files_usage.ready.is_set():
+        return {"error": "Usage is still being counted, try again shortly"}
+    totals = files_usage.totals(target_path)
+    if totals is None:
+        return {"error": "Path not found"}
+    quotas = []
+    for directory, quota in SHARED_QUOTAS:
+        if target_path == directory or target_path.startswith(directory + os.sep):
+            used = files_usage.totals(directory) or (0, 0, 0)
+            quotas.append({"path": "/" + rel_path(directory), **quota.to_dict(),
+                           "used_bytes": used[0], "used_inodes": used[1] + used[2]})
+    result = {
+        "path": "/" + rel_path(target_path),
+        **usage_entry(totals),
+        "quotas": quotas,
+        "children": [{"name": name, **usage_entry(sub)} for name, sub in files_usage.children(target_path)],
+    }
+    overlay = session_overlay(x_session_id)
+    if overlay is not None:
+        result["session"] = {**usage_entry(sessions_usage.totals(overlay.root) or (0, 0, 0)),
+                             "quota": SESSION_QUOTA.to_dict()}
+    return result
+
+
+def session_verify(overlay, rel: str) -> Optional[dict]:
+    """Like Manifest.verify, for what a session sees at ``rel``; None if it doesn't exist.
+
+    Files from the base image are checked against the seed snapshot's
+    digests. Files the session wrote itself only change through the API,
+    so they count as recorded, and entries it deleted are whited out and
+    not reported as missing.
+    """
+    real_path = overlay.lookup(rel)
+    if real_path is None:
+        return None
+    if os.path.isdir(real_path):
+        entries = ((e["path"] if not rel else f"{rel}/{e['path']}")
+                   for e in iter_listing(rel, ARCHIVE_MAX_DEPTH, overlay.listdir) if e["type"] == "file")
+    else:
+        entries = [rel]
+    recorded = (seed.read_manifest() or {}).get("files", {})
+    written, untracked, suspects = 0, [], []
+    for r in entries:
+        real = overlay.lookup(r)
+        if real is None:
+            continue
+        if real.startswith(overlay.upper + os.sep):
+            written += 1
+        elif r not in recorded:
+            untracked.append("/" + r)
+        else:
+            suspects.append((r, real, recorded[r]["sha256"]))
+    # Seed files are few and small, so they are always hashed
+    digests, nbytes, elapsed = manifest.hash_files([real for _, real, _ in suspects])
+    modified = [f"/{r}" for (r, _, expected), digest in zip(suspects, digests) if digest != expected]
+    ok = written + len(suspects) - len(modified)
+    return {
+        "checked": ok + len(modified) + len(untracked),
+        "ok": ok,
+        "modified": sorted(modified),
+        "missing": [],
+        "untracked": sorted(untracked),
+        "intact": not (modified or untracked),
+        **throughput(len(suspects), nbytes, elapsed),
+    }
+
+
+@app.get("/api/files/checksum")
+def checksum(path: str = "", verify: bool = False, full: bool = False,
+             x_session_id: Optional[str] = Header(None)):
+    """sha256 of a file, or of every file below a folder; ``verify`` checks them against the manifest.
+
+    Folder digests reuse the manifest for files whose size and mtime haven't
+    moved, unless ``full``. The manifest covers the shared tree; in a session
+    single files are hashed as the session sees them, and ``verify`` checks the
+    session's view against the seed snapshot.
+    """
+    target_path = safe_path(path)
+    overlay = session_overlay(x_session_id)
+    if overlay is not None and verify:
+        report = session_verify(overlay, rel_path(target_path))
+        if report is None:
+            raise HTTPException(status_code=404, detail="Path not found")
+        return {"path": "/" + rel_path(target_path), **report}
+    if overlay is not None:
+        real_path = overlay.lookup(rel_path(target_path))
+        if real_path is None:
+            raise HTTPException(status_code=404, detail="Path not found")
+        if os.path.isdir(real_path):
+            return {"error": "Folder checksums cover the shared tree only"}
+        digests, nbytes, elapsed = manifest.hash_files([real_path])
+        return {"path": "/" + rel_path(target_path), "size": nbytes, "sha256": digests[0],
+                **throughput(1, nbytes, elapsed)}
+    if not os.path.exists(target_path):
+        raise HTTPException(status_code=404, detail="Path not found")
+    if verify:
+        return {"path": "/" + rel_path(target_path), **manifest.verify(target_path, full)}
+    if os.path.isdir(target_path):
+        return {"path": "/" + rel_path(target_path), **manifest.digests(target_path, full)}
+    result = manifest.digests(target_path, full=True)
+    recorded = manifest.recorded_digest(target_path)
+    entry = result.pop("files")[0]
+    return {**entry, "recorded": recorded, "intact": recorded == entry["sha256"] if recorded else None, **result}
+
+
+@app.post("/api/sessions")
+def create_session():
+    """A new session id, for the X-Session-Id header (and the WebSocket's session_id)."""
+    return {"session_id": new_id()}
+
+
+@app.get("/api/files/sessions")
+def session_stats():
+    return {"sessions": sessions.stats()}
+
+
+event_streams = 0
+
+
+def sse(event: str, data: dict, event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return (head + f"event: {event}\ndata: ").encode() + dumps(data) + b"\n\n"
+
+
+@app.get("/api/files/events")
+async def file_events(path: List[str] = Query(["/"], max_length=16), cursor: Optional[int] = None,
+                      last_event_id: Optional[int] = Header(None)):
+    """Server-Sent Events for changes under any of ``path`` (repeatable).
+
+    Each "change" event is {"id", "op", "path", ["dest"], "source"}; a burst
+    of changes to one path arrives as its newest event only. Reconnecting
+    with Last-Event-ID (or ?cursor=) replays what was missed, or sends
+    "reset" when that is no longer possible and the client should relist.
+    """
+    global event_streams
+    if event_streams >= MAX_EVENT_STREAMS:
+        raise HTTPException(status_code=503, detail="Too many event streams")
+    prefixes = [normalize(p) for p in path]
+    start = last_event_id if last_event_id is not None else cursor
+
+    async def stream():
+        global event_streams
+        event_streams += 1
+        waiter = change_bus.subscribe()
+        position = change_bus.last_id if start is None else start
+        try:
+            yield sse("ready", {"cursor": position, "paths": prefixes})
+            while True:
+                waiter.clear()
+                events, missed = change_bus.since(position)
+                if missed:
+                    position = change_bus.last_id
+                    yield sse("reset", {"cursor": position}, position)
+                    continue
+                if events:
+                    position = events[-1]["id"]
+                    for event in coalesce(events, prefixes):
+                        yield sse("change", event, event["id"])
+                    continue
+                try:
+                    await asyncio.wait_for(waiter.wait(), EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                await asyncio.sleep(EVENT_COALESCE_SECONDS)
+        finally:
+            change_bus.unsubscribe(waiter)
+            event_streams -= 1
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def search_views(overlay):
+    """(index, visible) pairs that together cover what ``overlay`` sees.
+
+    A session sees the seed base minus what it deleted or replaced, queried
+    through the base index, plus its own files, indexed on the spot (an
+    overlay holds only what the session wrote).
+    """
+    if overlay is None:
+        return [(search_index, None)]
+    upper = SearchIndex(overlay.upper)
+    upper.update(overlay.upper)
+    return [(seed_index, lambda rel: overlay.lookup(rel) == os.path.join(SEED_BASE, rel)), (upper, None)]
+
+
+@app.get("/api/files/search")
+def search_files(q: str, path: str = "", limit: int = Query(20, ge=1, le=100),
+                 x_session_id: Optional[str] = Header(None)):
+    safe_path(path)
+    overlay = session_overlay(x_session_id)
+    start = time.perf_counter()
+    results = sorted((r for index, visible in search_views(overlay)
+                      for r in index.search(q, scope=path, limit=limit, visible=visible)),
+                     key=lambda r: (-r["score"], r["path"]))[:limit]
+    return {
+        "results": results,
+        "ready": (search_index if overlay is None else seed_index).ready.is_set(),
+        "took_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+
+
+def read_text(path: str) -> str:
+    with open(path, "r") as f:
+        return f.read()
+
+
+def load_file(path: str, x_session_id: Optional[str], fresh=lambda st: False):
+    """(payload, stat) for read_file. The payload is None when ``fresh(stat)``
+    says the client's copy is current, so the file is not read at all; stat
+    is None for error payloads."""
+    target_path = os.path.normpath(os.path.join(FILES_DIR, path.lstrip('/')))
     if not target_path.startswith(FILES_DIR):
         raise HTTPException(status_code=403, detail="Access denied")
+    overlay = session_overlay(x_session_id)
+    lock = path_locks.read(target_path) if overlay is None else nullcontext()
+    if overlay is not None:
+        target_path = overlay.lookup(rel_path(target_path))
+        if target_path is None:
+            return {"error": "File not found"}, None
     try:
-        if not os.path.exists(target_path):
-            return {"error": "File not found"}
-        with open(target_path, "r") as f:
-            file_content = f.read()
-        return {"content": file_content}
+        with lock:
+            if not os.path.exists(target_path):
+                return {"error": "File not found"}, None
+            st = os.stat(target_path)
+            if st.st_size > READ_FILE_MAX_BYTES:
+                return {"error": "File too large, use /api/files/stream"}, None
+            if fresh(st):
+                return None, st
+            # Keyed by the stat too, so a read never shares content older than the file it saw
+            file_content = flights.do(("read", target_path, st.st_ino, st.st_mtime_ns, st.st_size),
+                                      read_text, target_path)
+        return {"content": file_content}, st
     except Exception as e:
-        return {"error": str(e)}
+        return {"error": str(e)}, None
+
+
+def conditional_file(path: str, x_session_id: Optional[str], if_none_match: Optional[str],
+                     if_modified_since: Optional[str]):
+    payload, st = load_file(path, x_session_id,
+                            lambda st: not_modified(stat_etag(st), st.st_mtime, if_none_match, if_modified_since))
+    if st is None:
+        return payload
+    headers = validators(stat_etag(st), st.st_mtime)
+    if payload is None:
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(payload, headers=headers)
+
+
+@app.post("/api/files/read")
+def read_file(request: FileOperationRequest, x_session_id: Optional[str] = Header(None),
+              if_none_match: Optional[str] = Header(None), if_modified_since: Optional[str] = Header(None)):
+    return conditional_file(request.path, x_session_id, if_none_match, if_modified_since)
+
+
+@app.get("/api/files/read")
+def read_file_cached(path: str, x_session_id: Optional[str] = Header(None),
+                     if_none_match: Optional[str] = Header(None), if_modified_since: Optional[str] = Header(None)):
+    # Same payload over GET, so the browser's HTTP cache can revalidate it by itself
+    return conditional_file(path, x_session_id, if_none_match, if_modified_since)
+
+
+@app.get("/api/files/stream")
+def stream_file(path: str, x_session_id: Optional[str] = Header(None),
+                if_none_match: Optional[str] = Header(None), if_modified_since: Optional[str] = Header(None)):
+    # FileResponse reads in fixed-size chunks, answers Range/If-Range requests
+    # with 206/416, and hands the path to the server for zero-copy sendfile when
+    # the ASGI server advertises the http.response.pathsend extension.
+    target_path = safe_path(path)
+    overlay = session_overlay(x_session_id)
+    if overlay is not None:
+        target_path = overlay.lookup(rel_path(target_path))
+    if target_path is None or not os.path.isfile(target_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    st = os.stat(target_path)
+    headers = validators(stat_etag(st), st.st_mtime)
+    if not_modified(headers["ETag"], st.st_mtime, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+    media_type = mimetypes.guess_type(target_path)[0] or "application/octet-stream"
+    # Our validators replace FileResponse's own, so /read and /stream agree
+    return FileResponse(target_path, media_type=media_type, content_disposition_type="inline",
+                        stat_result=st, headers=headers)
 
 
 @app.post("/api/files/write")
-def write_file(request: FileOperationRequest):
+def write_file(request: FileOperationRequest, x_session_id: Optional[str] = Header(None)):
     target_path = os.path.normpath(os.path.join(FILES_DIR, request.path.lstrip('/')))
     if not target_path.startswith(FILES_DIR):
         raise HTTPException(status_code=403, detail="Access denied")
+    overlay = session_overlay(x_session_id)
+    data = (request.content or "").encode("utf-8")
+    if overlay is not None:
+        return session_call(lambda: (check_quota(overlay, target_path, len(data)),
+                                     overlay.write(rel_path(target_path), data)))
     try:
-        with open(target_path, "w") as f:
-            f.write(request.content or "")
+        with path_locks.write(target_path):
+            check_quota(None, target_path, len(data))
+            save_file(target_path, data)
+        changed("write", target_path)
         return {"status": "success"}
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        touched(target_path)
 
 
 @app.post("/api/files/create")
-def create_item(request: FileOperationRequest):
+def create_item(request: FileOperationRequest, x_session_id: Optional[str] = Header(None)):
     target_path = os.path.normpath(os.path.join(FILES_DIR, request.path.lstrip('/')))
     if not target_path.startswith(FILES_DIR):
         raise HTTPException(status_code=403, detail="Access denied")
-    try:
+    overlay = session_overlay(x_session_id)
+    data = b"" if request.type == "folder" else (request.content or "").encode("utf-8")
+    if overlay is not None:
+        rel = rel_path(target_path)
         if request.type == "folder":
-            os.makedirs(target_path, exist_ok=True)
-        else:
-            # Ensure parent directory exists
-            os.makedirs(os.path.dirname(target_path), exist_ok=True)
-            with open(target_path, "w") as f:
-                f.write(request.content or "")
+            return session_call(lambda: (check_quota(overlay, target_path, 0), overlay.mkdir(rel)))
+        return session_call(lambda: (check_quota(overlay, target_path, len(data)),
+                                     overlay.mkdir(os.path.dirname(rel)), overlay.write(rel, data)))
+    try:
+        with path_locks.write(target_path):
+            check_quota(None, target_path, len(data))
+            if request.type == "folder":
+                os.makedirs(target_path, exist_ok=True)
+            else:
+                # Ensure parent directory exists
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                save_file(target_path, data)
+        changed("create", target_path)
         return {"status": "success"}
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        touched(target_path)
 
 
 @app.post("/api/files/delete")
-def delete_item(request: FileOperationRequest):
+def delete_item(request: FileOperationRequest, x_session_id: Optional[str] = Header(None)):
     target_path = os.path.normpath(os.path.join(FILES_DIR, request.path.lstrip('/')))
     if not target_path.startswith(FILES_DIR):
         raise HTTPException(status_code=403, detail="Access denied")
+    overlay = session_overlay(x_session_id)
+    if overlay is not None:
+        return session_call(overlay.delete, rel_path(target_path))
     try:
-        if os.path.isdir(target_path):
-            shutil.rmtree(target_path)
-        else:
-            os.remove(target_path)
+        with path_locks.write(target_path), structural_change():
+            storage.delete(target_path)
+        changed("delete", target_path)
         return {"status": "success"}
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        touched(target_path)
 
 
 @app.post("/api/files/move")
-def move_item(request: FileOperationRequest):
+def move_item(request: FileOperationRequest, x_session_id: Optional[str] = Header(None)):
     src = os.path.normpath(os.path.join(FILES_DIR, request.path.lstrip('/')))
     dst = os.path.normpath(os.path.join(FILES_DIR, request.destination.lstrip('/')))
     if not src.startswith(FILES_DIR) or not dst.startswith(FILES_DIR):
         raise HTTPException(status_code=403, detail="Access denied")
+    overlay = session_overlay(x_session_id)
+    if overlay is not None:
+        return session_call(overlay.move, rel_path(src), rel_path(dst))
     try:
-        shutil.move(src, dst)
+        with path_locks.write(src, dst), structural_change():
+            shutil.move(src, dst)
+        changed("move", src, dst)
         return {"status": "success"}
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        touched(src, dst)
 
 
 @app.post("/api/files/copy")
-def copy_item(request: FileOperationRequest):
+def copy_item(request: FileOperationRequest, x_session_id: Optional[str] = Header(None)):
     src = os.path.normpath(os.path.join(FILES_DIR, request.path.lstrip('/')))
     dst = os.path.normpath(os.path.join(FILES_DIR, request.destination.lstrip('/')))
     if not src.startswith(FILES_DIR) or not dst.startswith(FILES_DIR):
         raise HTTPException(status_code=403, detail="Access denied")
+    overlay = session_overlay(x_session_id)
+    if overlay is not None:
+        nbytes, files, folders = usage_of(overlay.lookup(rel_path(src)) or src)
+        return session_call(lambda: (check_quota(overlay, dst, nbytes, files + folders),
+                                     overlay.copy(rel_path(src), rel_path(dst))))
     try:
-        if os.path.isdir(src):
-            shutil.copytree(src, dst)
-        else:
-            shutil.copy2(src, dst)
+        with path_locks.hold(shared=[src], exclusive=[dst]), structural_change():
+            nbytes, files, folders = usage_of(src)
+            check_quota(None, dst, nbytes, files + folders)
+            storage.copy(src, dst)
+        changed("copy", src, dst)
         return {"status": "success"}
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        touched(dst)
+
+
+def place_file(overlay, target_path: str, src: str, size: int):
+    """Move the finished file ``src`` (``size`` bytes) to ``target_path``, creating parent folders."""
+    if overlay is not None:
+        rel = rel_path(target_path)
+        check_quota(overlay, target_path, size)
+        overlay.mkdir(os.path.dirname(rel))
+        overlay.adopt(rel, src)
+        return
+    try:
+        # A rename into place, which the journal doesn't record
+        with path_locks.write(target_path), structural_change():
+            check_quota(None, target_path, size)
+            existed = os.path.exists(target_path)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            storage.adopt(target_path, src)
+        changed("write" if existed else "create", target_path)
+    finally:
+        touched(target_path)
+
+
+class UploadRequest(BaseModel):
+    path: str
+    size: int
+    sha256: Optional[str] = None
+
+
+def upload_error(e: UploadError) -> HTTPException:
+    return HTTPException(status_code=e.status, detail=str(e))
+
+
+@app.post("/api/files/uploads")
+def start_upload(request: UploadRequest, x_session_id: Optional[str] = Header(None)):
+    """Begin a chunked upload of ``size`` bytes to ``path``; PUT the chunks, then commit."""
+    target_path = safe_path(request.path)
+    if target_path == FILES_DIR:
+        raise HTTPException(status_code=400, detail="Upload needs a file path")
+    if not 0 <= request.size <= MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Uploads are limited to {human(MAX_UPLOAD_BYTES)}")
+    overlay = session_overlay(x_session_id)
+    try:
+        check_quota(overlay, target_path, request.size)
+        return uploads.start("/" + rel_path(target_path), request.size, x_session_id, request.sha256)
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except UploadError as e:
+        raise upload_error(e)
+
+
+@app.get("/api/files/uploads/{upload_id}")
+def upload_status(upload_id: str, x_session_id: Optional[str] = Header(None)):
+    """Received and missing byte ranges, for resuming after a dropped connection.
+
+    Like the calls below, only answered for the session that started the upload.
+    """
+    try:
+        return uploads.status(upload_id, x_session_id)
+    except UploadError as e:
+        raise upload_error(e)
+
+
+@app.put("/api/files/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0),
+                       x_chunk_sha256: Optional[str] = Header(None), x_session_id: Optional[str] = Header(None)):
+    # The body is written to disk as it arrives; nothing holds a whole chunk in memory
+    try:
+        writer = await run_in_threadpool(uploads.chunk, upload_id, x_session_id, offset, x_chunk_sha256)
+        try:
+            async for piece in request.stream():
+                if piece:
+                    await run_in_threadpool(writer.write, piece)
+        except BaseException:
+            writer.discard()
+            raise
+        return await run_in_threadpool(writer.finish)
+    except UploadError as e:
+        raise upload_error(e)
+
+
+@app.post("/api/files/uploads/{upload_id}/commit")
+def commit_upload(upload_id: str, x_session_id: Optional[str] = Header(None)):
+    try:
+        meta, data = uploads.finish(upload_id, x_session_id)
+    except UploadError as e:
+        if e.status == 422:
+            uploads.discard(upload_id)
+        raise upload_error(e)
+    result = session_call(place_file, session_overlay(meta["session"]), safe_path(meta["path"]), data, meta["size"])
+    if "error" in result:
+        return result
+    uploads.discard(upload_id, committed=True)
+    return {**result, "path": meta["path"], "size": meta["size"], "sha256": meta["digest"]}
+
+
+@app.delete("/api/files/uploads/{upload_id}")
+def abort_upload(upload_id: str, x_session_id: Optional[str] = Header(None)):
+    try:
+        uploads.meta(upload_id, x_session_id)
+    except UploadError as e:
+        raise upload_error(e)
+    uploads.discard(upload_id)
+    return {"status": "success"}
+
+
+def archive_entries(overlay, target_path: str, arcroot: str):
+    """(arcname, real path, is_dir) for ``target_path`` and everything below it in this view."""
+    if overlay is None:
+        if not os.path.isdir(target_path):
+            yield arcroot, target_path, False
+            return
+        yield arcroot, target_path, True
+        for entry in iter_tree(target_path, ARCHIVE_MAX_DEPTH):
+            yield f"{arcroot}/{entry['path']}", os.path.join(target_path, entry["path"]), entry["type"] == "folder"
+        return
+    rel = rel_path(target_path)
+    real_path = overlay.lookup(rel)
+    if not os.path.isdir(real_path):
+        yield arcroot, real_path, False
+        return
+    yield arcroot, real_path, True
+    for entry in iter_listing(rel, ARCHIVE_MAX_DEPTH, overlay.listdir):
+        real_path = overlay.lookup(f"{rel}/{entry['path']}" if rel else entry["path"])
+        if real_path is not None:
+            yield f"{arcroot}/{entry['path']}", real_path, entry["type"] == "folder"
+
+
+def import_members(overlay, dest_path: str, reader: ArchiveReader) -> dict:
+    """Store the members of ``reader`` below ``dest_path``, one file at a time."""
+    counts = {"files": 0, "folders": 0, "bytes": 0}
+    try:
+        for member in reader:
+            target_path = safe_path(f"{rel_path(dest_path)}/{member.name}")
+            if member.is_dir:
+                if overlay is not None:
+                    check_quota(overlay, target_path, 0)
+                    overlay.mkdir(rel_path(target_path))
+                else:
+                    try:
+                        with path_locks.write(target_path):
+                            check_quota(None, target_path, 0)
+                            os.makedirs(target_path, exist_ok=True)
+                        changed("create", target_path)
+                    finally:
+                        touched(target_path)
+                counts["folders"] += 1
+                continue
+            check_quota(overlay, target_path, member.size)
+            fd, tmp = uploads.temp_file()
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    shutil.copyfileobj(member.stream, f, CHUNK_SIZE)
+                place_file(overlay, target_path, tmp, member.size)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            counts["files"] += 1
+            counts["bytes"] += member.size
+    except (OSError, EOFError, HTTPException, tarfile.TarError, zipfile.BadZipFile) as e:
+        return {"error": e.detail if isinstance(e, HTTPException) else str(e), **counts, "skipped": reader.skipped}
+    return {"status": "success", **counts, "skipped": reader.skipped}
+
+
+@app.get("/api/files/export")
+def export_archive(path: str = "", format: str = Query("tgz", pattern="^(tar|tgz|zip)$"),
+                   level: int = Query(6, ge=0, le=9), parallel: Optional[bool] = None,
+                   x_session_id: Optional[str] = Header(None)):
+    """Stream ``path`` as a tar, tar.gz or zip while it is being built.
+
+    tar.gz is deflated on several threads when ``parallel`` is true, or, if it
+    isn't given, when the tree holds at least PARALLEL_EXPORT_BYTES.
+    """
+    target_path = safe_path(path)
+    overlay = session_overlay(x_session_id)
+    real_path = target_path if overlay is None else overlay.lookup(rel_path(target_path))
+    if real_path is None or not os.path.exists(real_path):
+        raise HTTPException(status_code=404, detail="Path not found")
+    workers = 1
+    if format == "tgz" and parallel is not False:
+        if parallel or usage_of(real_path)[0] >= PARALLEL_EXPORT_BYTES:
+            workers = MAX_WORKERS
+    name = os.path.basename(target_path) or "files"
+    media_type, extension = FORMATS[format]
+    stream = export_stream(archive_entries(overlay, target_path, name), format, level, workers)
+    return StreamingResponse(stream, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{name}{extension}"'})
+
+
+@app.post("/api/files/import")
+async def import_archive(request: Request, path: str = "", format: str = Query("tar", pattern="^(tar|zip)$"),
+                         x_session_id: Optional[str] = Header(None)):
+    """Unpack a tar (plain or compressed) or zip request body into the folder ``path``.
+
+    Tars are extracted while the body is still arriving. A zip keeps its
+    directory at the end, so it is spooled to a scratch file first.
+    """
+    dest_path = safe_path(path)
+    overlay = session_overlay(x_session_id)
+    real_path = dest_path if overlay is None else overlay.lookup(rel_path(dest_path))
+    if real_path is not None and os.path.exists(real_path) and not os.path.isdir(real_path):
+        return {"error": "Not a directory"}
+    if format == "zip":
+        fd, tmp = uploads.temp_file()
+
+        def extract_zip():
+            with open(tmp, "rb") as f:
+                return import_members(overlay, dest_path, ArchiveReader(f, "zip"))
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for piece in request.stream():
+                    await run_in_threadpool(f.write, piece)
+            return await run_in_threadpool(extract_zip)
+        finally:
+            os.remove(tmp)
+
+    pipe = StreamPipe()
+
+    def extract():
+        try:
+            return import_members(overlay, dest_path, ArchiveReader(pipe, "tar"))
+        finally:
+            pipe.abandon()
+
+    extraction = asyncio.ensure_future(run_in_threadpool(extract))
+    try:
+        async for piece in request.stream():
+            if piece and not await run_in_threadpool(pipe.feed, piece):
+                break
+    finally:
+        await run_in_threadpool(pipe.feed, None)
+    return await extraction
+
+
+class BatchOperation(FileOperationRequest):
+    op: str
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+    atomic: bool = False
+
+
+def batch_read(request: FileOperationRequest, x_session_id: Optional[str] = None):
+    return load_file(request.path, x_session_id)[0]
+
+
+BATCH_OPERATIONS = {
+    "read": batch_read,
+    "write": write_file,
+    "create": create_item,
+    "delete": delete_item,
+    "move": move_item,
+    "copy": copy_item,
+}
+
+
+@app.post("/api/files/batch")
+def batch_operations(request: BatchRequest, x_session_id: Optional[str] = Header(None)):
+    if len(request.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+    if request.atomic and x_session_id is not None:
+        # Rollback snapshots work on the shared tree, not on session overlays
+        return {"error": "Atomic batches are not supported with X-Session-Id"}
+
+    steps = []
+    for i, op in enumerate(request.operations):
+        handler = BATCH_OPERATIONS.get(op.op)
+        if handler is None:
+            return {"error": f"Operation {i}: unknown op '{op.op}'"}
+        target_path = safe_path(op.path)
+        if op.op in ("move", "copy"):
+            if not op.destination:
+                return {"error": f"Operation {i}: '{op.op}' requires a destination"}
+            dst = safe_path(op.destination)
+            reads, writes = ([], [target_path, dst]) if op.op == "move" else ([target_path], [dst])
+        elif op.op == "read":
+            reads, writes = [target_path], []
+        else:
+            reads, writes = [], [target_path]
+        steps.append(Step(partial(handler, op, x_session_id=x_session_id), reads, writes))
+
+    status = run_batch(steps, batch_pool, storage, atomic=request.atomic, backup_root=BATCH_DIR,
+                       on_restore=restored)
+    return {
+        "status": status,
+        "results": [{"op": op.op, "path": op.path, **step.result} for op, step in zip(request.operations, steps)]
+    }
 
 
 # ============================================================
@@ -217,385 +1178,1054 @@ def read_root():
 
 
 @app.post("/api/terminal/command")
-def execute_command(request: CommandRequest):
+async def execute_command(request: CommandRequest, x_session_id: Optional[str] = Header(None),
+                          if_none_match: Optional[str] = Header(None)):
     cmd = request.command.strip()
-    parts = cmd.split()
-    operation = parts[0].lower() if parts else ""
-
-    # ---- ECHO ----
-    if operation == "echo":
-        if ">" in parts:
-            idx = parts.index(">")
-            text_parts = parts[1:idx]
-            filename = parts[idx + 1] if len(parts) > idx + 1 else None
-            text = " ".join(text_parts).strip('"').strip("'")
-            if filename:
-                target_path = os.path.normpath(os.path.join(FILES_DIR, filename.lstrip('/')))
-                if not target_path.startswith(FILES_DIR):
-                    return {"type": "error", "content": "Access denied"}
+    term = terminal_session(x_session_id)
+    if term is not None and cmd:
+        term.record(cmd)
+    try:
+        try:
+            chain = parse(cmd, term.getenv if term is not None else DEFAULT_ENV.get)
+        except ShellError as e:
+            return FastJSONResponse({"type": "error", "content": f"ghost-sh: {e}"})
+        # Static commands are answered on the event loop without a threadpool hop
+        argv = simple_command(chain)
+        rendered = registry.rendered(argv[0].lower()) if argv is not None else None
+        if rendered is not None:
+            return cached_json(*rendered, if_none_match)
+        # Other handlers (and loading a session) may touch the disk, so they still
+        # run in the threadpool. Returning a response skips FastAPI's
+        # jsonable_encoder pass over plain dicts.
+        result = await run_in_threadpool(run_command, chain, x_session_id)
+        return FastJSONResponse(result)
+    finally:
+        if term is not None:
+            terminal_sessions.update(term)
+
+
+def command_context(session_id: Optional[str]) -> SimpleNamespace:
+    return SimpleNamespace(overlay=session_overlay(session_id), term=terminal_session(session_id))
+
+
+def command_messages(chain, ctx):
+    """Output messages for a parsed command line, as registry.stream() produces them."""
+    argv = simple_command(chain)
+    if argv is not None or not chain:
+        argv = argv or [""]
+        return registry.stream(argv[0].lower(), argv[1:], ctx)
+    return shell.run(chain, ctx)
+
+
+def run_command(chain, session_id: Optional[str]) -> dict:
+    ctx = command_context(session_id)
+    argv = simple_command(chain)
+    if argv is not None or not chain:
+        # A plain command keeps its own result type (list, clear, ...)
+        argv = argv or [""]
+        return registry.dispatch(argv[0].lower(), argv[1:], ctx)
+    lines, kind = [], "text"
+    for message in shell.run(chain, ctx):
+        if len(lines) >= MAX_OUTPUT_LINES:
+            lines.append(f"... output truncated at {MAX_OUTPUT_LINES} lines")
+            break
+        lines.append(message["content"])
+        # The chain failed if its last message is an error
+        kind = message["type"] if message["type"] == "error" else "text"
+    return {"type": kind, "content": "\n".join(lines)}
+
+
+# Characters after which the next word is a command name rather than an argument
+COMMAND_BREAKS = "|;&"
+
+
+def completion_token(line: str):
+    """(start, token, is_command) for the word being typed at the end of ``line``."""
+    start = max(line.rfind(c) for c in " \t|;&<>") + 1
+    before = line[:start].rstrip()
+    is_command = not before or before[-1] in COMMAND_BREAKS or before.split()[-1] == "sudo"
+    return start, line[start:], is_command
+
+
+def complete_path(token: str, cwd: str, limit: int, session_id: Optional[str], indexed_only: bool = False):
+    """(completions, suggestions) for a path being typed; completions replace the whole token.
+
+    With ``indexed_only``, None when the directory would have to be listed first.
+    """
+    head, _, prefix = token.rpartition("/")
+    head = head + "/" if "/" in token else ""
+    if token.startswith("/"):
+        directory = head or "/"
+    elif session_id is not None:
+        directory = cwd_path(head or ".", session_id)
+    else:
+        directory = normalize(f"{cwd}/{head}")
+    try:
+        real_dir = safe_path(directory)
+        overlay = session_overlay(session_id)
+        if overlay is None:
+            names = path_index.cached(real_dir) if indexed_only else path_index.get(real_dir)
+            if names is None:
+                return None
+        else:
+            names = DirNames(0, overlay.listdir(rel_path(real_dir)))
+    except (HTTPException, OSError):
+        return [], []
+    completions = [head + name for name in PathIndex.complete(names, prefix, limit)]
+    if completions or not prefix:
+        return completions, []
+    return completions, [head + name for name in PathIndex.suggest(names, prefix)]
+
+
+def complete_line(line: str, cwd: str, limit: int, session_id: Optional[str],
+                  indexed_only: bool = False) -> Optional[dict]:
+    started = time.perf_counter()
+    start, token, is_command = completion_token(line)
+    if is_command and "/" not in token:
+        kind, completions = "command", command_index.complete(token, limit)
+        suggestions = command_index.suggest(token) if token and not completions else []
+    else:
+        kind = "path"
+        found = complete_path(token, cwd, limit, session_id, indexed_only)
+        if found is None:
+            return None
+        completions, suggestions = found
+    return {
+        "start": start,
+        "token": token,
+        "kind": kind,
+        "completions": completions,
+        "common": os.path.commonprefix(completions),
+        "suggestions": suggestions,
+        "took_us": round((time.perf_counter() - started) * 1e6, 1),
+    }
+
+
+@app.get("/api/terminal/complete")
+async def complete(line: str = "", cwd: str = "/", limit: int = Query(50, ge=1, le=500),
+                   x_session_id: Optional[str] = Header(None)):
+    """Completions for the last word of ``line``: command names, or paths relative to the
+    session's cwd (``cwd`` for clients that track it themselves). ``common`` is what Tab
+    can insert outright; ``suggestions`` are near misses when nothing matches.
+    """
+    # Without a session, and with the directory already indexed, everything is in
+    # memory but a stat, so it is answered on the event loop. Listing a directory
+    # or loading a session touches the disk, so those go to the threadpool
+    if x_session_id is None:
+        result = complete_line(line, cwd, limit, None, indexed_only=True)
+        if result is not None:
+            return result
+    return await run_in_threadpool(complete_line, line, cwd, limit, x_session_id)
+
+
+@app.get("/api/terminal/sessions")
+def terminal_session_stats():
+    return {"sessions": terminal_sessions.stats()}
+
+
+@app.get("/api/terminal/commands")
+def command_stats():
+    return {"commands": registry.stats()}
+
+
+terminal_sockets = 0
+
+
+@app.websocket("/api/terminal/ws")
+async def terminal_socket(websocket: WebSocket, session_id: Optional[str] = None):
+    """Run commands over one connection, streaming their output line by line.
+
+    Client sends {"id": n, "command": "ping host"}; the server answers with
+    {"id": n, "type": "line", ...} per line for streaming commands (or one
+    ordinary text/list/error/clear message), then {"id": n, "type": "done"}.
+    The session id travels as a query parameter since browsers can't set
+    headers on a WebSocket.
+    """
+    global terminal_sockets
+    if terminal_sockets >= MAX_TERMINAL_SOCKETS:
+        await websocket.close(code=1013)    # try again later
+        return
+    terminal_sockets += 1
+    try:
+        await websocket.accept()
+        try:
+            ctx = await run_in_threadpool(command_context, session_id)
+        except HTTPException as e:
+            await websocket.close(code=1008, reason=e.detail)
+            return
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                cid = message.get("id")
+                cmd = str(message.get("command", "")).strip()
+            except (ValueError, AttributeError):
+                await send_frame(websocket, {"type": "error", "content": "Expected {\"id\", \"command\"} JSON"})
+                continue
+            # Re-fetched per command: an idle socket's terminal state may have expired
+            ctx.term = terminal_session(session_id)
+            if ctx.term is not None and cmd:
+                ctx.term.record(cmd)
+            try:
                 try:
-                    with open(target_path, "w") as f:
-                        f.write(text)
-                    return {"type": "text", "content": f"Wrote to {filename}"}
-                except Exception as e:
-                    return {"type": "error", "content": str(e)}
-            else:
-                return {"type": "error", "content": "Usage: echo 'text' > filename"}
+                    chain = parse(cmd, ctx.term.getenv if ctx.term is not None else DEFAULT_ENV.get)
+                except ShellError as e:
+                    await send_frame(websocket, {"id": cid, "type": "error", "content": f"ghost-sh: {e}"})
+                    await send_frame(websocket, {"id": cid, "type": "done", "ms": 0.0})
+                    continue
+                await stream_command(websocket, cid, command_messages(chain, ctx))
+            finally:
+                if ctx.term is not None:
+                    terminal_sessions.update(ctx.term)
+    except (WebSocketDisconnect, asyncio.TimeoutError):
+        pass
+    finally:
+        terminal_sockets -= 1
+
+
+async def send_frame(websocket: WebSocket, message: dict):
+    await asyncio.wait_for(websocket.send_text(dumps(message).decode()), TERMINAL_SEND_TIMEOUT)
+
+
+async def stream_command(websocket: WebSocket, cid, messages):
+    # The generator is advanced one message at a time, and only after the
+    # previous frame has been handed to the transport. A client that reads
+    # slowly pauses its own command instead of growing a buffer here.
+    start = time.perf_counter()
+    try:
+        while True:
+            message = await run_in_threadpool(next, messages, None)
+            if message is None:
+                break
+            await send_frame(websocket, {"id": cid, **message})
+    finally:
+        try:
+            messages.close()
+        except ValueError:
+            # Cancelled while a worker thread is still inside next(); it finishes on its own
+            pass
+    await send_frame(websocket, {"id": cid, "type": "done",
+                                 "ms": round((time.perf_counter() - start) * 1000, 3)})
+
+
+# Offered when nothing registered is close to a command that wasn't found
+FALLBACK_SUGGESTIONS = ["help", "scan", "neofetch", "whoami", "status"]
+
+
+def unknown_command(operation, args):
+    suggestions = command_index.suggest(operation)
+    if suggestions:
+        hint = f"Did you mean: {', '.join(suggestions)}"
+    else:
+        hint = f"Try: {', '.join(FALLBACK_SUGGESTIONS)}"
+    return {
+        "type": "error",
+        "content": f"'{operation}': command not found\n  {hint}"
+    }
+
+
+registry.fallback = unknown_command
+
+
+# ---- FILE SYSTEM ----
+# cat, touch, mkdir, rm, cp and mv run in the client against /api/files/*; they
+# are documented here so help stays complete. Paths given to the commands below
+# are relative to the session's cwd (or to / without an X-Session-Id).
+
+def term_path(ctx, path: str) -> str:
+    term = ctx.term if ctx is not None else None
+    return term.resolve(path) if term is not None else normalize(path)
+
+
+def visible_dir(ctx, path: str) -> Optional[str]:
+    """Real directory behind virtual ``path`` in this request's view, or None."""
+    target_path = safe_path(path)
+    overlay = ctx.overlay if ctx is not None else None
+    if overlay is not None:
+        target_path = overlay.lookup(rel_path(target_path))
+    return target_path if target_path is not None and os.path.isdir(target_path) else None
+
+
+def open_lines(ctx, path: str):
+    """Lines of a file in this request's view, for cat and the pipeline filters."""
+    target_path = os.path.normpath(os.path.join(FILES_DIR, term_path(ctx, path).lstrip('/')))
+    if not target_path.startswith(FILES_DIR):
+        raise PermissionError(f"{path}: Access denied")
+    overlay = ctx.overlay if ctx is not None else None
+    real_path = overlay.lookup(rel_path(target_path)) if overlay is not None else target_path
+    if real_path is None or not os.path.exists(real_path):
+        raise FileNotFoundError(f"{path}: No such file")
+    if os.path.isdir(real_path):
+        raise IsADirectoryError(f"{path}: Is a directory")
+    with open(real_path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+def write_output(ctx, path: str, data: bytes, append: bool):
+    """Store redirected output; the shell calls this for '>' and '>>'."""
+    target_path = os.path.normpath(os.path.join(FILES_DIR, term_path(ctx, path).lstrip('/')))
+    if not target_path.startswith(FILES_DIR):
+        raise PermissionError(f"{path}: Access denied")
+    overlay = ctx.overlay if ctx is not None else None
+    if visible_dir(ctx, term_path(ctx, path)) is not None:
+        raise IsADirectoryError(f"{path}: Is a directory")
+    if overlay is not None:
+        if append:
+            real_path = overlay.lookup(rel_path(target_path))
+            if real_path is not None and os.path.isfile(real_path):
+                with open(real_path, "rb") as f:
+                    data = f.read() + data
+        check_quota(overlay, target_path, len(data))
+        overlay.write(rel_path(target_path), data)
+        return
+    # '>>' is read-modify-write, so the lock covers the read as well
+    try:
+        with path_locks.write(target_path):
+            if append and os.path.isfile(target_path):
+                with open(target_path, "rb") as f:
+                    data = f.read() + data
+            check_quota(None, target_path, len(data))
+            save_file(target_path, data)
+        changed("write", target_path)
+    finally:
+        touched(target_path)
+
+
+shell = Shell(registry, open_lines, write_output)
+
+
+# Short options ls accepts, alone or combined ("-la"); the client does the formatting
+LS_FLAGS = set("aAlh1")
+
+
+@registry.command("ls", usage="ls [path]", description="List files", category="FILE SYSTEM",
+                  detail="ls [-alh] [PATH] lists PATH; short options may be combined (-la).", context=True)
+def cmd_ls(args, ctx):
+    flags = "".join(a[1:] for a in args if a.startswith("-") and a != "-")
+    paths = [a for a in args if not a.startswith("-") or a == "-"]
+    unknown = sorted(set(flags) - LS_FLAGS)
+    if unknown:
+        return {"type": "error", "content": f"ls: invalid option -- '{unknown[0]}'"}
+    if len(paths) > 1:
+        return registry.get("ls").usage_error()
+    path = term_path(ctx, paths[0] if paths else "")
+    real_path = visible_dir(ctx, path)
+    if real_path is None:
+        return {"type": "error", "content": f"ls: {path}: No such directory"}
+    overlay = ctx.overlay if ctx is not None else None
+    entries = overlay.listdir(rel_path(safe_path(path))) if overlay is not None else dir_index.list(real_path)
+    return {"type": "list", "content": entries}
+
+
+@registry.command("cd", usage="cd [path]", description="Change directory", category="FILE SYSTEM",
+                  max_args=1, context=True)
+def cmd_cd(args, ctx):
+    if ctx is None or ctx.term is None:
+        return {"type": "error", "content": "cd: no terminal session (send X-Session-Id)"}
+    path = ctx.term.resolve(args[0] if args else "~")
+    if visible_dir(ctx, path) is None:
+        return {"type": "error", "content": f"cd: {args[0]}: No such directory"}
+    ctx.term.cwd = path
+    return {"type": "text", "content": f"→ {path}"}
+
+
+@registry.command("pwd", description="Working directory", category="FILE SYSTEM", context=True)
+def cmd_pwd(args, ctx):
+    return {"type": "text", "content": ctx.term.cwd if ctx is not None and ctx.term is not None else "/"}
+
+
+@registry.command("cat", usage="cat [file]", description="Read file", category="FILE SYSTEM",
+                  min_args=1, context=True)
+def cmd_cat(args, ctx):
+    yield from FILTERS["cat"](args, None, partial(open_lines, ctx))
+
+
+registry.document("touch", "touch [file]", "Create file", "FILE SYSTEM")
+registry.document("mkdir", "mkdir [dir]", "Create folder", "FILE SYSTEM")
+registry.document("rm", "rm [file]", "Delete file/dir", "FILE SYSTEM")
+registry.document("cp", "cp [src] [dst]", "Copy", "FILE SYSTEM")
+registry.document("mv", "mv [src] [dst]", "Move", "FILE SYSTEM")
+
+
+@registry.command("echo", usage="echo [text]", description="Print text", category="FILE SYSTEM")
+def cmd_echo(args):
+    # Quoting and '>' redirection are handled by the shell before echo runs
+    return {"type": "text", "content": " ".join(args)}
+
+
+@registry.command("grep", usage="grep [pattern]", description="Search contents",
+                  category="FILE SYSTEM", min_args=1, detail="grep [-i] PATTERN [path] prints lines containing PATTERN.",
+                  context=True)
+def cmd_grep(args, ctx):
+    ignore_case = "-i" in args
+    args = [a for a in args if a != "-i"]
+    if not args:
+        return registry.get("grep").usage_error()
+    pattern = args[0].strip('"').strip("'")
+    scope = term_path(ctx, args[1] if len(args) > 1 else "")
+    safe_path(scope)
+    matches = sorted(m for index, visible in search_views(ctx.overlay if ctx is not None else None)
+                     for m in index.grep(pattern, scope=scope, ignore_case=ignore_case, visible=visible))[:200]
+    if not matches:
+        return {"type": "text", "content": f"grep: no matches for '{pattern}'"}
+    return {"type": "text", "content": "\n".join(f"/{doc}:{lineno}: {line}" for doc, lineno, line in matches)}
+
+
+@registry.command("find", usage="find [-name p]", description="Find by name",
+                  category="FILE SYSTEM", context=True)
+def cmd_find(args, ctx):
+    scope, pattern, kind = "", "*", None
+    i = 0
+    while i < len(args):
+        if args[i] == "-name" and i + 1 < len(args):
+            pattern = args[i + 1].strip('"').strip("'")
+            i += 2
+        elif args[i] == "-type" and i + 1 < len(args):
+            kind = {"f": "file", "d": "folder"}.get(args[i + 1])
+            i += 2
         else:
-            text = " ".join(parts[1:]).strip('"').strip("'")
-            return {"type": "text", "content": text}
-
-    # ---- WHOAMI ----
-    elif operation == "whoami":
-        return {
-            "type": "text",
-            "content": "ID: USER_01\nROLE: GHOST_ADMIN\nACCESS_LEVEL: 7\nLOCATION: PROXY_CHAIN_ACTIVE\nCLEARANCE: ██████████\nSTATUS: UNDETECTED"
-        }
-
-    # ---- NEOFETCH ----
-    elif operation == "neofetch":
-        return {
-            "type": "text",
-            "content": (
-                "  ██████╗██╗   ██╗██████╗ ███████╗██████╗ \n"
-                " ██╔════╝╚██╗ ██╔╝██╔══██╗██╔════╝██╔══██╗\n"
-                " ██║      ╚████╔╝ ██████╔╝█████╗  ██████╔╝\n"
-                " ██║       ╚██╔╝  ██╔══██╗██╔══╝  ██╔══██╗\n"
-                " ╚██████╗   ██║   ██████╔╝███████╗██║  ██║\n"
-                "  ╚═════╝   ╚═╝   ╚═════╝ ╚══════╝╚═╝  ╚═╝\n"
-                "──────────────────────────────────\n"
-                f"  OS:       CYBER_OS v2.1 [QUANTUM]\n"
-                f"  Kernel:   4.19.0-PHANTOM\n"
-                f"  Shell:    ghost-sh 3.2.1\n"
-                f"  CPU:      Quantum Core i9 @ 8.2 GHz\n"
-                f"  GPU:      NV-CORTEX RTX 9090\n"
-                f"  RAM:      65536 MB DDR6\n"
-                f"  Disk:     2.1 TB / 4 TB (52%)\n"
-                f"  Network:  DR_NET [ENCRYPTED]\n"
-                f"  Uptime:   4209h 37m\n"
-                f"  Packages: 1337 (apt)\n"
-                f"  User:     USER_01@SECTOR-7G"
-            )
-        }
-
-    # ---- SCAN ----
-    elif operation == "scan":
-        target = parts[1] if len(parts) > 1 else "LOCAL_NETWORK"
-        ports = sorted(random.sample(range(20, 9999), 6))
-        port_lines = "\n".join([
-            f"  PORT {p:>5}  {'OPEN' if random.random() > 0.3 else 'FILTERED'}  {random.choice(['ssh','http','https','ftp','smtp','telnet','unknown','dark-relay'])}"
-            for p in ports
-        ])
-        return {
-            "type": "text",
-            "content": (
-                f"SCANNING TARGET: {target}\n"
-                f"{'─' * 40}\n"
-                f"  Host: {target}\n"
-                f"  Status: UP (latency: {random.randint(1, 50)}ms)\n"
-                f"  Ports discovered:\n"
-                f"{port_lines}\n"
-                f"{'─' * 40}\n"
-                f"  {random.randint(2, 6)} services detected.\n"
-                f"  ⚠ CAUTION: Scan may have been logged."
-            )
-        }
-
-    # ---- PING ----
-    elif operation == "ping":
-        target = parts[1] if len(parts) > 1 else "localhost"
-        lines = [f"PING {target} ({random.randint(10, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)})"]
-        for i in range(4):
-            ms = round(random.uniform(0.5, 120.0), 1)
-            lines.append(f"  seq={i} ttl={random.randint(48, 128)} time={ms}ms")
-        avg = round(random.uniform(5.0, 80.0), 1)
-        lines.append(f"--- {target} ping statistics ---")
-        lines.append(f"  4 packets transmitted, {random.choice([4, 4, 4, 3])} received, avg={avg}ms")
-        return {"type": "text", "content": "\n".join(lines)}
-
-    # ---- TRACEROUTE ----
-    elif operation in ("traceroute", "tracert"):
-        target = parts[1] if len(parts) > 1 else "ghost.onion"
-        hops = random.randint(6, 14)
-        lines = [f"traceroute to {target}, {hops} hops max"]
-        locations = ["LOCAL_GW", "ISP_NODE", "PROXY_01", "TOR_ENTRY", "RELAY_ALPHA", "DARK_NODE", "GHOST_RELAY",
-                     "SECTOR_7G", "QUANTUM_BRIDGE", "MIRROR_NODE", "EXIT_NODE", "FINAL_HOP", "TARGET", "???"]
-        for i in range(hops):
-            ms = round(random.uniform(1.0, 300.0), 1)
-            loc = locations[i] if i < len(locations) else f"NODE_{random.randint(100, 999)}"
-            if random.random() > 0.85:
-                lines.append(f"  {i + 1}  * * * [REQUEST TIMED OUT]")
-            else:
-                lines.append(f"  {i + 1}  {loc}  {ms}ms")
-        lines.append(f"  Trace complete. Route {'SECURE' if random.random() > 0.3 else '⚠ POTENTIALLY COMPROMISED'}.")
-        return {"type": "text", "content": "\n".join(lines)}
-
-    # ---- PS (processes) ----
-    elif operation == "ps":
-        processes = [
-            {"pid": 1, "name": "systemd", "cpu": 0.1, "mem": 2.3},
-            {"pid": 42, "name": "kernel_watchdog", "cpu": 0.0, "mem": 0.8},
-            {"pid": 137, "name": "ghost-shell", "cpu": 1.2, "mem": 4.1},
-            {"pid": 256, "name": "network_monitor", "cpu": round(random.uniform(0.5, 8.0), 1), "mem": 3.2},
-            {"pid": 314, "name": "crypto_miner", "cpu": round(random.uniform(15.0, 45.0), 1), "mem": 12.4},
-            {"pid": 404, "name": "shadow_daemon", "cpu": round(random.uniform(0.1, 2.0), 1), "mem": 1.7},
-            {"pid": 512, "name": "firewall_v3", "cpu": 0.3, "mem": 5.6},
-            {"pid": 666, "name": "UNKNOWN_PROCESS", "cpu": round(random.uniform(5.0, 25.0), 1), "mem": round(random.uniform(3.0, 15.0), 1)},
-            {"pid": 777, "name": "data_exfil_agent", "cpu": round(random.uniform(1.0, 5.0), 1), "mem": 2.1},
-            {"pid": 1024, "name": "proxy_chain", "cpu": 0.8, "mem": 3.0},
-        ]
-        header = f"{'PID':>6}  {'PROCESS':<22}  {'CPU%':>6}  {'MEM%':>6}"
-        lines = [header, "─" * 48]
-        for p in processes:
-            warn = " ⚠" if p["cpu"] > 10 else ""
-            lines.append(f"{p['pid']:>6}  {p['name']:<22}  {p['cpu']:>5.1f}%  {p['mem']:>5.1f}%{warn}")
-        lines.append(f"\n  Total: {len(processes)} processes | CPU: {sum(p['cpu'] for p in processes):.1f}%")
-        return {"type": "text", "content": "\n".join(lines)}
-
-    # ---- UPTIME ----
-    elif operation == "uptime":
-        hours = 4209 + random.randint(0, 100)
-        return {
-            "type": "text",
-            "content": (
-                f"  System Uptime: {hours}h {random.randint(0, 59)}m {random.randint(0, 59)}s\n"
-                f"  Load Average:  {round(random.uniform(0.1, 2.5), 2)} {round(random.uniform(0.1, 3.0), 2)} {round(random.uniform(0.2, 4.0), 2)}\n"
-                f"  Users Online:  {random.randint(1, 7)}\n"
-                f"  Last Reboot:   2077-01-01 00:00:00 [FORCED]"
-            )
-        }
-
-    # ---- IFCONFIG ----
-    elif operation in ("ifconfig", "ip"):
-        return {
-            "type": "text",
-            "content": (
-                "eth0:\n"
-                f"  inet  10.0.{random.randint(0, 255)}.{random.randint(1, 254)}  mask 255.255.255.0\n"
-                f"  inet6 fe80::{random.randint(1000, 9999)}:{random.randint(1000, 9999)}::{random.randint(1, 99)}\n"
-                f"  ether AA:BB:CC:{random.randint(10, 99)}:{random.randint(10, 99)}:{random.randint(10, 99)}\n"
-                f"  RX packets: {random.randint(10000, 999999)}  TX packets: {random.randint(10000, 999999)}\n\n"
-                "ghost0 (STEALTH ADAPTER):\n"
-                f"  inet  192.168.{random.randint(0, 255)}.{random.randint(1, 254)}  [MASKED]\n"
-                "  status: CLOAKED\n"
-                "  encryption: AES-512-QUANTUM"
-            )
-        }
-
-    # ---- NMAP ----
-    elif operation == "nmap":
-        target = parts[1] if len(parts) > 1 else "192.168.1.0/24"
-        hosts = random.randint(3, 12)
-        lines = [
-            f"Starting Nmap 7.94 ( https://nmap.org )",
-            f"Scanning {target}...",
-            f"Discovered {hosts} live hosts:",
-            "─" * 40,
-        ]
-        for i in range(min(hosts, 8)):
-            ip = f"192.168.1.{random.randint(1, 254)}"
-            hostname = random.choice(["ROUTER", "DESKTOP-01", "UNKNOWN", "PRINTER", "NAS_VAULT",
-                                      "IOT_DEVICE", "CAMERA_03", "GHOST_NODE", "SMART_LOCK"])
-            lines.append(f"  {ip:<16} {hostname:<16} {'UP' if random.random() > 0.1 else 'FILTERED'}")
-        lines.append("─" * 40)
-        lines.append(f"Nmap done: {hosts} hosts up. Scan took {random.randint(2, 30)}s.")
-        lines.append("⚠ Some hosts may have detected your scan.")
-        return {"type": "text", "content": "\n".join(lines)}
-
-    # ---- DECRYPT ----
-    elif operation == "decrypt":
-        target = parts[1] if len(parts) > 1 else None
-        if not target:
-            return {"type": "error", "content": "Usage: decrypt [filename]\n  Attempts to decrypt an encrypted file."}
-        stages = [
-            f"Analyzing {target}...",
-            "Identifying encryption: AES-256-CBC",
-            "Attempting key rotation...",
-            "Brute-forcing key space: ████████████░░░░ 76%",
-            "Key fragment found: X7-PH4NT0M",
-            "Applying decryption matrix...",
-        ]
-        if random.random() > 0.4:
-            stages.append(f"✓ SUCCESS: {target} decrypted.")
-            stages.append(f"  Decrypted content saved to {target}.dec")
+            scope = args[i]
+            i += 1
+    scope = term_path(ctx, scope)
+    safe_path(scope)
+    found = sorted({rel for index, visible in search_views(ctx.overlay if ctx is not None else None)
+                    for rel in index.find(pattern, scope=scope, kind=kind, visible=visible)})[:500]
+    if not found:
+        return {"type": "text", "content": f"find: nothing matches '{pattern}'"}
+    return {"type": "text", "content": "\n".join(f"/{rel}" for rel in found)}
+
+
+@registry.command("head", usage="head [file]", description="First lines", category="FILE SYSTEM",
+                  min_args=1, detail="head [-n N] FILE... prints the first N (10) lines.", context=True)
+def cmd_head(args, ctx):
+    yield from FILTERS["head"](args, None, partial(open_lines, ctx))
+
+
+@registry.command("tail", usage="tail [file]", description="Last lines", category="FILE SYSTEM",
+                  min_args=1, detail="tail [-n N] FILE... prints the last N (10) lines.", context=True)
+def cmd_tail(args, ctx):
+    yield from FILTERS["tail"](args, None, partial(open_lines, ctx))
+
+
+@registry.command("wc", usage="wc [file]", description="Count lines", category="FILE SYSTEM",
+                  min_args=1, detail="wc [-lwc] FILE... counts lines, words and characters.", context=True)
+def cmd_wc(args, ctx):
+    yield from FILTERS["wc"](args, None, partial(open_lines, ctx))
+
+
+@registry.command("sort", usage="sort [file]", description="Sort lines", category="FILE SYSTEM",
+                  min_args=1, detail="sort [-rnu] FILE... sorts lines.", context=True)
+def cmd_sort(args, ctx):
+    yield from FILTERS["sort"](args, None, partial(open_lines, ctx))
+
+
+@registry.command("uniq", usage="uniq [file]", description="Drop repeats", category="FILE SYSTEM",
+                  min_args=1, detail="uniq [-cdu] FILE... collapses adjacent repeated lines.", context=True)
+def cmd_uniq(args, ctx):
+    yield from FILTERS["uniq"](args, None, partial(open_lines, ctx))
+
+
+def pack(ctx, archive: str, paths: List[str], fmt: str) -> dict:
+    """Write ``paths`` into the archive file ``archive`` in this request's view."""
+    overlay = ctx.overlay if ctx is not None else None
+    groups = []
+    for path in paths:
+        virtual = term_path(ctx, path)
+        target_path = safe_path(virtual)
+        real_path = target_path if overlay is None else overlay.lookup(rel_path(target_path))
+        if real_path is None or not os.path.exists(real_path):
+            raise FileNotFoundError(f"{path}: No such file or directory")
+        # Members are named as given, like GNU tar; absolute paths lose their leading '/'
+        arcname = os.path.normpath(path).lstrip("/")
+        if arcname in ("", ".") or arcname.startswith(".."):
+            arcname = os.path.basename(virtual) or "files"
+        groups.append(archive_entries(overlay, target_path, arcname))
+    members = 0
+
+    def entries():
+        nonlocal members
+        for group in groups:
+            for entry in group:
+                members += 1
+                yield entry
+
+    target_path = safe_path(term_path(ctx, archive))
+    fd, tmp = uploads.temp_file()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in export_stream(entries(), fmt):
+                f.write(chunk)
+        size = os.path.getsize(tmp)
+        place_file(overlay, target_path, tmp, size)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return {"type": "text", "content": f"{archive}: {members} entries, {human(size)}"}
+
+
+def unpack(ctx, archive: str, dest: Optional[str], fmt: str, list_only: bool) -> dict:
+    """Extract (or list) the archive file ``archive`` into ``dest``, the cwd by default."""
+    overlay = ctx.overlay if ctx is not None else None
+    target_path = safe_path(term_path(ctx, archive))
+    real_path = target_path if overlay is None else overlay.lookup(rel_path(target_path))
+    if real_path is None or not os.path.isfile(real_path):
+        raise FileNotFoundError(f"{archive}: No such file")
+    with open(real_path, "rb") as f:
+        reader = ArchiveReader(f, fmt)
+        if list_only:
+            names = [member.name + ("/" if member.is_dir else "") for member in reader]
+            return {"type": "text", "content": "\n".join(names)}
+        dest_virtual = term_path(ctx, dest or "")
+        result = import_members(overlay, safe_path(dest_virtual), reader)
+    if "error" in result:
+        return {"type": "error", "content": f"{archive}: {result['error']}"}
+    text = f"{result['files']} files, {result['folders']} folders ({human(result['bytes'])}) into {dest_virtual}"
+    if result["skipped"]:
+        text += f"\n  skipped {len(result['skipped'])} links, devices or unsafe paths"
+    return {"type": "text", "content": text}
+
+
+@registry.command("tar", usage="tar [-cxtzf] [file]", description="Archive files", category="FILE SYSTEM",
+                  min_args=2, detail="tar -c[z]f ARCHIVE PATH... packs PATHs; tar -xf ARCHIVE [-C DIR] "
+                                     "unpacks; tar -tf ARCHIVE lists. Compression is detected when reading.",
+                  context=True)
+def cmd_tar(args, ctx):
+    opts, archive, dest, paths = set(), None, None, []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        letters = arg.lstrip("-")
+        if arg == "-C" and i + 1 < len(args):
+            dest = args[i + 1]
+            i += 2
+        elif (arg.startswith("-") or i == 0) and letters and set(letters) <= set("cxtzvf"):
+            # Bundled flags, with or without the dash: czf, -xvf
+            opts |= set(letters)
+            i += 1
+            if "f" in letters and i < len(args):
+                archive = args[i]
+                i += 1
+        else:
+            paths.append(arg)
+            i += 1
+    modes = opts & set("cxt")
+    if len(modes) != 1 or archive is None or ("c" in modes and not paths):
+        return registry.get("tar").usage_error()
+    if "c" in modes:
+        gzip = "z" in opts or archive.endswith((".tgz", ".tar.gz"))
+        return pack(ctx, archive, paths, "tgz" if gzip else "tar")
+    return unpack(ctx, archive, dest, "tar", list_only="t" in modes)
+
+
+@registry.command("zip", usage="zip [archive] [path]", description="Zip files", category="FILE SYSTEM",
+                  min_args=2, detail="zip [-r] ARCHIVE PATH... packs PATHs; folders are always included whole.",
+                  context=True)
+def cmd_zip(args, ctx):
+    args = [a for a in args if a != "-r"]
+    if len(args) < 2:
+        return registry.get("zip").usage_error()
+    return pack(ctx, args[0], args[1:], "zip")
+
+
+@registry.command("unzip", usage="unzip [archive]", description="Unzip files", category="FILE SYSTEM",
+                  min_args=1, detail="unzip [-l] ARCHIVE [-d DIR] unpacks into DIR (the cwd), or lists with -l.",
+                  context=True)
+def cmd_unzip(args, ctx):
+    list_only = "-l" in args
+    args = [a for a in args if a != "-l"]
+    dest = None
+    if "-d" in args:
+        i = args.index("-d")
+        if i + 1 >= len(args):
+            return registry.get("unzip").usage_error()
+        dest = args[i + 1]
+        args = args[:i] + args[i + 2:]
+    if len(args) != 1:
+        return registry.get("unzip").usage_error()
+    return unpack(ctx, args[0], dest, "zip", list_only)
+
+
+@registry.command("sha256sum", usage="sha256sum [file]", description="File checksums", category="FILE SYSTEM",
+                  min_args=1, detail="sha256sum FILE... prints the sha256 of each FILE.", context=True)
+def cmd_sha256sum(args, ctx):
+    overlay = ctx.overlay if ctx is not None else None
+    lines, found = [], []
+    for arg in args:
+        target_path = safe_path(term_path(ctx, arg))
+        real_path = target_path if overlay is None else overlay.lookup(rel_path(target_path))
+        if real_path is None or not os.path.exists(real_path):
+            lines.append(f"sha256sum: {arg}: No such file")
+        elif os.path.isdir(real_path):
+            lines.append(f"sha256sum: {arg}: Is a directory")
+        else:
+            found.append((len(lines), arg, real_path))
+            lines.append(None)
+    # Hashed together, so the files are spread over the hashing threads
+    digests, _, _ = manifest.hash_files([real_path for _, _, real_path in found])
+    for (i, arg, _), digest in zip(found, digests):
+        lines[i] = f"{digest}  {arg}" if digest is not None else f"sha256sum: {arg}: No such file"
+    return {"type": "text" if found else "error", "content": "\n".join(lines)}
+
+
+@registry.command("verify", usage="verify [path]", description="Check integrity", category="FILE SYSTEM",
+                  detail="verify [-f] [PATH] checks files against the manifest of recorded changes "
+                         "(in a session, against the seed snapshot); -f rehashes every file instead of "
+                         "trusting unchanged size and mtime.", context=True)
+def cmd_verify(args, ctx):
+    full = "-f" in args or "--full" in args
+    paths = [a for a in args if not a.startswith("-")]
+    path = term_path(ctx, paths[0] if paths else "")
+    target_path = safe_path(path)
+    overlay = ctx.overlay if ctx is not None else None
+    if overlay is not None:
+        report = session_verify(overlay, rel_path(target_path))
+    else:
+        report = manifest.verify(target_path, full) if os.path.exists(target_path) else None
+    if report is None:
+        return {"type": "error", "content": f"verify: {path}: No such file or directory"}
+    lines = [f"MODIFIED   {p}" for p in report["modified"]]
+    lines += [f"MISSING    {p}" for p in report["missing"]]
+    lines += [f"UNTRACKED  {p}" for p in report["untracked"]]
+    mark = "✓ INTACT" if report["intact"] else "✗ TAMPERED"
+    lines.append(f"{mark}: {report['ok']}/{report['checked']} files match the manifest under {path}")
+    if report["hashed_files"]:
+        rate = f", {report['mb_per_s']} MB/s" if report["mb_per_s"] else ""
+        lines.append(f"  hashed {report['hashed_files']} files ({human(report['hashed_bytes'])}) "
+                     f"in {report['hash_ms']} ms{rate}")
+    return {"type": "text" if report["intact"] else "error", "content": "\n".join(lines)}
+
+
+# ---- NETWORK ----
+
+@registry.command("scan", usage="scan [target]", description="Port scan", category="NETWORK")
+def cmd_scan(args):
+    target = args[0] if args else "LOCAL_NETWORK"
+    yield f"SCANNING TARGET: {target}"
+    yield "─" * 40
+    yield f"  Host: {target}"
+    yield f"  Status: UP (latency: {random.randint(1, 50)}ms)"
+    yield "  Ports discovered:"
+    for p in sorted(random.sample(range(20, 9999), 6)):
+        yield f"  PORT {p:>5}  {'OPEN' if random.random() > 0.3 else 'FILTERED'}  {random.choice(['ssh','http','https','ftp','smtp','telnet','unknown','dark-relay'])}"
+    yield "─" * 40
+    yield f"  {random.randint(2, 6)} services detected."
+    yield "  ⚠ CAUTION: Scan may have been logged."
+
+
+@registry.command("ping", usage="ping [host]", description="Ping host", category="NETWORK")
+def cmd_ping(args):
+    target = args[0] if args else "localhost"
+    yield f"PING {target} ({random.randint(10, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)})"
+    for i in range(4):
+        ms = round(random.uniform(0.5, 120.0), 1)
+        yield f"  seq={i} ttl={random.randint(48, 128)} time={ms}ms"
+    avg = round(random.uniform(5.0, 80.0), 1)
+    yield f"--- {target} ping statistics ---"
+    yield f"  4 packets transmitted, {random.choice([4, 4, 4, 3])} received, avg={avg}ms"
+
+
+@registry.command("traceroute", aliases=("tracert",), usage="traceroute [h]", description="Trace route", category="NETWORK")
+def cmd_traceroute(args):
+    target = args[0] if args else "ghost.onion"
+    hops = random.randint(6, 14)
+    yield f"traceroute to {target}, {hops} hops max"
+    locations = ["LOCAL_GW", "ISP_NODE", "PROXY_01", "TOR_ENTRY", "RELAY_ALPHA", "DARK_NODE", "GHOST_RELAY",
+                 "SECTOR_7G", "QUANTUM_BRIDGE", "MIRROR_NODE", "EXIT_NODE", "FINAL_HOP", "TARGET", "???"]
+    for i in range(hops):
+        ms = round(random.uniform(1.0, 300.0), 1)
+        loc = locations[i] if i < len(locations) else f"NODE_{random.randint(100, 999)}"
+        if random.random() > 0.85:
+            yield f"  {i + 1}  * * * [REQUEST TIMED OUT]"
+        else:
+            yield f"  {i + 1}  {loc}  {ms}ms"
+    yield f"  Trace complete. Route {'SECURE' if random.random() > 0.3 else '⚠ POTENTIALLY COMPROMISED'}."
+
+
+@registry.command("nmap", usage="nmap [target]", description="Network map", category="NETWORK")
+def cmd_nmap(args):
+    target = args[0] if args else "192.168.1.0/24"
+    hosts = random.randint(3, 12)
+    yield "Starting Nmap 7.94 ( https://nmap.org )"
+    yield f"Scanning {target}..."
+    yield f"Discovered {hosts} live hosts:"
+    yield "─" * 40
+    for i in range(min(hosts, 8)):
+        ip = f"192.168.1.{random.randint(1, 254)}"
+        hostname = random.choice(["ROUTER", "DESKTOP-01", "UNKNOWN", "PRINTER", "NAS_VAULT",
+                                  "IOT_DEVICE", "CAMERA_03", "GHOST_NODE", "SMART_LOCK"])
+        yield f"  {ip:<16} {hostname:<16} {'UP' if random.random() > 0.1 else 'FILTERED'}"
+    yield "─" * 40
+    yield f"Nmap done: {hosts} hosts up. Scan took {random.randint(2, 30)}s."
+    yield "⚠ Some hosts may have detected your scan."
+
+
+@registry.command("ssh", usage="ssh [user@host]", description="Remote connect", category="NETWORK",
+                  min_args=1, detail="Connect to remote system.")
+def cmd_ssh(args):
+    target = args[0]
+    return {
+        "type": "text",
+        "content": (
+            f"Connecting to {target}...\n"
+            f"Establishing encrypted tunnel...\n"
+            f"Fingerprint: SHA256:{''.join(random.choices('0123456789abcdef', k=40))}\n"
+            f"Authentication: KEY_EXCHANGE\n"
+            f"Connection established.\n"
+            f"WARNING: This session is being monitored.\n"
+            f"Type 'exit' to disconnect."
+        )
+    }
+
+
+# ---- SYSTEM ----
+
+@registry.command("whoami", description="Identity", static=True)
+def cmd_whoami(args):
+    return {
+        "type": "text",
+        "content": "ID: USER_01\nROLE: GHOST_ADMIN\nACCESS_LEVEL: 7\nLOCATION: PROXY_CHAIN_ACTIVE\nCLEARANCE: ██████████\nSTATUS: UNDETECTED"
+    }
+
+
+@registry.command("neofetch", description="System info", static=True)
+def cmd_neofetch(args):
+    return {
+        "type": "text",
+        "content": (
+            "  ██████╗██╗   ██╗██████╗ ███████╗██████╗ \n"
+            " ██╔════╝╚██╗ ██╔╝██╔══██╗██╔════╝██╔══██╗\n"
+            " ██║      ╚████╔╝ ██████╔╝█████╗  ██████╔╝\n"
+            " ██║       ╚██╔╝  ██╔══██╗██╔══╝  ██╔══██╗\n"
+            " ╚██████╗   ██║   ██████╔╝███████╗██║  ██║\n"
+            "  ╚═════╝   ╚═╝   ╚═════╝ ╚══════╝╚═╝  ╚═╝\n"
+            "──────────────────────────────────\n"
+            f"  OS:       CYBER_OS v2.1 [QUANTUM]\n"
+            f"  Kernel:   4.19.0-PHANTOM\n"
+            f"  Shell:    ghost-sh 3.2.1\n"
+            f"  CPU:      Quantum Core i9 @ 8.2 GHz\n"
+            f"  GPU:      NV-CORTEX RTX 9090\n"
+            f"  RAM:      65536 MB DDR6\n"
+            f"  Disk:     2.1 TB / 4 TB (52%)\n"
+            f"  Network:  DR_NET [ENCRYPTED]\n"
+            f"  Uptime:   4209h 37m\n"
+            f"  Packages: 1337 (apt)\n"
+            f"  User:     USER_01@SECTOR-7G"
+        )
+    }
+
+
+@registry.command("ps", description="Processes")
+def cmd_ps(args):
+    processes = [
+        {"pid": 1, "name": "systemd", "cpu": 0.1, "mem": 2.3},
+        {"pid": 42, "name": "kernel_watchdog", "cpu": 0.0, "mem": 0.8},
+        {"pid": 137, "name": "ghost-shell", "cpu": 1.2, "mem": 4.1},
+        {"pid": 256, "name": "network_monitor", "cpu": round(random.uniform(0.5, 8.0), 1), "mem": 3.2},
+        {"pid": 314, "name": "crypto_miner", "cpu": round(random.uniform(15.0, 45.0), 1), "mem": 12.4},
+        {"pid": 404, "name": "shadow_daemon", "cpu": round(random.uniform(0.1, 2.0), 1), "mem": 1.7},
+        {"pid": 512, "name": "firewall_v3", "cpu": 0.3, "mem": 5.6},
+        {"pid": 666, "name": "UNKNOWN_PROCESS", "cpu": round(random.uniform(5.0, 25.0), 1), "mem": round(random.uniform(3.0, 15.0), 1)},
+        {"pid": 777, "name": "data_exfil_agent", "cpu": round(random.uniform(1.0, 5.0), 1), "mem": 2.1},
+        {"pid": 1024, "name": "proxy_chain", "cpu": 0.8, "mem": 3.0},
+    ]
+    header = f"{'PID':>6}  {'PROCESS':<22}  {'CPU%':>6}  {'MEM%':>6}"
+    lines = [header, "─" * 48]
+    for p in processes:
+        warn = " ⚠" if p["cpu"] > 10 else ""
+        lines.append(f"{p['pid']:>6}  {p['name']:<22}  {p['cpu']:>5.1f}%  {p['mem']:>5.1f}%{warn}")
+    lines.append(f"\n  Total: {len(processes)} processes | CPU: {sum(p['cpu'] for p in processes):.1f}%")
+    return {"type": "text", "content": "\n".join(lines)}
+
+
+@registry.command("uptime", description="System uptime")
+def cmd_uptime(args):
+    hours = 4209 + random.randint(0, 100)
+    return {
+        "type": "text",
+        "content": (
+            f"  System Uptime: {hours}h {random.randint(0, 59)}m {random.randint(0, 59)}s\n"
+            f"  Load Average:  {round(random.uniform(0.1, 2.5), 2)} {round(random.uniform(0.1, 3.0), 2)} {round(random.uniform(0.2, 4.0), 2)}\n"
+            f"  Users Online:  {random.randint(1, 7)}\n"
+            f"  Last Reboot:   2077-01-01 00:00:00 [FORCED]"
+        )
+    }
+
+
+@registry.command("status", description="Status report")
+def cmd_status(args):
+    return {
+        "type": "text",
+        "content": (
+            "╔══════════════════════════════════╗\n"
+            "║       SYSTEM STATUS REPORT       ║\n"
+            "╠══════════════════════════════════╣\n"
+            f"║  CPU Load:    {random.randint(5, 45)}%               ║\n"
+            f"║  Memory:      {random.randint(20, 70)}% used          ║\n"
+            f"║  Disk:        52% capacity          ║\n"
+            f"║  Network:     ENCRYPTED             ║\n"
+            f"║  Firewall:    ACTIVE                ║\n"
+            f"║  Threats:     {random.randint(0, 3)} detected          ║\n"
+            f"║  VPN:         MULTI-HOP             ║\n"
+            "╠══════════════════════════════════╣\n"
+            "║  All systems operational.        ║\n"
+            "╚══════════════════════════════════╝"
+        )
+    }
+
+
+@registry.command("users", description="Online users")
+def cmd_users(args):
+    users = [
+        {"name": "USER_01", "status": "ACTIVE", "role": "GHOST_ADMIN"},
+        {"name": "PHANTOM_X", "status": "IDLE", "role": "OPERATOR"},
+        {"name": "NULL_BYTE", "status": random.choice(["ACTIVE", "AWAY"]), "role": "ANALYST"},
+        {"name": "D4RK_ECHO", "status": "OFFLINE", "role": "UNKNOWN"},
+        {"name": "ROOT", "status": "LOCKED", "role": "SYSTEM"},
+    ]
+    lines = [f"{'USER':<14} {'STATUS':<10} {'ROLE':<14}", "─" * 38]
+    for u in users:
+        lines.append(f"{u['name']:<14} {u['status']:<10} {u['role']:<14}")
+    lines.append(f"\n  {sum(1 for u in users if u['status'] == 'ACTIVE')} active users on DR_NET.")
+    return {"type": "text", "content": "\n".join(lines)}
+
+
+@registry.command("ifconfig", aliases=("ip",), description="Network config")
+def cmd_ifconfig(args):
+    return {
+        "type": "text",
+        "content": (
+            "eth0:\n"
+            f"  inet  10.0.{random.randint(0, 255)}.{random.randint(1, 254)}  mask 255.255.255.0\n"
+            f"  inet6 fe80::{random.randint(1000, 9999)}:{random.randint(1000, 9999)}::{random.randint(1, 99)}\n"
+            f"  ether AA:BB:CC:{random.randint(10, 99)}:{random.randint(10, 99)}:{random.randint(10, 99)}\n"
+            f"  RX packets: {random.randint(10000, 999999)}  TX packets: {random.randint(10000, 999999)}\n\n"
+            "ghost0 (STEALTH ADAPTER):\n"
+            f"  inet  192.168.{random.randint(0, 255)}.{random.randint(1, 254)}  [MASKED]\n"
+            "  status: CLOAKED\n"
+            "  encryption: AES-512-QUANTUM"
+        )
+    }
+
+
+def session_usage(overlay, rel: str):
+    """(bytes, files, folders) at ``rel`` in a session's merged view, or None if it doesn't exist."""
+    real_path = overlay.lookup(rel)
+    if real_path is None:
+        return None
+    if not os.path.isdir(real_path):
+        return os.path.getsize(real_path), 1, 0
+    upper = os.path.join(overlay.upper, rel) if rel else overlay.upper
+    if not os.path.lexists(upper) and not any(w.startswith(rel + "/" if rel else "") for w in overlay.whiteouts):
+        # Untouched by the session: the seed image's ledger has the answer
+        return seed_usage.totals(real_path)
+    totals = [0, 0, 1 if rel else 0]
+    for entry in overlay.listdir(rel):
+        sub = session_usage(overlay, f"{rel}/{entry['name']}" if rel else entry["name"]) or (0, 0, 0)
+        for i in range(3):
+            totals[i] += sub[i]
+    return tuple(totals)
+
+
+@registry.command("df", usage="df [-i]", description="Disk usage",
+                  detail="df [-i] shows space (or with -i, files and folders) used against each quota.",
+                  context=True)
+def cmd_df(args, ctx):
+    if not files_usage.ready.is_set():
+        return {"type": "error", "content": "df: usage is still being counted, try again shortly"}
+    inodes = "-i" in args
+    disk = os.statvfs(FILES_DIR)
+    # (filesystem, size, used, avail, mounted on)
+    rows = []
+    for directory, quota in SHARED_QUOTAS:
+        used = files_usage.totals(directory) or (0, 0, 0)
+        if inodes:
+            size, used = quota.inodes or disk.f_files, used[1] + used[2]
         else:
-            stages.append(f"✗ PARTIAL FAILURE: Only 63% recovered.")
-            stages.append("  Try running with --force flag.")
-        return {"type": "text", "content": "\n".join(stages)}
-
-    # ---- STATUS ----
-    elif operation == "status":
-        return {
-            "type": "text",
-            "content": (
-                "╔══════════════════════════════════╗\n"
-                "║       SYSTEM STATUS REPORT       ║\n"
-                "╠══════════════════════════════════╣\n"
-                f"║  CPU Load:    {random.randint(5, 45)}%               ║\n"
-                f"║  Memory:      {random.randint(20, 70)}% used          ║\n"
-                f"║  Disk:        52% capacity          ║\n"
-                f"║  Network:     ENCRYPTED             ║\n"
-                f"║  Firewall:    ACTIVE                ║\n"
-                f"║  Threats:     {random.randint(0, 3)} detected          ║\n"
-                f"║  VPN:         MULTI-HOP             ║\n"
-                "╠══════════════════════════════════╣\n"
-                "║  All systems operational.        ║\n"
-                "╚══════════════════════════════════╝"
-            )
-        }
-
-    # ---- USERS ----
-    elif operation == "users":
-        users = [
-            {"name": "USER_01", "status": "ACTIVE", "role": "GHOST_ADMIN"},
-            {"name": "PHANTOM_X", "status": "IDLE", "role": "OPERATOR"},
-            {"name": "NULL_BYTE", "status": random.choice(["ACTIVE", "AWAY"]), "role": "ANALYST"},
-            {"name": "D4RK_ECHO", "status": "OFFLINE", "role": "UNKNOWN"},
-            {"name": "ROOT", "status": "LOCKED", "role": "SYSTEM"},
-        ]
-        lines = [f"{'USER':<14} {'STATUS':<10} {'ROLE':<14}", "─" * 38]
-        for u in users:
-            lines.append(f"{u['name']:<14} {u['status']:<10} {u['role']:<14}")
-        lines.append(f"\n  {sum(1 for u in users if u['status'] == 'ACTIVE')} active users on DR_NET.")
-        return {"type": "text", "content": "\n".join(lines)}
-
-    # ---- SUDO ----
-    elif operation == "sudo":
-        subcmd = " ".join(parts[1:]) if len(parts) > 1 else ""
-        if not subcmd:
-            return {"type": "error", "content": "Usage: sudo [command]\n  Execute with elevated privileges."}
-        return {
-            "type": "text",
-            "content": (
-                f"[SUDO] Escalating privileges for: {subcmd}\n"
-                f"[SUDO] Access Level: ROOT\n"
-                f"[SUDO] Executing: {subcmd}\n"
-                f"[SUDO] ✓ Command completed with elevated access."
-            )
-        }
-
-    # ---- SSH ----
-    elif operation == "ssh":
-        target = parts[1] if len(parts) > 1 else None
-        if not target:
-            return {"type": "error", "content": "Usage: ssh [user@host]\n  Connect to remote system."}
-        return {
-            "type": "text",
-            "content": (
-                f"Connecting to {target}...\n"
-                f"Establishing encrypted tunnel...\n"
-                f"Fingerprint: SHA256:{''.join(random.choices('0123456789abcdef', k=40))}\n"
-                f"Authentication: KEY_EXCHANGE\n"
-                f"Connection established.\n"
-                f"WARNING: This session is being monitored.\n"
-                f"Type 'exit' to disconnect."
-            )
-        }
-
-    # ---- HISTORY ----
-    elif operation == "history":
-        cmds = [
-            "ls -la /shadow",
-            "cat diary/entry_042.log",
-            "scan 192.168.1.0/24",
-            "decrypt about_me.enc",
-            "ssh phantom@dark-node",
-            "nmap TARGET_BRAVO",
-            "echo 'key found' > notes.txt",
-            "whoami",
-            "ps aux",
-            "neofetch",
-        ]
-        lines = [f"  {i + 1:>4}  {c}" for i, c in enumerate(cmds)]
+            size, used = quota.bytes or disk.f_blocks * disk.f_frsize, used[0]
+        name = "/dev/cyber0" if directory == FILES_DIR else "quota"
+        rows.append((name, size, used, max(size - used, 0), "/" + rel_path(directory)))
+    overlay = ctx.overlay if ctx is not None else None
+    if overlay is not None:
+        used = sessions_usage.totals(overlay.root) or (0, 0, 0)
+        if inodes:
+            size, used = SESSION_QUOTA.inodes or disk.f_files, used[1] + used[2]
+        else:
+            size, used = SESSION_QUOTA.bytes or disk.f_blocks * disk.f_frsize, used[0]
+        rows.append(("overlay", size, used, max(size - used, 0), "/ (session)"))
+    if inodes:
+        rows.append(("host", disk.f_files, disk.f_files - disk.f_ffree, disk.f_favail, "(host disk)"))
+    else:
+        rows.append(("host", disk.f_blocks * disk.f_frsize, (disk.f_blocks - disk.f_bfree) * disk.f_frsize,
+                     disk.f_bavail * disk.f_frsize, "(host disk)"))
+
+    fmt = str if inodes else human
+    head = ("Inodes", "IUsed", "IFree", "IUse%") if inodes else ("Size", "Used", "Avail", "Use%")
+    lines = [f"{'Filesystem':<14}{head[0]:>9}{head[1]:>9}{head[2]:>9}{head[3]:>6}  Mounted on"]
+    for name, size, used, avail, mount in rows:
+        pct = used * 100 // size if size else None
+        line = (f"{name:<14}{fmt(size):>9}{fmt(used):>9}{fmt(avail):>9}"
+                f"{f'{pct}%' if pct is not None else '-':>6}  {mount}")
+        lines.append(line + ("  ⚠ HIGH" if pct is not None and pct >= 90 else ""))
+    return {"type": "text", "content": "\n".join(lines)}
+
+
+@registry.command("du", usage="du [path]", description="Space used", category="FILE SYSTEM",
+                  detail="du [-sh] [PATH] prints bytes used below each entry of PATH and in total; "
+                         "-s prints the total only, -h human-readable sizes.", context=True)
+def cmd_du(args, ctx):
+    flags = "".join(a[1:] for a in args if a.startswith("-"))
+    paths = [a for a in args if not a.startswith("-")]
+    path = term_path(ctx, paths[0] if paths else "")
+    target_path = safe_path(path)
+    if not files_usage.ready.is_set():
+        return {"type": "error", "content": "du: usage is still being counted, try again shortly"}
+    overlay = ctx.overlay if ctx is not None else None
+    if overlay is None:
+        totals = files_usage.totals(target_path)
+        children = [] if "s" in flags or totals is None else files_usage.children(target_path)
+    else:
+        rel = rel_path(target_path)
+        totals = session_usage(overlay, rel)
+        children = []
+        if "s" not in flags and totals is not None and os.path.isdir(overlay.lookup(rel)):
+            children = [(e["name"], session_usage(overlay, f"{rel}/{e['name']}" if rel else e["name"]))
+                        for e in sorted(overlay.listdir(rel), key=lambda e: e["name"])]
+    if totals is None:
+        return {"type": "error", "content": f"du: {path}: No such file or directory"}
+    fmt = human if "h" in flags else str
+    prefix = path.rstrip("/") + "/"
+    lines = [f"{fmt(sub[0]):<10}{prefix}{name}" for name, sub in children if sub is not None]
+    lines.append(f"{fmt(totals[0]):<10}{path}")
+    return {"type": "text", "content": "\n".join(lines)}
+
+
+@registry.command("hostname", description="Host name", static=True)
+def cmd_hostname(args):
+    return {"type": "text", "content": "CYBER_NODE_7G.DR_NET.ONION"}
+
+
+@registry.command("uname", description="OS info", static=True)
+def cmd_uname(args):
+    return {
+        "type": "text",
+        "content": "CYBER_OS 4.19.0-PHANTOM x86_64 QUANTUM_CORE GNU/Linux"
+    }
+
+
+@registry.command("date", description="Server time")
+def cmd_date(args):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return {"type": "text", "content": f"SERVER_TIME: {now}\nTIMEZONE: UTC+0 [QUANTUM_SYNC]"}
+
+
+@registry.command("history", description="Command log", context=True)
+def cmd_history(args, ctx):
+    if ctx is not None and ctx.term is not None:
+        lines = [f"  {i + 1:>4}  {c}" for i, c in enumerate(ctx.term.history)]
         return {"type": "text", "content": "Command History:\n" + "\n".join(lines)}
+    cmds = [
+        "ls -la /shadow",
+        "cat diary/entry_042.log",
+        "scan 192.168.1.0/24",
+        "decrypt about_me.enc",
+        "ssh phantom@dark-node",
+        "nmap TARGET_BRAVO",
+        "echo 'key found' > notes.txt",
+        "whoami",
+        "ps aux",
+        "neofetch",
+    ]
+    lines = [f"  {i + 1:>4}  {c}" for i, c in enumerate(cmds)]
+    return {"type": "text", "content": "Command History:\n" + "\n".join(lines)}
+
+
+@registry.command("env", description="Environment", context=True)
+def cmd_env(args, ctx):
+    term = ctx.term if ctx is not None else None
+    env = term.environ() if term is not None else {**DEFAULT_ENV, "PWD": "/"}
+    return {"type": "text", "content": "\n".join(f"{k}={v}" for k, v in sorted(env.items()))}
+
 
-    # ---- DATE ----
-    elif operation == "date":
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        return {"type": "text", "content": f"SERVER_TIME: {now}\nTIMEZONE: UTC+0 [QUANTUM_SYNC]"}
-
-    # ---- HOSTNAME ----
-    elif operation == "hostname":
-        return {"type": "text", "content": "CYBER_NODE_7G.DR_NET.ONION"}
-
-    # ---- UNAME ----
-    elif operation == "uname":
-        return {
-            "type": "text",
-            "content": "CYBER_OS 4.19.0-PHANTOM x86_64 QUANTUM_CORE GNU/Linux"
-        }
-
-    # ---- DF (disk usage) ----
-    elif operation == "df":
-        return {
-            "type": "text",
-            "content": (
-                "Filesystem      Size  Used  Avail  Use%  Mounted on\n"
-                "/dev/cyber0     4.0T  2.1T  1.9T   52%   /\n"
-                "/dev/ghost1     512G  128G  384G   25%   /shadow\n"
-                "tmpfs           32G   1.2G  30.8G   4%   /tmp\n"
-                "/dev/vault0     1.0T  890G  110G   89%   /vault  ⚠ HIGH"
-            )
-        }
-
-    # ---- CLEAR (handled in frontend, but also support here) ----
-    elif operation == "clear":
-        return {"type": "clear", "content": ""}
-
-    # ---- HELP (fallback) ----
-    elif operation == "help":
-        return {
-            "type": "text",
-            "content": (
-                "Available Commands:\n"
-                "──────────────────────────────────\n"
-                "  FILE SYSTEM:\n"
-                "    ls [path]       List files\n"
-                "    cd [path]       Change directory\n"
-                "    pwd             Working directory\n"
-                "    cat [file]      Read file\n"
-                "    touch [file]    Create file\n"
-                "    mkdir [dir]     Create folder\n"
-                "    rm [file]       Delete file/dir\n"
-                "    cp [src] [dst]  Copy\n"
-                "    mv [src] [dst]  Move\n"
-                "    echo [text]     Print text\n"
-                "  NETWORK:\n"
-                "    scan [target]   Port scan\n"
-                "    ping [host]     Ping host\n"
-                "    traceroute [h]  Trace route\n"
-                "    nmap [target]   Network map\n"
-                "    ssh [user@host] Remote connect\n"
-                "  SYSTEM:\n"
-                "    whoami          Identity\n"
-                "    neofetch        System info\n"
-                "    ps              Processes\n"
-                "    uptime          System uptime\n"
-                "    status          Status report\n"
-                "    users           Online users\n"
-                "    ifconfig        Network config\n"
-                "    df              Disk usage\n"
-                "    hostname        Host name\n"
-                "    uname           OS info\n"
-                "    date            Server time\n"
-                "    history         Command log\n"
-                "    decrypt [file]  Decrypt file\n"
-                "    sudo [cmd]      Root access\n"
-                "    clear           Clear screen\n"
-                "    hack            Start minigame\n"
-                "    theme           Switch theme\n"
-                "    matrix          Toggle matrix\n"
-            )
-        }
-
-    # ---- LS fallback ----
-    elif operation == "ls":
-        return {"type": "list", "content": []}
-
-    # ---- UNKNOWN COMMAND ----
+@registry.command("export", usage="export [k=v]", description="Set variable", min_args=1,
+                  detail="export NAME=value sets a variable for this session.", context=True)
+def cmd_export(args, ctx):
+    if ctx is None or ctx.term is None:
+        return {"type": "error", "content": "export: no terminal session (send X-Session-Id)"}
+    for arg in args:
+        name, sep, value = arg.partition("=")
+        if not sep or not name.isidentifier():
+            return {"type": "error", "content": f"export: '{arg}': not a valid NAME=value"}
+        ctx.term.setenv(name, value.strip('"').strip("'"))
+    return {"type": "text", "content": ""}
+
+
+@registry.command("unset", usage="unset [name]", min_args=1, context=True)
+def cmd_unset(args, ctx):
+    if ctx is not None and ctx.term is not None:
+        for name in args:
+            ctx.term.unsetenv(name)
+    return {"type": "text", "content": ""}
+
+
+@registry.command("decrypt", usage="decrypt [file]", description="Decrypt file",
+                  min_args=1, detail="Attempts to decrypt an encrypted file.")
+def cmd_decrypt(args):
+    target = args[0]
+    stages = [
+        f"Analyzing {target}...",
+        "Identifying encryption: AES-256-CBC",
+        "Attempting key rotation...",
+        "Brute-forcing key space: ████████████░░░░ 76%",
+        "Key fragment found: X7-PH4NT0M",
+        "Applying decryption matrix...",
+    ]
+    if random.random() > 0.4:
+        stages.append(f"✓ SUCCESS: {target} decrypted.")
+        stages.append(f"  Decrypted content saved to {target}.dec")
     else:
-        suggestions = ["help", "scan", "neofetch", "whoami", "status"]
-        return {
-            "type": "error",
-            "content": f"'{operation}': command not found\n  Try: {', '.join(suggestions)}"
-        }
+        stages.append(f"✗ PARTIAL FAILURE: Only 63% recovered.")
+        stages.append("  Try running with --force flag.")
+    return {"type": "text", "content": "\n".join(stages)}
+
+
+@registry.command("sudo", usage="sudo [cmd]", description="Root access",
+                  min_args=1, detail="Execute with elevated privileges.")
+def cmd_sudo(args):
+    subcmd = " ".join(args)
+    return {
+        "type": "text",
+        "content": (
+            f"[SUDO] Escalating privileges for: {subcmd}\n"
+            f"[SUDO] Access Level: ROOT\n"
+            f"[SUDO] Executing: {subcmd}\n"
+            f"[SUDO] ✓ Command completed with elevated access."
+        )
+    }
+
+
+# ---- CLEAR (handled in frontend, but also support here) ----
+@registry.command("clear", description="Clear screen", static=True)
+def cmd_clear(args):
+    return {"type": "clear", "content": ""}
+
+
+registry.document("hack", "hack", "Start minigame", "SYSTEM")
+registry.document("theme", "theme", "Switch theme", "SYSTEM")
+registry.document("matrix", "matrix", "Toggle matrix", "SYSTEM")
+
+
+@registry.command("help", static=True)
+def cmd_help(args):
+    return {"type": "text", "content": registry.help_text()}
+
+
+# Static commands are serialized once here, after help can see every command
+registry.prerender(dumps, etag_for)
+
+# Prefix trie over every command name for completion, including those the client
+# runs itself; the "did you mean" BK-tree only holds names the server can run,
+# since it answers commands that reached the server and were not found
+command_index = CommandIndex(registry.names(documented=True), registry.names())
+
+metrics.startup["import"] = time.perf_counter() - BOOT_STARTED
+
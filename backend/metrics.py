@@ -0,0 +1,178 @@
+# metrics.py
+#
+# Request and command instrumentation exposed at /api/metrics in Prometheus
+# text format. MetricsMiddleware is a plain ASGI middleware (it never buffers
+# a body, so streaming responses stay streaming); it labels requests with
+# the matched route template rather than the raw path, keeping the number of
+# series bounded. Terminal commands are observed through the command
+# registry's dispatch hook; answers served pre-rendered are only counted,
+# since there is no handler call to time.
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Upper bounds in seconds, from sub-millisecond cache hits up to slow scans
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)     # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels) -> str:
+    def escape(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{k}="{escape(v)}"' for k, v in labels.items())
+
+
+class Metrics:
+    def __init__(self, prefix: str = "cyber_os"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self._statuses: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self._bytes_in: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._bytes_out: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._commands: Dict[str, Histogram] = defaultdict(Histogram)
+        self._command_errors: Dict[str, int] = defaultdict(int)
+        self._command_cached: Dict[str, int] = defaultdict(int)
+        self.started = time.time()
+        self.startup: Dict[str, float] = {}     # phase -> seconds, filled in by main during startup
+
+    def observe_request(self, method: str, route: str, status: int, elapsed: float,
+                        bytes_in: int, bytes_out: int):
+        key = (method, route)
+        with self._lock:
+            self._requests[key].observe(elapsed)
+            self._statuses[(method, route, status)] += 1
+            self._bytes_in[key] += bytes_in
+            self._bytes_out[key] += bytes_out
+
+    def observe_command(self, name: str, elapsed: float, ok: bool):
+        """Command registry hook."""
+        with self._lock:
+            self._commands[name].observe(elapsed)
+            if not ok:
+                self._command_errors[name] += 1
+
+    def observe_cached_command(self, name: str):
+        """Command registry hook for pre-rendered answers, counted apart from the latency histogram."""
+        with self._lock:
+            self._command_cached[name] += 1
+
+    def _histogram(self, lines: List[str], name: str, series: Dict[str, Histogram]):
+        for labels, h in series.items():
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), h.counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{{{labels},le=\"{bound}\"}} {cumulative}")
+            lines.append(f"{name}_sum{{{labels}}} {h.sum:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {h.count}")
+
+    def render(self) -> str:
+        p = self.prefix
+        lines: List[str] = []
+        with self._lock:
+            lines += [f"# HELP {p}_http_request_duration_seconds Request latency by route.",
+                      f"# TYPE {p}_http_request_duration_seconds histogram"]
+            self._histogram(lines, f"{p}_http_request_duration_seconds",
+                            {_labels(method=m, route=r): h for (m, r), h in sorted(self._requests.items())})
+
+            lines += [f"# HELP {p}_http_requests_total Requests by route and status.",
+                      f"# TYPE {p}_http_requests_total counter"]
+            for (m, r, s), n in sorted(self._statuses.items()):
+                lines.append(f"{p}_http_requests_total{{{_labels(method=m, route=r, status=s)}}} {n}")
+
+            lines += [f"# HELP {p}_http_request_errors_total Responses with a 5xx status.",
+                      f"# TYPE {p}_http_request_errors_total counter"]
+            errors: Dict[Tuple[str, str], int] = defaultdict(int)
+            for (m, r, s), n in self._statuses.items():
+                if s >= 500:
+                    errors[(m, r)] += n
+            for (m, r), n in sorted(errors.items()):
+                lines.append(f"{p}_http_request_errors_total{{{_labels(method=m, route=r)}}} {n}")
+
+            for direction, series in (("request", self._bytes_in), ("response", self._bytes_out)):
+                lines += [f"# HELP {p}_http_{direction}_bytes_total Body bytes by route.",
+                          f"# TYPE {p}_http_{direction}_bytes_total counter"]
+                for (m, r), n in sorted(series.items()):
+                    lines.append(f"{p}_http_{direction}_bytes_total{{{_labels(method=m, route=r)}}} {n}")
+
+            lines += [f"# HELP {p}_command_duration_seconds Terminal command latency.",
+                      f"# TYPE {p}_command_duration_seconds histogram"]
+            self._histogram(lines, f"{p}_command_duration_seconds",
+                            {_labels(command=c): h for c, h in sorted(self._commands.items())})
+
+            lines += [f"# HELP {p}_command_errors_total Terminal commands that failed.",
+                      f"# TYPE {p}_command_errors_total counter"]
+            for c, n in sorted(self._command_errors.items()):
+                lines.append(f"{p}_command_errors_total{{{_labels(command=c)}}} {n}")
+
+            lines += [f"# HELP {p}_command_cached_total Terminal commands answered from a pre-rendered response.",
+                      f"# TYPE {p}_command_cached_total counter"]
+            for c, n in sorted(self._command_cached.items()):
+                lines.append(f"{p}_command_cached_total{{{_labels(command=c)}}} {n}")
+
+        lines += [f"# HELP {p}_start_time_seconds Process start time.",
+                  f"# TYPE {p}_start_time_seconds gauge",
+                  f"{p}_start_time_seconds {self.started:.3f}"]
+        lines += [f"# HELP {p}_startup_seconds Cold start cost by phase (import, seed, ready).",
+                  f"# TYPE {p}_startup_seconds gauge"]
+        for phase, seconds in self.startup.items():
+            lines.append(f"{p}_startup_seconds{{{_labels(phase=phase)}}} {seconds:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, metrics: Metrics, profiler=None):
+        self.app = app
+        self.metrics = metrics
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        bytes_in = bytes_out = 0
+        status = 500
+
+        async def counting_receive():
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                bytes_in += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal bytes_out, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        sampled = self.profiler is not None and self.profiler.begin()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            if sampled:
+                self.profiler.end()
+            # The router stores the matched route in the scope; unmatched paths share one series
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            self.metrics.observe_request(scope["method"], route, status, elapsed, bytes_in, bytes_out)
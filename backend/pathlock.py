@@ -0,0 +1,112 @@
+# pathlock.py
+#
+# Reader/writer locks on paths in the shared file tree that hold across
+# worker processes, so several uvicorn workers can serve the same tree.
+#
+# Locks are flock()s on a fixed set of stripe files under lock_dir; a path
+# maps to a stripe by hash. Locking is hierarchical: an operation on
+# a/b/c takes shared locks on "", "a" and "a/b" and its own mode on "a/b/c".
+# Moving or deleting a folder takes it exclusively, which waits out every
+# operation below it, while writers to unrelated files below the same
+# folder only share it. All stripes an operation needs are taken at once in
+# stripe order, so two operations can never wait on each other in a cycle.
+# Two paths landing on one stripe just serialize a little more than needed.
+#
+# flock() locks belong to the open file, not the process, so threads in the
+# same worker exclude each other the same way separate workers do.
+
+import hashlib
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+from journal import RWLock
+
+try:
+    import fcntl
+except ImportError:     # Windows has no flock; fall back to locks within this process
+    fcntl = None
+
+STRIPES = 1024
+
+
+class PathLocks:
+    def __init__(self, root: str, lock_dir: str, stripes: int = STRIPES):
+        self.root = root
+        self.lock_dir = lock_dir
+        self.stripes = stripes
+        os.makedirs(lock_dir, exist_ok=True)
+        self._local: Dict[int, RWLock] = {}
+        self._stats_lock = threading.Lock()
+        self.acquired = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+
+    def _stripe(self, rel: str) -> int:
+        digest = hashlib.blake2b(rel.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.stripes
+
+    def _plan(self, shared: Iterable[str], exclusive: Iterable[str]) -> List[Tuple[int, bool]]:
+        modes: Dict[int, bool] = {}
+        for paths, mode in ((shared, False), (exclusive, True)):
+            for path in paths:
+                rel = os.path.relpath(os.path.normpath(path), self.root).replace(os.sep, "/")
+                parts = [] if rel == "." else rel.split("/")
+                for i in range(len(parts)):
+                    modes.setdefault(self._stripe("/".join(parts[:i])), False)
+                stripe = self._stripe("/".join(parts))
+                modes[stripe] = modes.get(stripe, False) or mode
+        return sorted(modes.items())
+
+    def _flock(self, stack: ExitStack, stripe: int, exclusive: bool) -> bool:
+        fd = os.open(os.path.join(self.lock_dir, f"{stripe:04x}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        stack.callback(os.close, fd)    # closing the descriptor releases the lock
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+            return False
+        except BlockingIOError:
+            fcntl.flock(fd, mode)
+            return True
+
+    def _rwlock(self, stack: ExitStack, stripe: int, exclusive: bool) -> bool:
+        with self._stats_lock:
+            lock = self._local.setdefault(stripe, RWLock())
+        stack.enter_context(lock.exclusive() if exclusive else lock.shared())
+        return False
+
+    @contextmanager
+    def hold(self, shared: Iterable[str] = (), exclusive: Iterable[str] = ()):
+        """Hold ``shared`` paths for reading and ``exclusive`` paths for writing."""
+        start = time.perf_counter()
+        waited = False
+        with ExitStack() as stack:
+            for stripe, mode in self._plan(shared, exclusive):
+                if fcntl is not None:
+                    waited = self._flock(stack, stripe, mode) or waited
+                else:
+                    self._rwlock(stack, stripe, mode)
+            with self._stats_lock:
+                self.acquired += 1
+                if waited:
+                    self.contended += 1
+                    self.wait_seconds += time.perf_counter() - start
+            yield
+
+    def read(self, *paths: str):
+        return self.hold(shared=paths)
+
+    def write(self, *paths: str):
+        return self.hold(exclusive=paths)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "backend": "flock" if fcntl is not None else "in-process",
+                "stripes": self.stripes,
+                "acquired": self.acquired,
+                "contended": self.contended,
+                "wait_ms": round(self.wait_seconds * 1000, 3),
+            }
@@ -0,0 +1,114 @@
+# profiler.py
+#
+# Opt-in sampling profiler. A fraction of requests (``rate``) is marked as
+# sampled; while at least one sampled request is in flight, a background
+# thread snapshots every thread's Python stack at a fixed interval. Request
+# handling hops between the event loop and the threadpool, so sampling all
+# threads is what catches both halves. Stacks of threads that are merely
+# waiting (idle pool workers, the selector) are discarded.
+#
+# Output is the "folded" format (frame;frame;frame count per line) that
+# flamegraph.pl, speedscope and inferno read directly.
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# Leaf frames that mean "this thread is blocked, not working"
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+def _fold(frame) -> Optional[str]:
+    leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+    if leaf in IDLE_FRAMES:
+        return None
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    def __init__(self, rate: float = 0.0, interval: float = 0.005, max_stacks: int = 20000):
+        self.rate = rate
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._wake = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self.sampled_requests = 0
+        self.samples = 0
+        self.dropped = 0
+
+    def begin(self) -> bool:
+        """Decide whether this request is sampled; if so, keep the sampler running until end()."""
+        if self.rate <= 0 or random.random() >= self.rate:
+            return False
+        with self._lock:
+            self._active += 1
+            self.sampled_requests += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return True
+
+    def end(self):
+        with self._lock:
+            self._active -= 1
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                while not self._active:
+                    self._wake.wait()
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = _fold(frame)
+                if stack is None:
+                    continue
+                with self._lock:
+                    if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                        self._stacks[stack] += 1
+                        self.samples += 1
+                    else:
+                        self.dropped += 1
+            time.sleep(self.interval)
+
+    def folded(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {n}\n" for stack, n in self._stacks.most_common())
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+            self.dropped = 0
+            self.sampled_requests = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "interval_ms": self.interval * 1000,
+                "active": self._active,
+                "sampled_requests": self.sampled_requests,
+                "samples": self.samples,
+                "distinct_stacks": len(self._stacks),
+                "dropped": self.dropped,
+            }
@@ -0,0 +1,93 @@
+# responses.py
+#
+# JSON serialization for API responses. orjson is used when it is installed
+# (it is several times faster than the json module and emits compact UTF-8
+# directly); otherwise the standard library fills in with the same output
+# shape, so the server runs either way.
+#
+# It also builds conditional responses: ETag and Last-Modified validators,
+# and a bodiless 304 when the client already holds the current version.
+
+import hashlib
+import json
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def stat_etag(st: os.stat_result) -> str:
+    """Validator for a file that changes whenever it is rewritten, without reading it."""
+    return f'"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    # Weak comparison, as If-None-Match calls for: compression turns our
+    # strong tags into W/ ones on the way out, and clients send those back
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return _opaque(etag) in (_opaque(t) for t in if_none_match.split(","))
+
+
+def not_modified(etag: str, mtime: Optional[float] = None, if_none_match: Optional[str] = None,
+                 if_modified_since: Optional[str] = None) -> bool:
+    """Whether the client's copy is current; If-None-Match wins over If-Modified-Since."""
+    if if_none_match is not None:
+        return etag_matches(etag, if_none_match)
+    if if_modified_since is None or mtime is None:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def validators(etag: str, mtime: Optional[float] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if mtime is not None:
+        headers["Last-Modified"] = formatdate(mtime, usegmt=True)
+    return headers
+
+
+def cached_json(body: bytes, etag: str, if_none_match: Optional[str] = None,
+                mtime: Optional[float] = None, if_modified_since: Optional[str] = None) -> Response:
+    """Serve pre-serialized JSON, or 304 when the client already holds this version."""
+    headers = validators(etag, mtime)
+    if not_modified(etag, mtime, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def conditional_json(content: Any, if_none_match: Optional[str] = None, if_modified_since: Optional[str] = None,
+                     etag: Optional[str] = None, mtime: Optional[float] = None) -> Response:
+    """Serialize ``content`` with validators; the ETag is a content hash unless one is given."""
+    body = dumps(content)
+    return cached_json(body, etag or etag_for(body), if_none_match, mtime, if_modified_since)
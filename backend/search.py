@@ -0,0 +1,296 @@
+# search.py
+#
+# Inverted index over the text files under FILES_DIR. The initial build runs
+# in a background thread at startup; after that every mutation endpoint calls
+# update() for the paths it touched, so queries never walk the tree.
+#
+# grep matches substrings, so the words at the edges of its pattern may be
+# parts of longer tokens. A second index maps each trigram to the tokens
+# containing it: intersecting the sets for a word's trigrams gives the few
+# tokens it can be part of without scanning the vocabulary, and their
+# postings give the files and lines worth reading.
+#
+# Queries take an optional ``visible`` predicate on relative paths, so an
+# index over a read-only base can answer for a view that hides some of it
+# (a session overlay's deletions and the files it replaced).
+
+import fnmatch
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Files above this size, or that don't decode as UTF-8, are listed by find but not indexed
+MAX_INDEXED_BYTES = 1024 * 1024
+
+
+# Length of the substrings in the token index; shorter words can't be looked up
+GRAM = 3
+
+
+def tokenize(text: str) -> List[str]:
+    return [t.lower() for t in TOKEN_RE.findall(text)]
+
+
+def grams(word: str) -> Set[str]:
+    return {word[i:i + GRAM] for i in range(len(word) - GRAM + 1)}
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        if os.path.getsize(path) > MAX_INDEXED_BYTES:
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        if b"\0" in data[:1024]:
+            return None
+        return data.decode("utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+class SearchIndex:
+    def __init__(self, root: str):
+        self.root = root
+        self._postings: Dict[str, Dict[str, List[int]]] = defaultdict(dict)  # token -> {doc: [line numbers]}
+        self._doc_tokens: Dict[str, set] = {}   # doc -> tokens, for removal
+        self._grams: Dict[str, Set[str]] = defaultdict(set)     # trigram -> tokens containing it
+        self._paths: Dict[str, str] = {}        # every file and folder -> "file" | "folder"
+        self._lock = threading.RLock()
+        self.ready = threading.Event()
+        self.build_seconds = 0.0
+
+    # ---- maintenance ----
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def build(self):
+        start = time.perf_counter()
+        self.update(self.root)
+        self.build_seconds = time.perf_counter() - start
+        self.ready.set()
+
+    def start_background_build(self):
+        threading.Thread(target=self.build, name="search-index-build", daemon=True).start()
+
+    def update(self, path: str):
+        """Re-sync ``path`` (file, folder or something that no longer exists)."""
+        path = os.path.normpath(path)
+        if path == self.root:
+            with self._lock:
+                self._postings.clear()
+                self._doc_tokens.clear()
+                self._grams.clear()
+                self._paths.clear()
+        else:
+            self.remove(path)
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                if dirpath != self.root:
+                    self._add_path(dirpath, "folder")
+                for name in filenames:
+                    self._index_file(os.path.join(dirpath, name))
+        elif os.path.isfile(path):
+            self._index_file(path)
+
+    def remove(self, path: str):
+        rel = self._rel(os.path.normpath(path))
+        prefix = rel + "/"
+        with self._lock:
+            doomed = [p for p in self._paths if p == rel or p.startswith(prefix)]
+            for p in doomed:
+                del self._paths[p]
+                for token in self._doc_tokens.pop(p, ()):
+                    docs = self._postings[token]
+                    docs.pop(p, None)
+                    if not docs:
+                        del self._postings[token]
+                        for gram in grams(token):
+                            tokens = self._grams[gram]
+                            tokens.discard(token)
+                            if not tokens:
+                                del self._grams[gram]
+
+    def _add_path(self, path: str, kind: str):
+        with self._lock:
+            self._paths[self._rel(path)] = kind
+
+    def _index_file(self, path: str):
+        rel = self._rel(path)
+        text = _read_text(path)
+        lines_by_token: Dict[str, List[int]] = defaultdict(list)
+        if text is not None:
+            for lineno, line in enumerate(text.splitlines(), 1):
+                for token in set(tokenize(line)):
+                    lines_by_token[token].append(lineno)
+        with self._lock:
+            self._paths[rel] = "file"
+            self._doc_tokens[rel] = set(lines_by_token)
+            for token, lines in lines_by_token.items():
+                if token not in self._postings:
+                    for gram in grams(token):
+                        self._grams[gram].add(token)
+                self._postings[token][rel] = lines
+
+    # ---- queries ----
+
+    def search(self, query: str, scope: str = "", limit: int = 20, snippets: int = 3,
+               visible: Optional[Callable[[str], bool]] = None) -> List[dict]:
+        """Ranked files containing every term of ``query``, with matching lines."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        scope = scope.strip("/")
+        with self._lock:
+            n_docs = max(len(self._doc_tokens), 1)
+            postings = [self._postings.get(t, {}) for t in terms]
+            if not all(postings):
+                return []
+            # Intersect starting from the rarest term
+            order = sorted(range(len(terms)), key=lambda i: len(postings[i]))
+            candidates = set(postings[order[0]])
+            for i in order[1:]:
+                candidates &= postings[i].keys()
+            if scope:
+                candidates = {d for d in candidates if d == scope or d.startswith(scope + "/")}
+            if visible is not None:
+                candidates = {d for d in candidates if visible(d)}
+
+            scored = []
+            for doc in candidates:
+                score = 0.0
+                lines = set()
+                for docs in postings:
+                    hits = docs[doc]
+                    score += (1 + math.log(len(hits))) * math.log(1 + n_docs / len(docs))
+                    lines.update(hits)
+                name = doc.rsplit("/", 1)[-1].lower()
+                if any(t in name for t in terms):
+                    score *= 1.5
+                scored.append((score, doc, sorted(lines)))
+
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        results = []
+        for score, doc, lines in scored[:limit]:
+            results.append({
+                "path": doc,
+                "score": round(score, 4),
+                "matches": self._snippets(doc, lines[:snippets]),
+            })
+        return results
+
+    def _tokens_containing(self, word: str, where: str) -> Optional[List[str]]:
+        """Tokens that end with (``where="end"``), start with ("start") or contain
+        ("any") ``word``; None if ``word`` is too short to look up.
+        """
+        if len(word) < GRAM:
+            return None
+        sets = sorted((self._grams.get(g, set()) for g in grams(word)), key=len)
+        tokens = set(sets[0]).intersection(*sets[1:])
+        if where == "end":
+            return [t for t in tokens if t.endswith(word)]
+        if where == "start":
+            return [t for t in tokens if t.startswith(word)]
+        return [t for t in tokens if word in t]
+
+    def grep(self, pattern: str, scope: str = "", ignore_case: bool = False, limit: int = 200,
+             visible: Optional[Callable[[str], bool]] = None) -> List[tuple]:
+        """(path, line number, line) for lines containing ``pattern`` literally.
+
+        The postings of the pattern's words narrow the search to the lines
+        holding all of them; only those lines are checked, and the files are
+        read after the index lock is released.
+        """
+        terms = list(dict.fromkeys(tokenize(pattern)))
+        scope = scope.strip("/")
+        candidates: Optional[Dict[str, Optional[Set[int]]]] = None    # doc -> lines to check (None: all)
+        with self._lock:
+            for i, t in enumerate(terms):
+                if len(terms) == 1:
+                    tokens = self._tokens_containing(t, "any")
+                elif i == 0:
+                    # The first word may be the tail of a token, the last one its head
+                    tokens = self._tokens_containing(t, "end")
+                elif i == len(terms) - 1:
+                    tokens = self._tokens_containing(t, "start")
+                else:
+                    tokens = [t]
+                if tokens is None:
+                    continue
+                lines_by_doc: Dict[str, Set[int]] = defaultdict(set)
+                for token in tokens:
+                    for doc, lines in self._postings.get(token, {}).items():
+                        lines_by_doc[doc].update(lines)
+                if candidates is None:
+                    candidates = dict(lines_by_doc)
+                else:
+                    candidates = {doc: lines & lines_by_doc[doc] for doc, lines in candidates.items()
+                                  if doc in lines_by_doc}
+            if candidates is None:
+                candidates = dict.fromkeys(self._doc_tokens)
+            if scope:
+                candidates = {d: lines for d, lines in candidates.items() if d == scope or d.startswith(scope + "/")}
+
+        needle = pattern.lower() if ignore_case else pattern
+        matches = []
+        for doc in sorted(candidates):
+            lines = candidates[doc]
+            if lines is not None and not lines:
+                continue
+            if visible is not None and not visible(doc):
+                continue
+            text = _read_text(os.path.join(self.root, doc))
+            if text is None:
+                continue
+            all_lines = text.splitlines()
+            for lineno in sorted(lines) if lines is not None else range(1, len(all_lines) + 1):
+                if lineno > len(all_lines):
+                    break
+                line = all_lines[lineno - 1]
+                haystack = line.lower() if ignore_case else line
+                if needle in haystack:
+                    matches.append((doc, lineno, line))
+                    if len(matches) >= limit:
+                        return matches
+        return matches
+
+    def find(self, pattern: str = "*", scope: str = "", kind: Optional[str] = None, limit: int = 500,
+             visible: Optional[Callable[[str], bool]] = None) -> List[str]:
+        scope = scope.strip("/")
+        with self._lock:
+            paths = list(self._paths.items())
+        found = []
+        for rel, k in sorted(paths):
+            if scope and not (rel == scope or rel.startswith(scope + "/")):
+                continue
+            if kind and k != kind:
+                continue
+            if fnmatch.fnmatch(rel.rsplit("/", 1)[-1], pattern) and (visible is None or visible(rel)):
+                found.append(rel)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def _snippets(self, doc: str, lines: List[int]) -> List[dict]:
+        text = _read_text(os.path.join(self.root, doc))
+        if text is None:
+            return []
+        all_lines = text.splitlines()
+        return [{"line": n, "text": all_lines[n - 1][:200]} for n in lines if n <= len(all_lines)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready.is_set(),
+                "documents": len(self._doc_tokens),
+                "paths": len(self._paths),
+                "terms": len(self._postings),
+                "grams": len(self._grams),
+                "build_ms": round(self.build_seconds * 1000, 3),
+            }
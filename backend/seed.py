@@ -0,0 +1,218 @@
+# seed.py
+#
+# The initial file tree every fresh deployment starts with. It used to be
+# written file by file while main.py was imported; now it is a versioned
+# snapshot: a tar archive plus a JSON manifest, built once under
+# SNAPSHOT_DIR and unpacked on startup only when the files directory does
+# not exist yet.
+#
+# The version is a hash of the seed contents, so editing SEED_TREE (or the
+# lore in content.py) rebuilds the snapshot on the next start. Workers
+# starting together serialize on one file lock; the tree is unpacked into a
+# temporary sibling and renamed into place, so nobody ever sees half of it.
+#
+# The same snapshot, unpacked once per version under SNAPSHOT_DIR
+# (base_image()), is the read-only lower layer of the per-session overlays:
+# visitors see the pristine seed tree, not whatever the shared tree has
+# become.
+#
+#   python seed.py build      # prebuild the snapshot (e.g. in a build step)
+#   python seed.py status
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tarfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import content
+
+try:
+    import fcntl
+except ImportError:     # Windows has no fcntl; dev servers there run a single process
+    fcntl = None
+
+# Relative path -> file contents; a trailing "/" marks an (empty) folder
+SEED_TREE: Dict[str, str] = {
+    "projects.txt": content.PROJECTS_LORE,
+    "welcome.txt": "WELCOME TO CYBER_OS v2.1\n\nThis is your personal file space.\nYou can create, edit, and delete files here.",
+    "about_me.enc": content.ABOUT_ME_LORE,
+    "contact.hex": content.CONTACT_LORE,
+    "documents/notes.txt": "Meeting notes: TBD",
+    "diary/entry_001.log": "DATE: 2077-01-12\nThey say the network is secure. I don't believe them. I saw the glimmers in the code today. Something is watching us from the sub-net.",
+    "diary/entry_042.log": "DATE: 2077-02-04\nI hid the key in the image file. If they find me, at least the data is safe. 'blue_rabbit' is the trigger.",
+    "trash/.recovered_frag": "...SEGMENT CORRUPTED...\n...override protocol 9...\n...target identified: USER_01...",
+    "logs/system_boot.log": "[INFO] KERNEL LOADED\n[INFO] MOUNTING DRIVES... OK\n[WARN] UNKNOWN DEVICE CONNECTED",
+    "bin/readme.md": "# SYSTEM BINARIES\n\nDo not delete system files.",
+    # Secret hidden directory
+    ".shadow/cipher.key": "DECRYPT_KEY: X7-PHANTOM-ECHO-9\nACCESS_TOKEN: ██████████████\nWARNING: If you found this, they already know.",
+    ".shadow/blacklist.dat": "NODE_01: COMPROMISED\nNODE_02: ACTIVE\nNODE_03: [REDACTED]\nNODE_04: OFFLINE SINCE 2076-11-30\nNODE_05: ...listening...",
+}
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".seed")
+MANIFEST_NAME = "manifest.json"
+ARCHIVE_NAME = "seed.tar"
+LOCK_NAME = "seed.lock"
+
+# Fixed mtime inside the archive, so the same tree always builds the same bytes
+ARCHIVE_MTIME = 0
+
+
+def seed_version(tree: Dict[str, str] = SEED_TREE) -> str:
+    h = hashlib.blake2b(digest_size=8)
+    for path in sorted(tree):
+        h.update(path.encode("utf-8") + b"\0" + tree[path].encode("utf-8") + b"\0")
+    return h.hexdigest()
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock held across processes for the duration of the block."""
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def read_manifest(snapshot_dir: str = SNAPSHOT_DIR) -> Optional[dict]:
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _build(snapshot_dir: str, tree: Dict[str, str]) -> dict:
+    buf = io.BytesIO()
+    files = {}
+    folders = set()
+    with tarfile.open(fileobj=buf, mode="w", format=tarfile.PAX_FORMAT) as tar:
+        for path in sorted(tree):
+            parts = path.rstrip("/").split("/")
+            for i in range(1, len(parts) + int(path.endswith("/"))):
+                folder = "/".join(parts[:i])
+                if folder not in folders:
+                    folders.add(folder)
+                    info = tarfile.TarInfo(folder)
+                    info.type, info.mode, info.mtime = tarfile.DIRTYPE, 0o755, ARCHIVE_MTIME
+                    tar.addfile(info)
+            if path.endswith("/"):
+                continue
+            data = tree[path].encode("utf-8")
+            info = tarfile.TarInfo(path)
+            info.size, info.mode, info.mtime = len(data), 0o644, ARCHIVE_MTIME
+            tar.addfile(info, io.BytesIO(data))
+            files[path] = {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+    archive = buf.getvalue()
+    manifest = {
+        "version": seed_version(tree),
+        "archive": ARCHIVE_NAME,
+        "archive_sha256": hashlib.sha256(archive).hexdigest(),
+        "files": files,
+        "folders": sorted(folders),
+        "built_at": time.time(),
+    }
+    # Archive first, manifest last: a manifest on disk always describes a complete archive
+    for name, data in ((ARCHIVE_NAME, archive),
+                       (MANIFEST_NAME, json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))):
+        tmp = os.path.join(snapshot_dir, f".{name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(snapshot_dir, name))
+    return manifest
+
+
+def build(snapshot_dir: str = SNAPSHOT_DIR, tree: Dict[str, str] = SEED_TREE) -> dict:
+    """Build the snapshot unless one for the current seed version already exists."""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with file_lock(os.path.join(snapshot_dir, LOCK_NAME)):
+        manifest = read_manifest(snapshot_dir)
+        if manifest is not None and manifest.get("version") == seed_version(tree) \
+                and os.path.exists(os.path.join(snapshot_dir, ARCHIVE_NAME)):
+            return manifest
+        return _build(snapshot_dir, tree)
+
+
+def base_image(snapshot_dir: str = SNAPSHOT_DIR, tree: Dict[str, str] = SEED_TREE) -> str:
+    """Where the seed tree of the current version is unpacked for the session overlays.
+
+    Nothing writes below it; materialize() it before use.
+    """
+    return os.path.join(snapshot_dir, f"base-{seed_version(tree)}")
+
+
+def stamp(root: str, mtime: float):
+    """Give everything below ``root`` the time ``mtime``.
+
+    The archive carries ARCHIVE_MTIME to stay reproducible; extracted as is,
+    every file would claim to date from 1970 in Last-Modified and validators.
+    Folders go after their contents, whose creation moved their mtime.
+    """
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        for name in filenames:
+            os.utime(os.path.join(dirpath, name), (mtime, mtime))
+        os.utime(dirpath, (mtime, mtime))
+
+
+def materialize(files_dir: str, snapshot_dir: str = SNAPSHOT_DIR, tree: Dict[str, str] = SEED_TREE) -> dict:
+    """Create ``files_dir`` from the snapshot if it does not exist yet.
+
+    Returns timings and what was done; an existing tree is never touched.
+    """
+    start = time.perf_counter()
+    if os.path.exists(files_dir):
+        return {"seeded": False, "ms": (time.perf_counter() - start) * 1000}
+
+    manifest = build(snapshot_dir, tree)
+    with file_lock(os.path.join(snapshot_dir, LOCK_NAME)):
+        # Another worker may have finished while this one waited for the lock
+        if os.path.exists(files_dir):
+            return {"seeded": False, "version": manifest["version"], "ms": (time.perf_counter() - start) * 1000}
+        tmp = f"{files_dir}.seed-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            with tarfile.open(os.path.join(snapshot_dir, ARCHIVE_NAME), "r") as tar:
+                for member in tar.getmembers():
+                    if not (member.isfile() or member.isdir()) or member.name.startswith("/") \
+                            or ".." in member.name.split("/"):
+                        raise ValueError(f"unsafe entry in seed archive: {member.name}")
+                tar.extractall(tmp)
+            stamp(tmp, time.time())
+            os.rename(tmp, files_dir)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+    return {"seeded": True, "version": manifest["version"], "files": len(manifest["files"]),
+            "ms": (time.perf_counter() - start) * 1000}
+
+
+def status(snapshot_dir: str = SNAPSHOT_DIR) -> dict:
+    manifest = read_manifest(snapshot_dir)
+    return {
+        "version": seed_version(),
+        "snapshot_version": manifest.get("version") if manifest else None,
+        "current": bool(manifest) and manifest.get("version") == seed_version(),
+        "files": len(SEED_TREE),
+    }
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "build":
+        manifest = build()
+        print(f"seed snapshot {manifest['version']}: {len(manifest['files'])} files in {SNAPSHOT_DIR}")
+    elif command == "status":
+        print(json.dumps(status(), indent=2))
+    else:
+        sys.exit("usage: python seed.py [build|status]")
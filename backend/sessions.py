@@ -0,0 +1,303 @@
+# sessions.py
+#
+# Per-visitor copy-on-write namespaces. Requests carrying an X-Session-Id
+# header see a read-only base image (the unpacked seed snapshot, never the
+# live shared tree, so one visitor's changes can't reach another); their
+# writes land in a private upper directory, and deletions of base entries are
+# recorded as whiteouts. A session that never writes has no files on disk and
+# costs one small in-memory object. Session ids are handed out by new_id().
+#
+# Resident overlays are kept in an LRU bounded by max_resident. Whiteouts are
+# persisted to the session directory as they change, so evicting an overlay
+# just drops it from memory and the next request reloads it from disk.
+# Sessions not seen for ttl_seconds are deleted by a periodic reaper.
+
+import errno
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Set
+
+from storage import atomic_write
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+WHITEOUTS_FILE = "whiteouts.json"
+
+
+def new_id() -> str:
+    """A fresh, unguessable session id (22 URL-safe characters)."""
+    return secrets.token_urlsafe(16)
+
+
+def _error(cls, code: int, rel: str):
+    return cls(code, os.strerror(code), "/" + rel)
+
+
+class Overlay:
+    def __init__(self, sid: str, base: str, root: str, manager: "SessionManager", whiteouts: Set[str] = None):
+        self.sid = sid
+        self.base = base
+        self.root = root                          # <sessions>/<sid>, created on first write
+        self.upper = os.path.join(root, "upper")
+        self.manager = manager
+        self.whiteouts: Set[str] = whiteouts or set()
+        self.lock = threading.RLock()
+
+    # ---- resolution ----
+
+    def _base(self, rel: str) -> str:
+        return os.path.join(self.base, rel) if rel else self.base
+
+    def _upper(self, rel: str) -> str:
+        return os.path.join(self.upper, rel) if rel else self.upper
+
+    def _hidden(self, rel: str) -> bool:
+        """True if a whiteout on ``rel`` or an ancestor hides the base entry."""
+        if not self.whiteouts or not rel:
+            return False
+        parts = rel.split("/")
+        return any("/".join(parts[:i]) in self.whiteouts for i in range(1, len(parts) + 1))
+
+    def lookup(self, rel: str) -> Optional[str]:
+        """Real path backing ``rel`` in this session's view, or None."""
+        up = self._upper(rel)
+        if rel and os.path.lexists(up):
+            return up
+        if not self._hidden(rel):
+            base = self._base(rel)
+            if os.path.lexists(base):
+                return base
+        return None
+
+    def listdir(self, rel: str) -> List[dict]:
+        real = self.lookup(rel)
+        if real is None:
+            raise _error(FileNotFoundError, errno.ENOENT, rel)
+        if not os.path.isdir(real):
+            raise _error(NotADirectoryError, errno.ENOTDIR, rel)
+        merged = {}
+        base = self._base(rel)
+        if not self._hidden(rel) and os.path.isdir(base):
+            prefix = rel + "/" if rel else ""
+            for entry in self.manager.list_dir(base):
+                if prefix + entry["name"] not in self.whiteouts:
+                    merged[entry["name"]] = entry
+        up = self._upper(rel)
+        if os.path.isdir(up):
+            for entry in self.manager.list_dir(up):
+                merged[entry["name"]] = entry
+        return list(merged.values())
+
+    def _writable(self, rel: str) -> str:
+        if not rel:
+            raise _error(PermissionError, errno.EACCES, rel)
+        parent = os.path.dirname(rel)
+        real_parent = self.lookup(parent)
+        if real_parent is None:
+            raise _error(FileNotFoundError, errno.ENOENT, parent)
+        if not os.path.isdir(real_parent):
+            raise _error(NotADirectoryError, errno.ENOTDIR, parent)
+        os.makedirs(os.path.dirname(self._upper(rel)), exist_ok=True)
+        return self._upper(rel)
+
+    def _persist(self):
+        os.makedirs(self.root, exist_ok=True)
+        atomic_write(os.path.join(self.root, WHITEOUTS_FILE), json.dumps(sorted(self.whiteouts)).encode())
+        self.manager.on_change(os.path.join(self.root, WHITEOUTS_FILE))
+
+    def _whiteout(self, rel: str):
+        prefix = rel + "/"
+        self.whiteouts = {w for w in self.whiteouts if not w.startswith(prefix)}
+        self.whiteouts.add(rel)
+        self._persist()
+
+    # ---- mutations ----
+
+    def write(self, rel: str, data: bytes):
+        with self.lock:
+            target = self._writable(rel)
+            self.manager.save(target, data)
+            self.manager.on_change(target)
+
+    def adopt(self, rel: str, src: str):
+        """Like write(), with the contents already in the file ``src`` (which is consumed)."""
+        with self.lock:
+            target = self._writable(rel)
+            self.manager.storage.adopt(target, src)
+            self.manager.on_change(target)
+
+    def mkdir(self, rel: str):
+        """Create ``rel`` and any missing parents, like os.makedirs(exist_ok=True)."""
+        with self.lock:
+            if not rel:
+                return
+            real = self.lookup(rel)
+            if real is not None and not os.path.isdir(real):
+                raise _error(FileExistsError, errno.EEXIST, rel)
+            target = self._upper(rel)
+            os.makedirs(target, exist_ok=True)
+            self.manager.on_change(target)
+
+    def delete(self, rel: str):
+        with self.lock:
+            if not rel:
+                raise _error(PermissionError, errno.EACCES, rel)
+            if self.lookup(rel) is None:
+                raise _error(FileNotFoundError, errno.ENOENT, rel)
+            up = self._upper(rel)
+            if os.path.lexists(up):
+                self.manager.storage.delete(up)
+                self.manager.on_change(up)
+            if not self._hidden(rel) and os.path.lexists(self._base(rel)):
+                self._whiteout(rel)
+
+    def copy(self, src: str, dst: str):
+        with self.lock:
+            real = self.lookup(src)
+            if real is None:
+                raise _error(FileNotFoundError, errno.ENOENT, src)
+            dst_real = self.lookup(dst)
+            if not os.path.isdir(real):
+                if dst_real is not None and os.path.isdir(dst_real):
+                    dst = f"{dst}/{os.path.basename(src)}" if dst else os.path.basename(src)
+                target = self._writable(dst)
+                self.manager.storage.copy(real, target)
+                self.manager.on_change(target)
+                return
+            if dst_real is not None:
+                raise _error(FileExistsError, errno.EEXIST, dst)
+            self.mkdir(dst)
+            for entry in self.listdir(src):
+                self.copy(f"{src}/{entry['name']}" if src else entry["name"], f"{dst}/{entry['name']}")
+
+    def move(self, src: str, dst: str):
+        with self.lock:
+            real = self.lookup(src)
+            if real is None:
+                raise _error(FileNotFoundError, errno.ENOENT, src)
+            if not src:
+                raise _error(PermissionError, errno.EACCES, src)
+            dst_real = self.lookup(dst)
+            if dst_real is not None and os.path.isdir(dst_real):
+                dst = f"{dst}/{os.path.basename(src)}" if dst else os.path.basename(src)
+                dst_real = self.lookup(dst)
+            if dst_real is not None and os.path.isdir(dst_real):
+                raise _error(FileExistsError, errno.EEXIST, dst)
+
+            in_base = not self._hidden(src) and os.path.lexists(self._base(src))
+            if in_base:
+                self.copy(src, dst)
+                self.delete(src)
+                return
+            # Only this session has it: a rename inside the upper directory
+            target = self._writable(dst)
+            os.replace(self._upper(src), target)
+            if os.path.isdir(target) and not self._hidden(dst) and os.path.lexists(self._base(dst)):
+                self._whiteout(dst)
+            self.manager.on_change(self._upper(src))
+            self.manager.on_change(target)
+
+    def footprint(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.whiteouts) + sum(sys.getsizeof(w) for w in self.whiteouts)
+
+
+class SessionManager:
+    def __init__(self, base: str, root: str, storage, save: Callable[[str, bytes], None],
+                 list_dir: Callable[[str], List[dict]], on_change: Callable[[str], None],
+                 max_resident: int = 2048, ttl_seconds: int = 24 * 3600, reap_interval: int = 600):
+        self.base = base
+        self.root = root
+        self.storage = storage
+        self.save = save
+        self.list_dir = list_dir
+        self.on_change = on_change
+        self.max_resident = max_resident
+        self.ttl_seconds = ttl_seconds
+        self.reap_interval = reap_interval
+        self._resident: "OrderedDict[str, Overlay]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_reap = time.monotonic()
+        self.created = 0
+        self.loaded = 0
+        self.evicted = 0
+        self.reaped = 0
+
+    def get(self, sid: str) -> Overlay:
+        if not SESSION_ID_RE.match(sid):
+            raise ValueError("Invalid session id")
+        with self._lock:
+            overlay = self._resident.get(sid)
+            if overlay is not None:
+                self._resident.move_to_end(sid)
+                return overlay
+            overlay = self._load(sid)
+            self._resident[sid] = overlay
+            while len(self._resident) > self.max_resident:
+                self._evict()
+            reap = time.monotonic() - self._last_reap > self.reap_interval
+            if reap:
+                self._last_reap = time.monotonic()
+        if reap:
+            threading.Thread(target=self.reap, name="session-reaper", daemon=True).start()
+        return overlay
+
+    def _load(self, sid: str) -> Overlay:
+        root = os.path.join(self.root, sid)
+        whiteouts = set()
+        try:
+            with open(os.path.join(root, WHITEOUTS_FILE)) as f:
+                whiteouts = set(json.load(f))
+            self.loaded += 1
+        except FileNotFoundError:
+            if os.path.isdir(root):
+                self.loaded += 1
+            else:
+                self.created += 1
+        return Overlay(sid, self.base, root, self, whiteouts)
+
+    def _evict(self):
+        sid, overlay = self._resident.popitem(last=False)
+        # Whiteouts are already on disk; stamp the directory so the reaper sees when it was last used
+        if os.path.isdir(overlay.root):
+            os.utime(overlay.root)
+        self.evicted += 1
+
+    def reap(self):
+        """Delete on-disk sessions that are not resident and have been idle past the TTL."""
+        if not os.path.isdir(self.root):
+            return
+        cutoff = time.time() - self.ttl_seconds
+        for sid in os.listdir(self.root):
+            path = os.path.join(self.root, sid)
+            with self._lock:
+                if sid in self._resident:
+                    continue
+                try:
+                    if os.stat(path).st_mtime >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+            self.storage.delete(path)
+            self.on_change(path)
+            self.reaped += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            resident = list(self._resident.values())
+        on_disk = len(os.listdir(self.root)) if os.path.isdir(self.root) else 0
+        return {
+            "resident": len(resident),
+            "max_resident": self.max_resident,
+            "resident_bytes": sum(o.footprint() for o in resident),
+            "on_disk": on_disk,
+            "created": self.created,
+            "loaded": self.loaded,
+            "evicted": self.evicted,
+            "reaped": self.reaped,
+            "ttl_seconds": self.ttl_seconds,
+        }
@@ -0,0 +1,379 @@
+# shell.py
+#
+# Command-line parsing and pipelines for the terminal. A line is split into
+# words with sh-style quoting ('...', "...", backslash) and $VAR expansion,
+# then into pipelines joined by ';' and '&&'. Each pipeline is a chain of
+# stages connected by '|', optionally ending in a '>' or '>>' redirection.
+#
+# Stages are generators of lines: a stage pulls from the one before it only
+# as fast as the next one consumes, so `cat big.log | grep WARN | head -5`
+# reads just enough of the file to find five matches. The built-in filters
+# below hold at most a fixed number of lines in memory; sort spills sorted
+# runs to temporary files and merges them.
+
+import heapq
+import re
+import tempfile
+from collections import deque
+from itertools import islice
+from typing import Callable, Iterator, List, Optional, Tuple
+
+OPERATORS = ("&&", ">>", "|", ">", ";")     # longest first
+VAR_RE = re.compile(r"\$(?:\{(\w+)\}|(\w+))")
+NUMBER_RE = re.compile(r"^\s*-?\d+(?:\.\d+)?")
+
+# sort keeps at most this many lines in memory before spilling a sorted run
+SORT_RUN_LINES = 10000
+
+
+class ShellError(Exception):
+    pass
+
+
+class Pipeline:
+    def __init__(self):
+        self.stages: List[List[str]] = [[]]
+        self.redirect: Optional[Tuple[str, str]] = None    # (">" | ">>", path)
+
+    def simple(self) -> bool:
+        return len(self.stages) == 1 and self.redirect is None
+
+
+# ---- parsing ----
+
+def tokenize(line: str, getenv: Callable[[str], Optional[str]]) -> List[Tuple[str, str]]:
+    """Split ``line`` into ("word", text) and ("op", operator) tokens."""
+    tokens: List[Tuple[str, str]] = []
+    word: List[str] = []
+    quoted = False      # an empty "" still makes a word
+
+    def flush():
+        nonlocal quoted
+        if word or quoted:
+            tokens.append(("word", "".join(word)))
+        word.clear()
+        quoted = False
+
+    def expand(i: int) -> int:
+        m = VAR_RE.match(line, i)
+        if m is None:
+            word.append("$")
+            return i + 1
+        word.append(getenv(m.group(1) or m.group(2)) or "")
+        return m.end()
+
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i]
+        if c in " \t":
+            flush()
+            i += 1
+        elif c == "'":
+            end = line.find("'", i + 1)
+            if end < 0:
+                raise ShellError("unterminated quote")
+            word.append(line[i + 1:end])
+            quoted = True
+            i = end + 1
+        elif c == '"':
+            quoted = True
+            i += 1
+            while True:
+                if i >= n:
+                    raise ShellError("unterminated quote")
+                c = line[i]
+                if c == '"':
+                    i += 1
+                    break
+                if c == "\\" and i + 1 < n and line[i + 1] in '"\\$':
+                    word.append(line[i + 1])
+                    i += 2
+                elif c == "$":
+                    i = expand(i)
+                else:
+                    word.append(c)
+                    i += 1
+        elif c == "\\":
+            if i + 1 < n:
+                word.append(line[i + 1])
+                quoted = True
+            i += 2
+        elif c == "$":
+            i = expand(i)
+        else:
+            op = next((o for o in OPERATORS if line.startswith(o, i)), None)
+            if op is not None:
+                flush()
+                tokens.append(("op", op))
+                i += len(op)
+            elif c == "&":
+                raise ShellError("background jobs ('&') are not supported")
+            else:
+                word.append(c)
+                i += 1
+    flush()
+    return tokens
+
+
+def parse(line: str, getenv: Callable[[str], Optional[str]] = lambda name: None) -> List[Tuple[str, Pipeline]]:
+    """Parse ``line`` into [(connector, pipeline)], connector being ";" or "&&"."""
+    chain: List[Tuple[str, Pipeline]] = []
+    connector = ";"
+    pipeline = Pipeline()
+    tokens = tokenize(line, getenv)
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        stage = pipeline.stages[-1]
+        if kind == "word":
+            if pipeline.redirect is not None:
+                raise ShellError(f"unexpected '{value}' after redirection")
+            stage.append(value)
+        elif value == "|":
+            if not stage or pipeline.redirect is not None:
+                raise ShellError("syntax error near '|'")
+            pipeline.stages.append([])
+        elif value in (">", ">>"):
+            if not stage or i + 1 >= len(tokens) or tokens[i + 1][0] != "word":
+                raise ShellError(f"syntax error near '{value}'")
+            pipeline.redirect = (value, tokens[i + 1][1])
+            i += 1
+        else:
+            if not stage:
+                if value == "&&" or pipeline.stages != [[]]:
+                    raise ShellError(f"syntax error near '{value}'")
+            else:
+                chain.append((connector, pipeline))
+            connector, pipeline = value, Pipeline()
+        i += 1
+    if pipeline.stages[-1]:
+        chain.append((connector, pipeline))
+    elif len(pipeline.stages) > 1 or connector == "&&":
+        raise ShellError("syntax error: unexpected end of command")
+    return chain
+
+
+def simple_command(chain: List[Tuple[str, Pipeline]]) -> Optional[List[str]]:
+    """argv if ``chain`` is one plain command (no pipes, redirects or chaining)."""
+    if len(chain) == 1 and chain[0][1].simple():
+        return chain[0][1].stages[0]
+    return None
+
+
+# ---- built-in filters ----
+# Each filter is fn(args, stdin, open_file) -> iterator of lines. File operands
+# are read through open_file; without any, the filter reads stdin.
+
+def _count(args: List[str], default: int) -> Tuple[int, List[str]]:
+    n, rest = default, []
+    it = iter(args)
+    for a in it:
+        if a == "-n":
+            a = "-" + next(it, "")
+        if re.fullmatch(r"-\d+", a):
+            n = int(a[1:])
+        else:
+            rest.append(a)
+    return n, rest
+
+
+def _flags(args: List[str], allowed: str) -> Tuple[set, List[str]]:
+    flags, operands = set(), []
+    for a in args:
+        if a.startswith("-") and len(a) > 1 and not operands:
+            for f in a[1:]:
+                if f not in allowed:
+                    raise ShellError(f"invalid option -- '{f}'")
+                flags.add(f)
+        else:
+            operands.append(a)
+    return flags, operands
+
+
+def _input(operands: List[str], stdin: Optional[Iterator[str]], open_file) -> Iterator[str]:
+    if operands:
+        for path in operands:
+            yield from open_file(path)
+    elif stdin is not None:
+        yield from stdin
+
+
+def cat(args, stdin, open_file):
+    return _input(args, stdin, open_file)
+
+
+def grep(args, stdin, open_file):
+    flags, operands = _flags(args, "ivcn")
+    if not operands:
+        raise ShellError("Usage: grep [-ivcn] PATTERN [file...]")
+    pattern, files = operands[0], operands[1:]
+    needle = pattern.lower() if "i" in flags else pattern
+    count = 0
+    for lineno, line in enumerate(_input(files, stdin, open_file), 1):
+        hit = needle in (line.lower() if "i" in flags else line)
+        if hit != ("v" in flags):
+            count += 1
+            if "c" not in flags:
+                yield f"{lineno}:{line}" if "n" in flags else line
+    if "c" in flags:
+        yield str(count)
+
+
+def head(args, stdin, open_file):
+    n, operands = _count(args, 10)
+    return islice(_input(operands, stdin, open_file), n)
+
+
+def tail(args, stdin, open_file):
+    n, operands = _count(args, 10)
+    yield from deque(_input(operands, stdin, open_file), maxlen=n)
+
+
+def wc(args, stdin, open_file):
+    flags, operands = _flags(args, "lwc")
+    lines = words = chars = 0
+    for line in _input(operands, stdin, open_file):
+        lines += 1
+        words += len(line.split())
+        chars += len(line) + 1
+    flags = flags or {"l", "w", "c"}
+    yield " ".join(str(v) for f, v in (("l", lines), ("w", words), ("c", chars)) if f in flags)
+
+
+def _numeric_key(line: str):
+    m = NUMBER_RE.match(line)
+    return (float(m.group()) if m else 0.0, line)
+
+
+def _spill(lines: List[str]):
+    run = tempfile.TemporaryFile("w+", encoding="utf-8", newline="\n")
+    run.writelines(line + "\n" for line in lines)
+    run.seek(0)
+    return run
+
+
+def sort(args, stdin, open_file):
+    flags, operands = _flags(args, "rnu")
+    key = _numeric_key if "n" in flags else None
+    reverse = "r" in flags
+    runs = []
+    try:
+        source = _input(operands, stdin, open_file)
+        chunk = sorted(islice(source, SORT_RUN_LINES), key=key, reverse=reverse)
+        while len(chunk) == SORT_RUN_LINES:
+            runs.append(_spill(chunk))
+            chunk = sorted(islice(source, SORT_RUN_LINES), key=key, reverse=reverse)
+        if runs:
+            if chunk:
+                runs.append(_spill(chunk))
+            merged = heapq.merge(*((line[:-1] for line in run) for run in runs), key=key, reverse=reverse)
+        else:
+            merged = iter(chunk)
+        previous = None
+        for line in merged:
+            if "u" in flags and line == previous:
+                continue
+            previous = line
+            yield line
+    finally:
+        for run in runs:
+            run.close()
+
+
+def uniq(args, stdin, open_file):
+    flags, operands = _flags(args, "cdu")
+    previous, count = None, 0
+
+    def emit():
+        if ("d" in flags and count < 2) or ("u" in flags and count > 1):
+            return None
+        return f"{count:>7} {previous}" if "c" in flags else previous
+
+    for line in _input(operands, stdin, open_file):
+        if line == previous:
+            count += 1
+            continue
+        if count:
+            out = emit()
+            if out is not None:
+                yield out
+        previous, count = line, 1
+    if count:
+        out = emit()
+        if out is not None:
+            yield out
+
+
+FILTERS = {"cat": cat, "grep": grep, "head": head, "tail": tail, "wc": wc, "sort": sort, "uniq": uniq}
+
+
+# ---- execution ----
+
+def message_lines(messages: Iterator[dict]) -> Iterator[str]:
+    """Lines of a registry command's output; an error result raises ShellError."""
+    for message in messages:
+        kind = message.get("type")
+        if kind == "error":
+            raise ShellError(message["content"])
+        if kind == "line":
+            yield message["content"]
+        elif kind == "list":
+            for entry in message["content"]:
+                yield entry["name"] + ("/" if entry.get("type") == "folder" else "")
+        elif kind == "text" and message["content"]:
+            yield from message["content"].split("\n")
+
+
+class Shell:
+    """Runs parsed command lines against a command registry.
+
+    ``open_file(ctx, path)`` yields the lines of a file for the filters, and
+    ``write_file(ctx, path, data, append)`` stores redirected output (capped at
+    ``max_redirect_bytes``, since files are written whole).
+    """
+
+    def __init__(self, registry, open_file: Callable, write_file: Callable,
+                 max_redirect_bytes: int = 8 * 1024 * 1024):
+        self.registry = registry
+        self.open_file = open_file
+        self.write_file = write_file
+        self.max_redirect_bytes = max_redirect_bytes
+
+    def stage(self, argv: List[str], stdin: Optional[Iterator[str]], ctx) -> Iterator[str]:
+        name, args = argv[0].lower(), argv[1:]
+        # grep with no input to filter searches the tree through the index instead
+        if name in FILTERS and (stdin is not None or name != "grep"):
+            return FILTERS[name](args, stdin, lambda path: self.open_file(ctx, path))
+        return message_lines(self.registry.stream(name, args, ctx))
+
+    def run(self, chain: List[Tuple[str, Pipeline]], ctx) -> Iterator[dict]:
+        """Yield {"type": "line"} / {"type": "error"} messages for the whole chain."""
+        ok = True
+        for connector, pipeline in chain:
+            if connector == "&&" and not ok:
+                continue
+            ok = yield from self._pipeline(pipeline, ctx)
+
+    def _pipeline(self, pipeline: Pipeline, ctx):
+        lines = None
+        try:
+            for argv in pipeline.stages:
+                lines = self.stage(argv, lines, ctx)
+            if pipeline.redirect is None:
+                for line in lines:
+                    yield {"type": "line", "content": line}
+                return True
+            op, path = pipeline.redirect
+            data = bytearray()
+            for line in lines:
+                data += line.encode("utf-8") + b"\n"
+                if len(data) > self.max_redirect_bytes:
+                    raise ShellError(f"{path}: output exceeds {self.max_redirect_bytes} bytes")
+            self.write_file(ctx, path, bytes(data), op == ">>")
+            return True
+        except (ShellError, OSError, ValueError) as e:
+            if isinstance(e, OSError) and e.filename and e.strerror:
+                yield {"type": "error", "content": f"{e.filename}: {e.strerror}"}
+            else:
+                yield {"type": "error", "content": str(e)}
+            return False
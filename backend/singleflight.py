@@ -0,0 +1,91 @@
+# singleflight.py
+#
+# Request coalescing for reads: while a call for some key is in flight,
+# further calls for the same key wait for it and share its result instead of
+# doing the work again. A burst of visitors opening the same file from a
+# shared link then costs one disk read, not one per request.
+#
+# Callers block on a threading.Event, which suits the sync endpoints that
+# FastAPI runs in its threadpool. The shared result is handed to every
+# caller as is, so it must not be mutated afterwards.
+#
+# invalidate() starts a new generation: calls made after it never join a
+# flight that began before it. touched() calls it after every mutation, so
+# a client that has seen its write acknowledged never reads an older state
+# from a flight that was already running.
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Tuple[int, Hashable], _Call] = {}
+        self.generation = 0
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0
+        self.errors = 0
+        self.peak_waiters = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        """``fn(*args)``, or the result of an identical call already in flight."""
+        with self._lock:
+            self.calls += 1
+            key = (self.generation, key)
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+                self.shared += 1
+                self.peak_waiters = max(self.peak_waiters, call.waiters)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.executions += 1
+            call.done.set()
+
+    def invalidate(self):
+        """Keep later calls out of the flights now running."""
+        with self._lock:
+            self.generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "shared": self.shared,
+                "shared_ratio": round(self.shared / self.calls, 4) if self.calls else 0.0,
+                "errors": self.errors,
+                "in_flight": len(self._calls),
+                "peak_waiters": self.peak_waiters,
+                "generation": self.generation,
+            }
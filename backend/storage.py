@@ -0,0 +1,317 @@
+# storage.py
+#
+# Backends for writing, copying and deleting files under FILES_DIR.
+#
+# PlainStorage stores files as-is, replacing them atomically via a temp file
+# and rename so readers never see a truncated file. BlobStorage keeps file contents in a
+# content-addressed store (sha256 -> blob) and makes every visible file a hard
+# link to its blob, so the tree under FILES_DIR stays an ordinary directory
+# that scandir, FileResponse and the indexes read as before. A blob's link
+# count is its reference count: copying links instead of duplicating bytes,
+# identical writes share one blob, and a blob is removed once the last
+# visible file pointing at it is gone.
+#
+# Replacing by rename makes a write atomic; to make it durable as well, the
+# new file is fsynced before the rename and its directory after it, so a
+# crash leaves either the old or the new content, never an empty file. With
+# the write-ahead journal on (sync=False) the journal provides durability
+# and its checkpoints fsync applied files in bulk, so the per-write fsyncs
+# are skipped.
+
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+CHUNK_SIZE = 1024 * 1024
+
+# mkstemp creates 0600 files; new files should get the usual umask-derived mode
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def fsync_dir(directory: str):
+    """Make renames and links in ``directory`` durable."""
+    fd = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_file(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str, data: bytes, sync: bool = True):
+    """Write ``data`` to a temp file beside ``path`` and rename it into place.
+
+    With ``sync`` the data and the rename are on disk when this returns.
+    """
+    directory, name = os.path.split(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    if sync:
+        fsync_dir(directory)
+
+
+def adopt_file(src: str, path: str, sync: bool = True):
+    """Rename the finished file ``src`` over ``path``, copying first if they are on different filesystems."""
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(src, mode)
+    if sync:
+        fsync_file(src)
+    try:
+        os.replace(src, path)
+        if sync:
+            fsync_dir(os.path.dirname(path))
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    directory, name = os.path.split(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out, open(src, "rb") as f:
+            shutil.copyfileobj(f, out, CHUNK_SIZE)
+            if sync:
+                out.flush()
+                os.fsync(out.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    if sync:
+        fsync_dir(directory)
+    os.remove(src)
+
+
+class PlainStorage:
+    mode = "plain"
+
+    def __init__(self, sync: bool = True):
+        self.sync = sync
+
+    def write(self, path: str, data: bytes):
+        atomic_write(path, data, self.sync)
+
+    def adopt(self, path: str, src: str):
+        """Store the already-written file ``src`` as ``path``, consuming ``src``."""
+        adopt_file(src, path, self.sync)
+
+    def copy(self, src: str, dst: str):
+        if os.path.isdir(src):
+            shutil.copytree(src, dst)
+        else:
+            shutil.copy2(src, dst)
+
+    def delete(self, path: str):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "sync": self.sync}
+
+
+class BlobStorage:
+    mode = "blob"
+
+    def __init__(self, root: str, sync: bool = True):
+        self.root = root
+        self.sync = sync
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._inodes: Dict[int, str] = {}   # blob inode -> digest
+        self.dedup_hits = 0
+        self._rescan()
+
+    # ---- blob level ----
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def _rescan(self):
+        inodes = {}
+        for name in os.listdir(self.root):
+            shard = os.path.join(self.root, name)
+            if len(name) != 2 or not os.path.isdir(shard):
+                continue
+            for rest in os.listdir(shard):
+                inodes[os.stat(os.path.join(shard, rest)).st_ino] = name + rest
+        with self._lock:
+            self._inodes = inodes
+
+    def _store(self, tmp_path: str, path: str):
+        """Move ``tmp_path`` into the store (or drop it as a duplicate) and link ``path`` to it."""
+        h = hashlib.sha256()
+        with open(tmp_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        blob = self._blob_path(digest)
+        staged = self._staging_name(path)
+        with self._lock:
+            try:
+                # The staged link holds a reference, so _release can't free the blob under us
+                os.link(blob, staged)
+                os.remove(tmp_path)
+                self.dedup_hits += 1
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.chmod(tmp_path, 0o444)
+                if self.sync:
+                    fsync_file(tmp_path)
+                os.replace(tmp_path, blob)
+                if self.sync:
+                    fsync_dir(os.path.dirname(blob))
+                self._inodes[os.stat(blob).st_ino] = digest
+                os.link(blob, staged)
+        self._commit(staged, path)
+
+    def _digest_of(self, path: str) -> Optional[str]:
+        st = os.stat(path)
+        if st.st_nlink < 2:
+            return None
+        digest = self._inodes.get(st.st_ino)
+        if digest is None:
+            # Blob may have been added by another worker process
+            self._rescan()
+            digest = self._inodes.get(st.st_ino)
+        return digest
+
+    @staticmethod
+    def _staging_name(path: str) -> str:
+        return os.path.join(os.path.dirname(path),
+                            f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.lnk")
+
+    def _commit(self, staged: str, path: str):
+        # Rename the staged link over the target, so a reader never sees a
+        # missing or half-written file, then drop the blob it used to point at
+        old = self._digest_of(path) if os.path.isfile(path) else None
+        os.replace(staged, path)
+        if self.sync:
+            fsync_dir(os.path.dirname(path))
+        if old is not None:
+            self._release([old])
+
+    def _link_existing(self, src: str, dst: str):
+        """Point ``dst`` at the blob behind ``src``, ingesting ``src`` first if needed."""
+        if self._digest_of(src) is None:
+            self._ingest(src)
+        staged = self._staging_name(dst)
+        os.link(src, staged)
+        self._commit(staged, dst)
+
+    def _release(self, digests: List[str]):
+        with self._lock:
+            for digest in set(digests):
+                blob = self._blob_path(digest)
+                try:
+                    st = os.stat(blob)
+                except FileNotFoundError:
+                    continue
+                if st.st_nlink == 1:
+                    os.remove(blob)
+                    self._inodes.pop(st.st_ino, None)
+
+    def _ingest(self, path: str):
+        """Turn an ordinary file under FILES_DIR into a blob-backed one."""
+        fd, tmp = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "wb") as out, open(path, "rb") as f:
+            shutil.copyfileobj(f, out, CHUNK_SIZE)
+        self._store(tmp, path)
+
+    # ---- storage interface ----
+
+    def write(self, path: str, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self._store(tmp, path)
+
+    def adopt(self, path: str, src: str):
+        self._store(src, path)
+
+    def copy(self, src: str, dst: str):
+        if not os.path.isdir(src):
+            if os.path.isdir(dst):
+                dst = os.path.join(dst, os.path.basename(src))
+            self._link_existing(src, dst)
+            return
+        os.makedirs(dst)
+        for dirpath, dirnames, filenames in os.walk(src):
+            rel = os.path.relpath(dirpath, src)
+            target_dir = os.path.normpath(os.path.join(dst, rel))
+            for name in dirnames:
+                os.makedirs(os.path.join(target_dir, name), exist_ok=True)
+            for name in filenames:
+                self._link_existing(os.path.join(dirpath, name), os.path.join(target_dir, name))
+
+    def delete(self, path: str):
+        digests = []
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                for name in filenames:
+                    digest = self._digest_of(os.path.join(dirpath, name))
+                    if digest:
+                        digests.append(digest)
+            shutil.rmtree(path)
+        else:
+            digest = self._digest_of(path)
+            if digest:
+                digests.append(digest)
+            os.remove(path)
+        self._release(digests)
+
+    def stats(self) -> dict:
+        with self._lock:
+            blobs = 0
+            stored = 0
+            referenced = 0
+            for digest in self._inodes.values():
+                try:
+                    st = os.stat(self._blob_path(digest))
+                except FileNotFoundError:
+                    continue
+                blobs += 1
+                stored += st.st_size
+                referenced += st.st_size * (st.st_nlink - 1)
+            return {
+                "mode": self.mode,
+                "sync": self.sync,
+                "blobs": blobs,
+                "stored_bytes": stored,
+                "logical_bytes": referenced,
+                "dedup_hits": self.dedup_hits,
+            }
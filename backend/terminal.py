@@ -0,0 +1,160 @@
+# terminal.py
+#
+# Server-side terminal state, keyed by the same X-Session-Id as the file
+# overlays: current directory, a fixed-size history ring and environment
+# overrides. State is small and lives only in memory. Sessions idle past
+# idle_seconds are dropped, and the least recently used ones are evicted
+# whenever the estimated total footprint goes over max_bytes.
+
+import posixpath
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+HISTORY_SIZE = 100          # commands kept per session
+MAX_COMMAND_CHARS = 512     # longer history entries are truncated
+MAX_ENV_VARS = 64
+MAX_ENV_CHARS = 1024        # per name=value pair
+
+# Variables every session starts with; sessions only store what they change
+DEFAULT_ENV = {
+    "USER": "USER_01",
+    "HOME": "/",
+    "SHELL": "/bin/ghost-sh",
+    "HOSTNAME": "CYBER_NODE_7G",
+    "TERM": "xterm-256color",
+}
+
+
+def normalize(path: str) -> str:
+    """Collapse ``path`` to an absolute virtual path; '..' never climbs above '/'."""
+    path = posixpath.normpath("/" + path.lstrip("/"))
+    return "/" + path.lstrip("/")
+
+
+class TerminalSession:
+    __slots__ = ("sid", "cwd", "history", "env", "last_seen", "nbytes")
+
+    def __init__(self, sid: str):
+        self.sid = sid
+        self.cwd = "/"
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.env: Dict[str, str] = {}
+        self.last_seen = time.monotonic()
+        self.nbytes = 0
+
+    def resolve(self, path: str) -> str:
+        """Absolute virtual path for ``path``, taken relative to the cwd unless it starts with '/'."""
+        if path in ("", "."):
+            return self.cwd
+        if path == "~" or path.startswith("~/"):
+            path = self.getenv("HOME") + path[1:]
+        return normalize(path if path.startswith("/") else posixpath.join(self.cwd, path))
+
+    def getenv(self, name: str) -> Optional[str]:
+        return self.env.get(name, DEFAULT_ENV.get(name))
+
+    def environ(self) -> Dict[str, str]:
+        return {**DEFAULT_ENV, **self.env, "PWD": self.cwd}
+
+    def setenv(self, name: str, value: str):
+        if name not in self.env and len(self.env) >= MAX_ENV_VARS:
+            raise ValueError(f"export: too many variables (max {MAX_ENV_VARS})")
+        if len(name) + len(value) > MAX_ENV_CHARS:
+            raise ValueError(f"export: {name}: value too long")
+        self.env[name] = value
+
+    def unsetenv(self, name: str):
+        self.env.pop(name, None)
+
+    def record(self, command: str):
+        self.history.append(command[:MAX_COMMAND_CHARS])
+
+    def footprint(self) -> int:
+        return (sys.getsizeof(self) + sys.getsizeof(self.cwd) + sys.getsizeof(self.history)
+                + sum(sys.getsizeof(c) for c in self.history)
+                + sys.getsizeof(self.env) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self.env.items()))
+
+
+class TerminalSessions:
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, idle_seconds: int = 3600):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, TerminalSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, sid: str) -> TerminalSession:
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                session = TerminalSession(sid)
+                self._sessions[sid] = session
+                self.created += 1
+                self._resize(session)
+            else:
+                self._sessions.move_to_end(sid)
+            session.last_seen = now
+            self._expire(now)
+            return session
+
+    def peek(self, sid: Optional[str]) -> Optional[TerminalSession]:
+        """The session for ``sid`` if it exists, without creating or touching it."""
+        if sid is None:
+            return None
+        with self._lock:
+            return self._sessions.get(sid)
+
+    def cwd(self, sid: Optional[str]) -> str:
+        session = self.peek(sid)
+        return session.cwd if session is not None else "/"
+
+    def update(self, session: TerminalSession):
+        """Re-account ``session`` after its history, env or cwd changed."""
+        with self._lock:
+            if self._sessions.get(session.sid) is session:
+                self._resize(session)
+                self._shrink()
+
+    def _resize(self, session: TerminalSession):
+        nbytes = session.footprint()
+        self._bytes += nbytes - session.nbytes
+        session.nbytes = nbytes
+
+    def _drop(self, sid: str):
+        self._bytes -= self._sessions.pop(sid).nbytes
+
+    def _expire(self, now: float):
+        # LRU order is also last_seen order, so idle sessions sit at the front
+        cutoff = now - self.idle_seconds
+        while self._sessions:
+            sid, oldest = next(iter(self._sessions.items()))
+            if oldest.last_seen >= cutoff:
+                break
+            self._drop(sid)
+            self.expired += 1
+        self._shrink()
+
+    def _shrink(self):
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            self._drop(next(iter(self._sessions)))
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "idle_seconds": self.idle_seconds,
+                "history_size": HISTORY_SIZE,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules are imported flat, the way main.py imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import seed  # noqa: E402
+
+
+@pytest.fixture
+def seeded(tmp_path):
+    """A files directory unpacked from a seed snapshot built under tmp_path."""
+    files_dir = str(tmp_path / "files")
+    seed.materialize(files_dir, snapshot_dir=str(tmp_path / ".seed"))
+    return files_dir
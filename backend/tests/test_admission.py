@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+import admission
+from admission import AdmissionControl, AdmissionMiddleware, Rate, parse_rates
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+def test_parse_rates():
+    rates = parse_rates("/api/terminal=10:30, api/files/=50")
+    assert {p: r.to_dict() for p, r in rates.items()} == {
+        "/api/terminal": {"per_second": 10.0, "burst": 30.0},
+        "/api/files": {"per_second": 50.0, "burst": 50.0},
+    }
+    assert parse_rates("off") == {}
+    assert parse_rates("") == {}
+    assert Rate.parse("0.5").burst == 1.0
+
+
+def test_bucket_allows_the_burst_then_the_rate(clock):
+    control = AdmissionControl({"/api": Rate(2, 3)})
+    assert [control.take("/api/x", "ip") for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = control.take("/api/x", "ip")
+    assert wait == pytest.approx(0.5)
+    clock.now += 0.5
+    assert control.take("/api/x", "ip") == 0.0
+    assert control.take("/api/x", "ip") > 0
+    assert control.stats()["rate_limited"] == {"/api": 2}
+
+
+def test_clients_and_rules_have_their_own_buckets(clock):
+    control = AdmissionControl({"/api/terminal": Rate(1, 1), "/api": Rate(1, 1)})
+    assert control.take("/api/terminal/command", "a") == 0.0
+    assert control.take("/api/terminal/command", "b") == 0.0
+    # The longest prefix wins, so /api/files draws from the /api bucket
+    assert control.take("/api/files/read", "a") == 0.0
+    assert control.take("/api/terminal/command", "a") > 0
+    # Prefixes match whole path segments only
+    assert control.take("/apiary", "a") == 0.0
+    assert control.take("/other", "a") == 0.0
+
+
+def test_unlimited_prefixes_skip_the_buckets(clock):
+    control = AdmissionControl({"/api/terminal": Rate(1, 1)}, unlimited=("/api/terminal/complete",))
+    assert all(control.take("/api/terminal/complete", "a") == 0.0 for _ in range(20))
+    assert control.take("/api/terminal/command", "a") == 0.0
+    assert control.take("/api/terminal/command", "a") > 0
+
+
+def test_buckets_are_evicted_least_recently_used(clock, monkeypatch):
+    monkeypatch.setattr(admission, "MAX_BUCKETS", 2)
+    control = AdmissionControl({"/api": Rate(1, 1)})
+    for ip in ("a", "b", "c"):
+        control.take("/api", ip)
+    assert control.stats()["buckets"] == 2
+    assert control.stats()["bucket_evictions"] == 1
+    # "a" was evicted and starts over with a full bucket
+    assert control.take("/api", "a") == 0.0
+
+
+def test_client_address_behind_a_proxy():
+    scope = {"client": ("10.0.0.1", 1234), "headers": [(b"x-forwarded-for", b"6.6.6.6, 1.2.3.4")]}
+    assert AdmissionControl({}).client(scope) == "10.0.0.1"
+    assert AdmissionControl({}, trust_proxy=True).client(scope) == "1.2.3.4"
+
+
+def call(app, path="/api/x", client=("1.1.1.1", 1)):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        await app({"type": "http", "path": path, "client": client, "headers": []}, receive, send)
+    return run, messages
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_middleware_answers_429_with_retry_after(clock):
+    app = AdmissionMiddleware(ok_app, AdmissionControl({"/api": Rate(1, 1)}))
+    statuses = []
+    for _ in range(2):
+        run, messages = call(app)
+        asyncio.run(run())
+        statuses.append(messages[0]["status"])
+    assert statuses == [200, 429]
+    assert (b"retry-after", b"1") in messages[0]["headers"]
+
+
+def test_middleware_sheds_past_the_queue():
+    control = AdmissionControl({}, max_inflight=1, max_queue=1, queue_timeout=0.05)
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await ok_app(scope, receive, send)
+
+    app = AdmissionMiddleware(slow_app, control)
+
+    async def scenario():
+        runs = [call(app) for _ in range(3)]
+        tasks = [asyncio.create_task(run()) for run, _ in runs]
+        await asyncio.sleep(0.2)
+        release.set()
+        await asyncio.gather(*tasks)
+        return [messages[0]["status"] for _, messages in runs]
+
+    statuses = asyncio.run(scenario())
+    # One is served; the second waits past the timeout, the third finds the queue full
+    assert sorted(statuses) == [200, 503, 503]
+    stats = control.stats()
+    assert stats["shed"] == 2 and stats["in_flight"] == 0 and stats["waiting"] == 0
+
+
+def test_exempt_paths_bypass_admission(clock):
+    control = AdmissionControl({"/api": Rate(1, 1)}, max_inflight=1, exempt=("/api/files/events",))
+    app = AdmissionMiddleware(ok_app, control)
+    for _ in range(3):
+        run, messages = call(app, "/api/files/events")
+        asyncio.run(run())
+        assert messages[0]["status"] == 200
+    assert control.stats()["admitted"] == 0
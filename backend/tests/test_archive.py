@@ -0,0 +1,111 @@
+import gzip
+import io
+import os
+import tarfile
+import time
+import zipfile
+
+import pytest
+
+import seed
+from archive import ArchiveReader, export_stream, gzip_stream, iter_tar, member_path
+
+
+def entries(root, arcroot="files"):
+    """(arcname, real path, is_dir) for ``root`` and everything below it, parents first."""
+    yield arcroot, root, True
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        rel = os.path.relpath(dirpath, root)
+        prefix = arcroot if rel == "." else f"{arcroot}/{rel}"
+        for name in dirnames:
+            yield f"{prefix}/{name}", os.path.join(dirpath, name), True
+        for name in sorted(filenames):
+            yield f"{prefix}/{name}", os.path.join(dirpath, name), False
+
+
+def round_trip(root, fmt, **kwargs):
+    data = b"".join(export_stream(entries(root), fmt, **kwargs))
+    reader = ArchiveReader(io.BytesIO(data), fmt)
+    files = {}
+    for member in reader:
+        if not member.is_dir:
+            files[member.name] = member.stream.read()
+    return data, files, reader
+
+
+def expected(prefix="files/"):
+    return {prefix + path: text.encode("utf-8")
+            for path, text in seed.SEED_TREE.items() if not path.endswith("/")}
+
+
+def test_seeded_files_have_current_mtimes(seeded):
+    now = time.time()
+    for dirpath, _, filenames in os.walk(seeded):
+        for name in filenames:
+            assert now - os.stat(os.path.join(dirpath, name)).st_mtime < 3600
+
+
+@pytest.mark.parametrize("fmt,kwargs", [("tar", {}), ("tgz", {}), ("tgz", {"workers": 4}), ("zip", {})])
+def test_round_trip_of_the_seed_tree(seeded, fmt, kwargs):
+    _, files, reader = round_trip(seeded, fmt, **kwargs)
+    assert files == expected()
+    assert reader.skipped == []
+
+
+def test_zip_clamps_dates_before_1980(seeded):
+    # Anything that still carries the archive's epoch mtime must not cut the stream short
+    for dirpath, _, filenames in os.walk(seeded):
+        for name in filenames:
+            os.utime(os.path.join(dirpath, name), (0, 0))
+    data, files, _ = round_trip(seeded, "zip")
+    assert files == expected()
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert all(info.date_time[0] == 1980 for info in zf.infolist() if not info.is_dir())
+
+
+def test_entries_that_vanish_are_skipped(seeded):
+    listed = list(entries(seeded))
+    os.remove(os.path.join(seeded, "welcome.txt"))
+    for fmt in ("tar", "zip"):
+        data = b"".join(export_stream(iter(listed), fmt))
+        names = [m.name for m in ArchiveReader(io.BytesIO(data), fmt)]
+        assert "files/welcome.txt" not in names
+        assert "files/projects.txt" in names
+
+
+def test_tar_is_readable_by_tarfile(seeded):
+    data = b"".join(iter_tar(entries(seeded)))
+    assert len(data) % tarfile.RECORDSIZE == 0
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        assert tar.extractfile("files/logs/system_boot.log").read() == \
+            seed.SEED_TREE["logs/system_boot.log"].encode()
+
+
+def test_parallel_gzip_matches_serial_content():
+    chunks = [os.urandom(50_000) + b"a" * 200_000 for _ in range(6)]
+    serial = b"".join(gzip_stream(iter(chunks), workers=1))
+    parallel = b"".join(gzip_stream(iter(chunks), workers=4))
+    assert gzip.decompress(serial) == gzip.decompress(parallel) == b"".join(chunks)
+
+
+def test_reader_skips_unsafe_members():
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for name in ("ok.txt", "../escape.txt", "/abs/../../x"):
+            info = tarfile.TarInfo(name)
+            info.size = 2
+            tar.addfile(info, io.BytesIO(b"hi"))
+        link = tarfile.TarInfo("link")
+        link.type, link.linkname = tarfile.SYMTYPE, "/etc/passwd"
+        tar.addfile(link)
+    buf.seek(0)
+    reader = ArchiveReader(buf, "tar")
+    assert [m.name for m in reader] == ["ok.txt"]
+    assert reader.skipped == ["../escape.txt", "/abs/../../x", "link"]
+
+
+def test_member_path():
+    assert member_path("a/./b//c") == "a/b/c"
+    assert member_path("..\\x") is None
+    assert member_path("/") is None
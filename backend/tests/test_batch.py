@@ -0,0 +1,134 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batch import Step, paths_overlap, run_batch
+from storage import BlobStorage, PlainStorage
+
+
+@pytest.fixture
+def pool():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+@pytest.fixture(params=["plain", "blob"])
+def storage(request, tmp_path):
+    if request.param == "blob":
+        return BlobStorage(str(tmp_path / ".blobs"), sync=False)
+    return PlainStorage(sync=False)
+
+
+@pytest.fixture
+def tree(tmp_path, storage):
+    root = tmp_path / "files"
+    (root / "docs").mkdir(parents=True)
+    storage.write(str(root / "a.txt"), b"original")
+    storage.write(str(root / "docs" / "one.txt"), b"one")
+    storage.write(str(root / "docs" / "two.txt"), b"two")
+    return str(root)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def snapshot(root):
+    found = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            found[os.path.relpath(path, root)] = read(path)
+        for name in dirnames:
+            found[os.path.relpath(os.path.join(dirpath, name), root) + "/"] = None
+    return found
+
+
+def write_step(storage, path, data):
+    def fn():
+        storage.write(path, data)
+        return {}
+    return Step(fn, writes=[path])
+
+
+def delete_step(storage, path):
+    def fn():
+        storage.delete(path)
+        return {}
+    return Step(fn, writes=[path])
+
+
+def failing_step(path):
+    return Step(lambda: {"error": "boom"}, writes=[path])
+
+
+def test_paths_overlap():
+    assert paths_overlap("/a/b", "/a")
+    assert paths_overlap("/a", "/a/b")
+    assert not paths_overlap("/a", "/ab")
+
+
+def test_atomic_failure_rolls_everything_back(tmp_path, pool, storage, tree):
+    before = snapshot(tree)
+    blobs_before = storage.stats().get("blobs")
+    steps = [
+        write_step(storage, os.path.join(tree, "a.txt"), b"changed"),
+        delete_step(storage, os.path.join(tree, "docs")),
+        write_step(storage, os.path.join(tree, "new.txt"), b"new"),
+        failing_step(os.path.join(tree, "other.txt")),
+    ]
+    restored = []
+    status = run_batch(steps, pool, storage, atomic=True, backup_root=str(tmp_path / ".batch"),
+                       on_restore=restored.append)
+    assert status == "rolled_back"
+    assert [s.result["status"] for s in steps] == ["rolled_back"] * 3 + ["error"]
+    assert snapshot(tree) == before
+    assert set(restored) >= {os.path.join(tree, "a.txt"), os.path.join(tree, "docs"),
+                             os.path.join(tree, "new.txt")}
+    # Snapshots are cleaned up
+    assert os.listdir(tmp_path / ".batch") == []
+    if storage.mode == "blob":
+        # The blobs written by the failed batch were released again
+        assert storage.stats()["blobs"] == blobs_before
+
+
+def test_rollback_keeps_blob_refcounts_right(tmp_path, pool):
+    storage = BlobStorage(str(tmp_path / ".blobs"), sync=False)
+    root = tmp_path / "files"
+    root.mkdir()
+    a = str(root / "a.txt")
+    storage.write(a, b"shared")
+    storage.copy(a, str(root / "b.txt"))
+    steps = [write_step(storage, a, b"changed"), failing_step(str(root / "c.txt"))]
+    assert run_batch(steps, pool, storage, atomic=True, backup_root=str(tmp_path / ".batch")) == "rolled_back"
+    assert read(a) == b"shared"
+    # Deleting both copies frees the blob: no reference was leaked
+    storage.delete(a)
+    storage.delete(str(root / "b.txt"))
+    assert storage.stats()["blobs"] == 0
+
+
+def test_non_atomic_failure_is_partial(pool, storage, tree):
+    a = os.path.join(tree, "a.txt")
+    steps = [write_step(storage, a, b"changed"), failing_step(os.path.join(tree, "x"))]
+    assert run_batch(steps, pool, storage) == "partial"
+    assert read(a) == b"changed"
+    assert steps[0].result["status"] == "success"
+
+
+def test_dependent_steps_run_in_order_and_skip_after_failure(pool, storage, tree):
+    a = os.path.join(tree, "a.txt")
+    steps = [write_step(storage, a, b"1"), write_step(storage, a, b"2"),
+             failing_step(a), write_step(storage, a, b"3")]
+    assert run_batch(steps, pool, storage) == "partial"
+    assert steps[1].deps == [0]
+    assert steps[3].result["status"] == "skipped"
+    assert read(a) == b"2"
+
+
+def test_success(pool, storage, tree):
+    steps = [write_step(storage, os.path.join(tree, f"f{i}"), b"x") for i in range(8)]
+    assert run_batch(steps, pool, storage, atomic=True) == "success"
+    assert all(s.result["status"] == "success" for s in steps)
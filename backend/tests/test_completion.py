@@ -0,0 +1,146 @@
+import os
+import random
+
+import pytest
+
+from completion import BKTree, CommandIndex, PathIndex, PrefixTrie, edit_distance, max_distance
+
+
+def levenshtein(a, b):
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        prev, row[0] = row[0], i
+        for j, cb in enumerate(b, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (ca != cb))
+    return row[-1]
+
+
+def random_words(rng, count, alphabet="abcd", max_len=8):
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_len))) for _ in range(count)]
+
+
+def test_edit_distance_matches_the_textbook_recurrence():
+    rng = random.Random(7)
+    words = random_words(rng, 200) + ["", "a" * 70, "ab" * 40]
+    for a, b in zip(words, reversed(words)):
+        assert edit_distance(a, b) == levenshtein(a, b), (a, b)
+    assert edit_distance("ls", "sl") == 2
+
+
+def test_bktree_search_finds_everything_within_the_limit():
+    rng = random.Random(11)
+    words = sorted(set(random_words(rng, 300)))
+    tree = BKTree(words)
+    assert tree.size == len(words)
+    for query in random_words(rng, 50):
+        for limit in (0, 1, 2):
+            expected = sorted((levenshtein(query, w), w) for w in words if levenshtein(query, w) <= limit)
+            assert tree.search(query, limit, max_visits=10 ** 6) == expected
+
+
+def test_bktree_search_is_bounded():
+    tree = BKTree(f"word{i}" for i in range(500))
+    assert len(tree.search("wordx", 2, max_visits=5)) <= 5
+    assert BKTree().search("x", 2) == []
+
+
+def test_prefix_trie_completes_in_sorted_order():
+    trie = PrefixTrie(["cat", "cd", "cal", "c", "cat", "ls"])
+    assert trie.size == 5
+    assert trie.complete("c") == ["c", "cal", "cat", "cd"]
+    assert trie.complete("ca", limit=1) == ["cal"]
+    assert trie.complete("x") == []
+    assert trie.complete("") == ["c", "cal", "cat", "cd", "ls"]
+
+
+def test_max_distance():
+    assert max_distance("ls") == 1
+    assert max_distance("cat") == 1
+    assert max_distance("grep") == 2
+
+
+def test_command_index_suggests_near_names_but_not_the_word_typed():
+    index = CommandIndex(["cat", "cd", "clear", "ls", "help"], ["cat", "cd", "clear", "ls", "help", "rm"])
+    assert index.complete("C") == ["cat", "cd", "clear"]
+    assert index.suggest("cta") == []
+    assert index.suggest("clera") == ["clear"]
+    assert index.suggest("LS") == []
+    assert "cd" in index.suggest("ca")
+    # Suggestions can come from names that are not offered as completions
+    assert index.suggest("rn") == ["rm"]
+    assert index.complete("r") == []
+
+
+def test_command_index_does_not_suggest_hidden_names():
+    index = CommandIndex(["cat", "ls", "rm"], ["cat", "ls"])
+    assert index.complete("r") == ["rm"]
+    assert index.suggest("rn") == []
+
+
+def list_dir(path):
+    return [{"name": name, "type": "folder" if os.path.isdir(os.path.join(path, name)) else "file"}
+            for name in os.listdir(path)]
+
+
+@pytest.fixture
+def directory(tmp_path):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / ".hidden").write_text("x")
+    for name in ("draft.txt", "drafts.md", "notes.txt"):
+        (tmp_path / name).write_text("x")
+    return str(tmp_path)
+
+
+def test_path_index_complete(directory):
+    entry = PathIndex(list_dir).get(directory)
+    assert PathIndex.complete(entry, "d") == ["docs/", "draft.txt", "drafts.md"]
+    assert PathIndex.complete(entry, "dra", limit=1) == ["draft.txt"]
+    assert PathIndex.complete(entry, "") == ["docs/", "draft.txt", "drafts.md", "notes.txt"]
+    assert PathIndex.complete(entry, ".") == [".hidden"]
+
+
+def test_path_index_suggest(directory):
+    entry = PathIndex(list_dir).get(directory)
+    assert PathIndex.suggest(entry, "notse.txt") == ["notes.txt"]
+    assert PathIndex.suggest(entry, "doc") == ["docs/"]
+    assert PathIndex.suggest(entry, "zzzzzz") == []
+
+
+def test_path_index_cache_follows_the_directory_mtime(directory):
+    calls = []
+
+    def counting(path):
+        calls.append(path)
+        return list_dir(path)
+
+    index = PathIndex(counting)
+    assert index.cached(directory) is None
+    entry = index.get(directory)
+    assert index.cached(directory) is entry
+    assert index.get(directory) is entry
+    assert calls == [directory]
+
+    with open(os.path.join(directory, "new.txt"), "w"):
+        pass
+    st = os.stat(directory)
+    os.utime(directory, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert index.cached(directory) is None
+    assert "new.txt" in PathIndex.complete(index.get(directory), "n")
+    assert len(calls) == 2
+
+    index.invalidate(directory)
+    assert index.cached(directory) is None
+    assert index.stats() == {"dirs": 0, "hits": 2, "misses": 2}
+
+
+def test_path_index_evicts_the_least_recently_used(tmp_path):
+    dirs = []
+    for name in ("a", "b", "c"):
+        (tmp_path / name).mkdir()
+        dirs.append(str(tmp_path / name))
+    index = PathIndex(list_dir, max_dirs=2)
+    for path in dirs:
+        index.get(path)
+    assert index.stats()["dirs"] == 2
+    assert index.cached(dirs[0]) is None
+    assert index.cached(dirs[2]) is not None
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from journal import Journal, JournalError
+from storage import PlainStorage
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "files"
+    (root / "docs").mkdir(parents=True)
+    return str(root)
+
+
+def journal_for(tmp_path, root, **kwargs):
+    return Journal(str(tmp_path / ".journal"), root, PlainStorage(sync=False).write, **kwargs)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_write_is_journaled_then_applied(tmp_path, tree):
+    journal = journal_for(tmp_path, tree)
+    target = os.path.join(tree, "docs", "a.txt")
+    journal.write(target, b"one")
+    assert read(target) == b"one"
+    assert journal.stats()["records"] == 1
+    assert os.path.getsize(journal.path) > 0
+    journal.close()
+
+
+def test_recover_replays_writes_lost_in_a_crash(tmp_path, tree):
+    journal = journal_for(tmp_path, tree)
+    a = os.path.join(tree, "docs", "a.txt")
+    b = os.path.join(tree, "b.txt")
+    journal.write(a, b"first")
+    journal.write(a, b"second")
+    journal.write(b, b"other")
+    # Crash before any checkpoint: the applied files never reached the disk
+    journal.close()
+    os.remove(a)
+    with open(b, "wb") as f:
+        f.write(b"stale")
+
+    journal = journal_for(tmp_path, tree)
+    assert journal.recover() == 3
+    assert read(a) == b"second"
+    assert read(b) == b"other"
+    # Recovery checkpoints, so a second start has nothing left to replay
+    assert os.path.getsize(journal.path) == 0
+    journal.close()
+    journal = journal_for(tmp_path, tree)
+    assert journal.recover() == 0
+    journal.close()
+
+
+def test_recover_stops_at_a_torn_record(tmp_path, tree):
+    journal = journal_for(tmp_path, tree)
+    a = os.path.join(tree, "a.txt")
+    journal.write(a, b"kept")
+    journal.close()
+    with open(tmp_path / ".journal", "ab") as f:
+        f.write(b'{"op": "write", "path": "a.txt", "da')
+    os.remove(a)
+
+    journal = journal_for(tmp_path, tree)
+    assert journal.recover() == 1
+    assert read(a) == b"kept"
+    journal.close()
+
+
+def test_checkpoint_truncates_the_journal(tmp_path, tree):
+    journal = journal_for(tmp_path, tree, checkpoint_bytes=1 << 30)
+    for i in range(5):
+        journal.write(os.path.join(tree, f"f{i}"), b"x" * 100)
+    assert journal.stats()["journal_bytes"] > 0
+    journal.checkpoint()
+    assert journal.stats()["journal_bytes"] == 0
+    assert os.path.getsize(journal.path) == 0
+    journal.close()
+
+
+def test_failed_write_leaves_no_record(tmp_path, tree):
+    journal = journal_for(tmp_path, tree)
+    with pytest.raises(FileNotFoundError):
+        journal.write(os.path.join(tree, "missing", "a.txt"), b"x")
+    with pytest.raises(IsADirectoryError):
+        journal.write(os.path.join(tree, "docs"), b"x")
+    assert journal.stats()["records"] == 0
+    assert os.path.getsize(journal.path) == 0
+    journal.close()
+
+
+def test_serial_appends_match_group_commit(tmp_path, tree):
+    journal = journal_for(tmp_path, tree, group_commit=False)
+    journal.write(os.path.join(tree, "a.txt"), b"serial")
+    assert journal.stats()["flushes"] == 1
+    journal.close()
+    os.remove(os.path.join(tree, "a.txt"))
+    journal = journal_for(tmp_path, tree)
+    assert journal.recover() == 1
+    assert read(os.path.join(tree, "a.txt")) == b"serial"
+    journal.close()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="needs fcntl")
+def test_second_journal_on_the_same_file_is_refused(tmp_path, tree):
+    journal = journal_for(tmp_path, tree)
+    with pytest.raises(JournalError, match="single worker"):
+        journal_for(tmp_path, tree)
+    journal.close()
+    journal_for(tmp_path, tree).close()
@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from pathlock import PathLocks
+
+
+@pytest.fixture
+def locks(tmp_path):
+    return PathLocks(str(tmp_path / "files"), str(tmp_path / ".locks"))
+
+
+def path(locks, rel):
+    return os.path.join(locks.root, rel)
+
+
+def blocks(hold_first, hold_second, timeout=0.3):
+    """Whether ``hold_second`` has to wait while another thread holds ``hold_first``."""
+    held, release, got = threading.Event(), threading.Event(), threading.Event()
+
+    def first():
+        with hold_first():
+            held.set()
+            release.wait(5)
+
+    def second():
+        with hold_second():
+            got.set()
+
+    threads = [threading.Thread(target=first)]
+    threads[0].start()
+    assert held.wait(5)
+    threads.append(threading.Thread(target=second))
+    threads[1].start()
+    waited = not got.wait(timeout)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert got.is_set()
+    return waited
+
+
+def test_plan_shares_ancestors_and_takes_the_target_in_its_own_mode(locks):
+    stripe = locks._stripe
+    plan = dict(locks._plan([], [path(locks, "a/b/c")]))
+    assert plan == {stripe(""): False, stripe("a"): False, stripe("a/b"): False, stripe("a/b/c"): True}
+    # A path taken both ways is taken exclusively, and stripes come in order
+    plan = locks._plan([path(locks, "a")], [path(locks, "a")])
+    assert dict(plan)[stripe("a")] is True
+    assert plan == sorted(plan)
+
+
+def test_writers_to_one_file_exclude_each_other(locks):
+    a = path(locks, "docs/a.txt")
+    assert blocks(lambda: locks.write(a), lambda: locks.write(a))
+    assert blocks(lambda: locks.write(a), lambda: locks.read(a))
+    assert not blocks(lambda: locks.read(a), lambda: locks.read(a))
+
+
+def test_folder_writers_wait_out_everything_below(locks):
+    docs, a = path(locks, "docs"), path(locks, "docs/a.txt")
+    assert blocks(lambda: locks.write(a), lambda: locks.write(docs))
+    assert blocks(lambda: locks.write(docs), lambda: locks.read(a))
+
+
+def test_unrelated_files_below_one_folder_do_not_contend(locks):
+    a, b = path(locks, "docs/a.txt"), path(locks, "docs/b.txt")
+    assert locks._stripe("docs/a.txt") != locks._stripe("docs/b.txt")
+    assert not blocks(lambda: locks.write(a), lambda: locks.write(b))
+
+
+def test_contention_is_counted(locks):
+    a = path(locks, "a.txt")
+    blocks(lambda: locks.write(a), lambda: locks.write(a))
+    stats = locks.stats()
+    assert stats["acquired"] == 2
+    assert stats["contended"] >= 1 and stats["wait_ms"] > 0
+
+
+def hold_in_child(root, lock_dir, target, held, release):
+    with PathLocks(root, lock_dir).write(target):
+        held.set()
+        release.wait(5)
+
+
+@pytest.mark.skipif(os.name == "nt", reason="needs fork and flock")
+def test_locks_hold_across_processes(locks):
+    ctx = multiprocessing.get_context("fork")
+    held, release = ctx.Event(), ctx.Event()
+    target = path(locks, "docs/a.txt")
+    child = ctx.Process(target=hold_in_child, args=(locks.root, locks.lock_dir, target, held, release))
+    child.start()
+    try:
+        assert held.wait(5)
+        timer = threading.Timer(0.3, release.set)
+        timer.start()
+        start = time.perf_counter()
+        with locks.write(target):
+            waited = time.perf_counter() - start
+        timer.join()
+        assert waited >= 0.2
+    finally:
+        release.set()
+        child.join(5)
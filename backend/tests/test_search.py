@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from search import SearchIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    root = tmp_path / "files"
+    (root / "logs").mkdir(parents=True)
+    (root / "logs" / "boot.log").write_text("kernel loaded\nmounting drives\n")
+    (root / "logs" / "net.log").write_text("interface up\nkernel module net\n")
+    (root / "notes.txt").write_text("remember the bootstrap kernel\n")
+    index = SearchIndex(str(root))
+    index.build()
+    return index
+
+
+def test_grep_matches_substrings_and_scopes(index):
+    assert index.grep("kern") == [("logs/boot.log", 1, "kernel loaded"),
+                                  ("logs/net.log", 2, "kernel module net"),
+                                  ("notes.txt", 1, "remember the bootstrap kernel")]
+    assert index.grep("strap ker") == [("notes.txt", 1, "remember the bootstrap kernel")]
+    assert index.grep("KERNEL", scope="/logs", ignore_case=True) == [("logs/boot.log", 1, "kernel loaded"),
+                                                                     ("logs/net.log", 2, "kernel module net")]
+
+
+def test_update_follows_the_disk(index):
+    os.remove(os.path.join(index.root, "logs", "boot.log"))
+    index.update(os.path.join(index.root, "logs", "boot.log"))
+    with open(os.path.join(index.root, "new.txt"), "w") as f:
+        f.write("a fresh kernel\n")
+    index.update(os.path.join(index.root, "new.txt"))
+    assert [doc for doc, _, _ in index.grep("kernel")] == ["logs/net.log", "new.txt", "notes.txt"]
+    assert "logs/boot.log" not in index.find()
+
+
+def test_queries_skip_paths_that_are_not_visible(index):
+    hidden = {"logs/boot.log", "notes.txt"}
+
+    def visible(rel):
+        return rel not in hidden
+
+    assert [doc for doc, _, _ in index.grep("kernel", visible=visible)] == ["logs/net.log"]
+    assert [r["path"] for r in index.search("kernel", visible=visible)] == ["logs/net.log"]
+    assert index.find("*.log", visible=visible) == ["logs/net.log"]
+    assert sorted(r["path"] for r in index.search("kernel")) == ["logs/boot.log", "logs/net.log", "notes.txt"]
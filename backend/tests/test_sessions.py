@@ -0,0 +1,138 @@
+import os
+
+import pytest
+
+from dircache import scan_directory
+from sessions import SESSION_ID_RE, SessionManager, new_id
+from storage import PlainStorage
+
+
+@pytest.fixture
+def base(tmp_path):
+    root = tmp_path / "base"
+    (root / "diary").mkdir(parents=True)
+    (root / "diary" / "day1.txt").write_text("first day")
+    (root / "welcome.txt").write_text("welcome")
+    return str(root)
+
+
+@pytest.fixture
+def manager(tmp_path, base):
+    storage = PlainStorage(sync=False)
+    return SessionManager(base, str(tmp_path / ".sessions"), storage, save=storage.write,
+                          list_dir=scan_directory, on_change=lambda path: None, max_resident=2)
+
+
+def names(overlay, rel=""):
+    return sorted(entry["name"] for entry in overlay.listdir(rel))
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def snapshot(root):
+    return sorted(os.path.relpath(os.path.join(d, n), root) for d, dirs, files in os.walk(root) for n in dirs + files)
+
+
+def test_new_ids_are_valid_and_distinct():
+    ids = {new_id() for _ in range(100)}
+    assert len(ids) == 100
+    assert all(SESSION_ID_RE.match(sid) for sid in ids)
+
+
+def test_reading_session_costs_nothing_on_disk(manager, base):
+    overlay = manager.get(new_id())
+    assert overlay.lookup("welcome.txt") == os.path.join(base, "welcome.txt")
+    assert names(overlay) == ["diary", "welcome.txt"]
+    assert not os.path.exists(overlay.root)
+
+
+def test_writes_land_in_the_upper_directory(manager, base):
+    before = snapshot(base)
+    overlay = manager.get(new_id())
+    overlay.write("welcome.txt", b"changed")
+    overlay.write("diary/day2.txt", b"second day")
+    assert read(overlay.lookup("welcome.txt")) == b"changed"
+    assert names(overlay, "diary") == ["day1.txt", "day2.txt"]
+    # The base is read-only, and another session still sees it as it was
+    assert snapshot(base) == before
+    assert read(os.path.join(base, "welcome.txt")) == b"welcome"
+    other = manager.get(new_id())
+    assert read(other.lookup("welcome.txt")) == b"welcome"
+    assert other.lookup("diary/day2.txt") is None
+
+
+def test_deleting_base_entries_leaves_whiteouts(manager, base):
+    overlay = manager.get(new_id())
+    overlay.delete("diary/day1.txt")
+    assert overlay.lookup("diary/day1.txt") is None
+    assert names(overlay, "diary") == []
+    overlay.delete("diary")
+    assert overlay.lookup("diary") is None
+    assert overlay.whiteouts == {"diary"}
+    # A folder made again where one was deleted starts out empty
+    overlay.mkdir("diary")
+    assert names(overlay, "diary") == []
+    assert os.path.exists(os.path.join(base, "diary", "day1.txt"))
+    with pytest.raises(FileNotFoundError):
+        overlay.delete("diary/day1.txt")
+
+
+def test_copy_and_move_inside_the_view(manager):
+    overlay = manager.get(new_id())
+    overlay.copy("diary", "archive")
+    assert names(overlay, "archive") == ["day1.txt"]
+    overlay.move("welcome.txt", "archive")
+    assert overlay.lookup("welcome.txt") is None
+    assert read(overlay.lookup("archive/welcome.txt")) == b"welcome"
+    overlay.write("mine.txt", b"x")
+    overlay.move("mine.txt", "ours.txt")
+    assert overlay.lookup("mine.txt") is None and read(overlay.lookup("ours.txt")) == b"x"
+    with pytest.raises(FileExistsError):
+        overlay.copy("diary", "archive")
+    with pytest.raises(PermissionError):
+        overlay.delete("")
+
+
+def test_writes_need_an_existing_parent(manager):
+    overlay = manager.get(new_id())
+    with pytest.raises(FileNotFoundError):
+        overlay.write("nowhere/a.txt", b"x")
+    with pytest.raises(NotADirectoryError):
+        overlay.write("welcome.txt/a.txt", b"x")
+
+
+def test_evicted_overlays_reload_their_whiteouts(manager):
+    sid = new_id()
+    overlay = manager.get(sid)
+    overlay.delete("welcome.txt")
+    overlay.write("kept.txt", b"kept")
+    manager.get(new_id())
+    manager.get(new_id())
+    assert manager.stats()["evicted"] == 1
+    reloaded = manager.get(sid)
+    assert reloaded is not overlay
+    assert reloaded.lookup("welcome.txt") is None
+    assert read(reloaded.lookup("kept.txt")) == b"kept"
+    assert manager.stats()["loaded"] == 1
+
+
+def test_idle_sessions_on_disk_are_reaped(manager):
+    sid = new_id()
+    overlay = manager.get(sid)
+    overlay.write("a.txt", b"x")
+    for _ in range(2):
+        manager.get(new_id())
+    manager.ttl_seconds = 0
+    os.utime(overlay.root, (0, 0))
+    manager.reap()
+    assert not os.path.exists(overlay.root)
+    assert manager.stats()["reaped"] == 1
+    assert manager.get(sid).lookup("a.txt") is None
+
+
+def test_invalid_ids_are_refused(manager):
+    with pytest.raises(ValueError):
+        manager.get("../../etc")
@@ -0,0 +1,117 @@
+import hashlib
+import os
+
+import pytest
+
+from uploads import CHUNKS_DIR, UploadError, UploadManager
+
+
+def sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return UploadManager(str(tmp_path / ".uploads"))
+
+
+def send(manager, upload_id, offset, data, digest=None, session=None, piece=3):
+    writer = manager.chunk(upload_id, session, offset, digest or sha(data))
+    for i in range(0, len(data), piece):
+        writer.write(data[i:i + piece])
+    return writer.finish()
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_chunks_in_any_order_then_commit(manager):
+    data = b"0123456789abcdefghij"
+    upload_id = manager.start("/docs/a.txt", len(data), sha256=sha(data))["upload_id"]
+    status = send(manager, upload_id, 10, data[10:])
+    assert status["ranges"] == [(10, 20)]
+    assert status["missing"] == [(0, 10)]
+    status = send(manager, upload_id, 0, data[:10])
+    assert status["received"] == 20 and status["missing"] == []
+    meta, path = manager.finish(upload_id, None)
+    assert read(path) == data
+    assert meta["digest"] == sha(data)
+
+
+def test_resume_sends_only_the_missing_ranges(manager):
+    data = bytes(range(256)) * 4
+    upload_id = manager.start("/big.bin", len(data))["upload_id"]
+    send(manager, upload_id, 0, data[:300])
+    send(manager, upload_id, 600, data[600:])
+    # A new connection asks what is left and fills just that
+    for start, end in manager.status(upload_id, None)["missing"]:
+        send(manager, upload_id, start, data[start:end])
+    _, path = manager.finish(upload_id, None)
+    assert read(path) == data
+
+
+def test_bad_chunk_is_rejected_and_leaves_no_trace(manager):
+    upload_id = manager.start("/a.txt", 8)["upload_id"]
+    with pytest.raises(UploadError) as e:
+        send(manager, upload_id, 0, b"abcdefgh", digest=sha(b"something else"))
+    assert e.value.status == 400
+    assert manager.status(upload_id, None)["ranges"] == []
+    with pytest.raises(UploadError) as e:
+        manager.finish(upload_id, None)
+    assert e.value.status == 409
+    assert manager.stats()["chunks_rejected"] == 1
+
+
+def test_corrupt_resend_cannot_overwrite_verified_bytes(manager):
+    data = b"good data, verified"
+    upload_id = manager.start("/a.txt", len(data))["upload_id"]
+    send(manager, upload_id, 0, data)
+    with pytest.raises(UploadError):
+        send(manager, upload_id, 5, b"XXXXXXXX", digest=sha(b"data, ve"))
+    # No whole-file digest was given, so nothing but the chunk check stands between this and the tree
+    _, path = manager.finish(upload_id, None)
+    assert read(path) == data
+
+
+def test_oversized_chunk_is_refused(manager):
+    upload_id = manager.start("/a.txt", 4)["upload_id"]
+    with pytest.raises(UploadError) as e:
+        send(manager, upload_id, 2, b"abcd")
+    assert e.value.status == 413
+    with pytest.raises(UploadError) as e:
+        manager.chunk(upload_id, None, 5, sha(b""))
+    assert e.value.status == 416
+    # Scratch files are gone either way
+    root = os.path.join(manager.root, upload_id)
+    assert sorted(os.listdir(root)) == [CHUNKS_DIR, "data", "meta.json"]
+
+
+def test_whole_file_digest_mismatch(manager):
+    upload_id = manager.start("/a.txt", 3, sha256=sha(b"abc"))["upload_id"]
+    send(manager, upload_id, 0, b"abd")
+    with pytest.raises(UploadError) as e:
+        manager.finish(upload_id, None)
+    assert e.value.status == 422
+
+
+def test_uploads_belong_to_their_session(manager):
+    upload_id = manager.start("/a.txt", 3, session="alice")["upload_id"]
+    for call in (lambda s: manager.status(upload_id, s),
+                 lambda s: manager.chunk(upload_id, s, 0, sha(b"abc")),
+                 lambda s: manager.finish(upload_id, s)):
+        for other in ("bob", None):
+            with pytest.raises(UploadError) as e:
+                call(other)
+            assert e.value.status == 404
+    assert send(manager, upload_id, 0, b"abc", session="alice")["missing"] == []
+
+
+def test_abandoned_uploads_are_reaped(manager):
+    upload_id = manager.start("/a.txt", 3)["upload_id"]
+    old = os.path.join(manager.root, upload_id)
+    os.utime(old, (0, 0))
+    manager.reap()
+    assert not os.path.exists(old)
+    assert manager.stats()["reaped"] == 1
@@ -0,0 +1,287 @@
+# uploads.py
+#
+# Chunked, resumable uploads. An upload is a directory under the uploads
+# root holding meta.json (target, size, optional whole-file sha256), a data
+# file preallocated to the final size, and one empty marker file per chunk
+# received and verified. Chunks are streamed into a scratch file beside the
+# data file, in any order and from any worker process, so memory stays at one
+# network read however large the file is. The markers are the only record
+# of progress, which makes resuming a matter of listing them: a client that
+# lost its connection asks for the missing ranges and sends just those.
+#
+# A chunk is only copied into the data file and marked once its sha256
+# matches what the client sent; a bad chunk is dropped with its scratch file,
+# so it can never overwrite bytes an earlier chunk verified, and is simply
+# sent again. Commit checks that
+# the ranges cover the whole file, verifies the whole-file digest when one
+# was given, and hands the data file to the caller to move into the tree.
+# Uploads untouched for ttl_seconds are deleted by a periodic reaper.
+#
+# An upload belongs to the session that started it (or to sessionless
+# callers, who share the tree anyway): every later call names the caller's
+# session, and a mismatch gets the same 404 as an id that doesn't exist.
+#
+# The same directory holds the scratch files (temp_file()) that imports and
+# the archive commands fill before moving them into the tree.
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from storage import atomic_write
+
+META_FILE = "meta.json"
+DATA_FILE = "data"
+CHUNKS_DIR = "chunks"
+TEMP_SUFFIX = ".part"
+
+UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Suggested chunk size handed to clients, and the most a single PUT may carry
+CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_BYTES = 16 * 1024 * 1024
+
+# Abandoned uploads are deleted after this long without a chunk
+UPLOAD_TTL_SECONDS = 3600
+REAP_INTERVAL = 300
+
+
+class UploadError(Exception):
+    """Carries the HTTP status the API should answer with."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def merge(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def gaps(ranges: List[Tuple[int, int]], size: int) -> List[Tuple[int, int]]:
+    missing, pos = [], 0
+    for start, end in ranges:
+        if start > pos:
+            missing.append((pos, start))
+        pos = max(pos, end)
+    if pos < size:
+        missing.append((pos, size))
+    return missing
+
+
+class ChunkWriter:
+    """Receives one chunk piece by piece; finish() verifies it and copies it into place."""
+
+    def __init__(self, manager: "UploadManager", upload_id: str, session: Optional[str], offset: int,
+                 limit: int, sha256: str):
+        self.manager = manager
+        self.upload_id = upload_id
+        self.session = session
+        self.offset = offset
+        self.limit = limit               # end of the file or MAX_CHUNK_BYTES past offset
+        self.sha256 = sha256
+        self.pos = offset
+        self._hash = hashlib.sha256()
+        self._fd, self._scratch = tempfile.mkstemp(dir=manager._dir(upload_id), prefix=".chunk-",
+                                                   suffix=TEMP_SUFFIX)
+
+    def write(self, piece: bytes):
+        if self.pos + len(piece) > self.limit:
+            self.discard()
+            raise UploadError(413, f"Chunk at {self.offset} runs past byte {self.limit}")
+        view = memoryview(piece)
+        while view:
+            written = os.write(self._fd, view)
+            self.pos += written
+            view = view[written:]
+        self._hash.update(piece)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self._scratch)
+        except FileNotFoundError:
+            pass
+
+    def _copy_in(self):
+        with open(self._scratch, "rb") as src:
+            fd = os.open(self.manager._data(self.upload_id), os.O_WRONLY)
+            try:
+                pos = self.offset
+                for block in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    view = memoryview(block)
+                    while view:
+                        written = os.pwrite(fd, view, pos)
+                        pos += written
+                        view = view[written:]
+            finally:
+                os.close(fd)
+
+    def finish(self) -> dict:
+        self.close()
+        try:
+            if self._hash.hexdigest() != self.sha256:
+                self.manager.rejected += 1
+                raise UploadError(400, f"Chunk at {self.offset} failed its sha256 check, send it again")
+            if self.pos > self.offset:
+                self._copy_in()
+                root = self.manager._dir(self.upload_id)
+                open(os.path.join(root, CHUNKS_DIR, f"{self.offset:016x}-{self.pos:016x}"), "wb").close()
+                os.utime(root)
+                self.manager.chunks += 1
+                self.manager.bytes_received += self.pos - self.offset
+        finally:
+            self.discard()
+        return self.manager.status(self.upload_id, self.session)
+
+
+class UploadManager:
+    def __init__(self, root: str, ttl_seconds: int = UPLOAD_TTL_SECONDS):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(root, exist_ok=True)
+        self.started = 0
+        self.committed = 0
+        self.aborted = 0
+        self.reaped = 0
+        self.chunks = 0
+        self.rejected = 0
+        self.bytes_received = 0
+
+    def _dir(self, upload_id: str) -> str:
+        if not UPLOAD_ID_RE.match(upload_id):
+            raise UploadError(404, "Unknown upload")
+        return os.path.join(self.root, upload_id)
+
+    def _data(self, upload_id: str) -> str:
+        return os.path.join(self._dir(upload_id), DATA_FILE)
+
+    def meta(self, upload_id: str, session: Optional[str]) -> dict:
+        """The upload's meta.json, if it was started by ``session``."""
+        try:
+            with open(os.path.join(self._dir(upload_id), META_FILE)) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise UploadError(404, "Unknown upload") from None
+        if meta["session"] != session:
+            raise UploadError(404, "Unknown upload")
+        return meta
+
+    def start(self, path: str, size: int, session: Optional[str] = None, sha256: Optional[str] = None) -> dict:
+        if sha256 is not None and not SHA256_RE.match(sha256):
+            raise UploadError(400, "sha256 must be 64 lowercase hex digits")
+        upload_id = uuid.uuid4().hex
+        root = os.path.join(self.root, upload_id)
+        os.makedirs(os.path.join(root, CHUNKS_DIR))
+        with open(os.path.join(root, DATA_FILE), "wb") as f:
+            f.truncate(size)        # sparse until the chunks arrive
+        meta = {"path": path, "session": session, "size": size, "sha256": sha256, "created": time.time()}
+        atomic_write(os.path.join(root, META_FILE), json.dumps(meta).encode())
+        self.started += 1
+        return {"upload_id": upload_id, "chunk_size": CHUNK_SIZE, "max_chunk_bytes": MAX_CHUNK_BYTES, **meta}
+
+    def ranges(self, upload_id: str) -> List[Tuple[int, int]]:
+        names = os.listdir(os.path.join(self._dir(upload_id), CHUNKS_DIR))
+        return merge([(int(a, 16), int(b, 16)) for a, _, b in (n.partition("-") for n in names)])
+
+    def status(self, upload_id: str, session: Optional[str]) -> dict:
+        meta = self.meta(upload_id, session)
+        ranges = self.ranges(upload_id)
+        return {
+            "upload_id": upload_id,
+            "path": meta["path"],
+            "size": meta["size"],
+            "received": sum(end - start for start, end in ranges),
+            "ranges": ranges,
+            "missing": gaps(ranges, meta["size"]),
+        }
+
+    def chunk(self, upload_id: str, session: Optional[str], offset: int, sha256: str) -> ChunkWriter:
+        size = self.meta(upload_id, session)["size"]
+        if not SHA256_RE.match(sha256 or ""):
+            raise UploadError(400, "X-Chunk-Sha256 must be the chunk's sha256 in lowercase hex")
+        if offset < 0 or offset > size:
+            raise UploadError(416, f"Offset {offset} is outside the {size}-byte upload")
+        return ChunkWriter(self, upload_id, session, offset, min(size, offset + MAX_CHUNK_BYTES), sha256)
+
+    def finish(self, upload_id: str, session: Optional[str]) -> Tuple[dict, str]:
+        """Check a complete upload; returns (meta, path of the finished data file)."""
+        meta = self.meta(upload_id, session)
+        missing = gaps(self.ranges(upload_id), meta["size"])
+        if missing:
+            raise UploadError(409, f"Upload is incomplete: {len(missing)} range(s) missing")
+        data = self._data(upload_id)
+        h = hashlib.sha256()
+        with open(data, "rb") as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                h.update(block)
+        meta["digest"] = h.hexdigest()
+        if meta["sha256"] is not None and meta["digest"] != meta["sha256"]:
+            raise UploadError(422, "File does not match its sha256; the upload was discarded")
+        return meta, data
+
+    def temp_file(self) -> Tuple[int, str]:
+        """An open scratch file beside the uploads, as (fd, path); reaped if left behind."""
+        return tempfile.mkstemp(dir=self.root, prefix=".", suffix=TEMP_SUFFIX)
+
+    def discard(self, upload_id: str, committed: bool = False):
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+        if committed:
+            self.committed += 1
+        else:
+            self.aborted += 1
+
+    def reap(self):
+        """Delete uploads that have not received a chunk within the TTL, and stale scratch files."""
+        cutoff = time.time() - self.ttl_seconds
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if os.stat(path).st_mtime >= cutoff:
+                    continue
+                if UPLOAD_ID_RE.match(name):
+                    shutil.rmtree(path, ignore_errors=True)
+                    self.reaped += 1
+                elif name.endswith(TEMP_SUFFIX):
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+
+    def start_reaper(self, interval: int = REAP_INTERVAL):
+        def run():
+            while True:
+                self.reap()
+                time.sleep(interval)
+        threading.Thread(target=run, name="upload-reaper", daemon=True).start()
+
+    def stats(self) -> dict:
+        return {
+            "active": sum(1 for name in os.listdir(self.root) if UPLOAD_ID_RE.match(name)),
+            "started": self.started,
+            "committed": self.committed,
+            "aborted": self.aborted,
+            "reaped": self.reaped,
+            "chunks": self.chunks,
+            "chunks_rejected": self.rejected,
+            "bytes_received": self.bytes_received,
+            "ttl_seconds": self.ttl_seconds,
+        }
@@ -0,0 +1,273 @@
+# usage.py
+#
+# Disk-usage ledger: bytes, files and folders below every directory of a
+# tree, kept in memory so df, du, /api/files/usage and quota checks never
+# walk the disk. Each mutation calls refresh(path), which re-reads just that
+# path and pushes the difference up its ancestors, O(depth) for a file.
+# Anything the API didn't see (other workers, the session reaper, a shell
+# on the host) is corrected by a periodic full rescan; its "drift" counter
+# says how many directories that rescan found out of date. Refreshes made
+# while a rescan runs are noted and replayed on top of its result, so the
+# swap never loses a change the scan had already passed.
+#
+# Quotas are limits on the bytes and inodes (files + folders) below a
+# directory. They are checked before a write against the ledger's numbers;
+# concurrent writers can overshoot a limit by what they have in flight.
+
+import errno
+import os
+import stat
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+# Full rescans that reconcile the ledger with the disk
+RECONCILE_SECONDS = 600
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+class QuotaExceeded(OSError):
+    def __init__(self, message: str):
+        super().__init__(errno.EDQUOT, message)
+
+    def __str__(self):
+        return self.args[1]
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper().rstrip("B")
+    unit = text[-1] if text and text[-1] in SIZE_UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def human(n: float) -> str:
+    for unit in ("B", "K", "M", "G", "T"):
+        if abs(n) < 1024 or unit == "T":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+class Quota:
+    __slots__ = ("bytes", "inodes")
+
+    def __init__(self, nbytes: Optional[int] = None, inodes: Optional[int] = None):
+        self.bytes = nbytes
+        self.inodes = inodes
+
+    @classmethod
+    def parse(cls, text: str) -> "Quota":
+        """"256M" or "256M:20000" (bytes, then inodes)."""
+        nbytes, _, inodes = text.partition(":")
+        return cls(parse_size(nbytes) if nbytes else None, int(inodes) if inodes else None)
+
+    def to_dict(self) -> dict:
+        return {"bytes": self.bytes, "inodes": self.inodes}
+
+
+def parse_quotas(spec: str) -> Dict[str, Quota]:
+    """"/=256M:20000,/logs=8M" -> {virtual directory: Quota}."""
+    quotas = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        path, _, limit = item.partition("=")
+        quotas["/" + path.strip().strip("/")] = Quota.parse(limit)
+    return quotas
+
+
+class UsageLedger:
+    def __init__(self, root: str):
+        self.root = os.path.normpath(root)
+        self._files: Dict[str, int] = {}                # rel file -> size
+        self._dirs: Dict[str, List[int]] = {}           # rel dir -> [bytes, files, dirs] below it
+        self._children: Dict[str, Set[str]] = {}        # rel dir -> names inside
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()              # one rescan at a time
+        self._pending: Optional[Set[str]] = None         # rels refreshed while a rescan runs
+        self.ready = threading.Event()
+        self.scans = 0
+        self.drift = 0
+        self.refreshes = 0
+        self.scan_seconds = 0.0
+
+    # ---- paths ----
+
+    def _rel(self, path: str) -> Optional[str]:
+        path = os.path.normpath(path)
+        if path == self.root:
+            return ""
+        if not path.startswith(self.root + os.sep):
+            return None
+        return path[len(self.root) + 1:].replace(os.sep, "/")
+
+    @staticmethod
+    def _parent(rel: str) -> str:
+        return rel.rpartition("/")[0]
+
+    @staticmethod
+    def _ancestors(rel: str) -> List[str]:
+        parts = rel.split("/") if rel else []
+        return ["/".join(parts[:i]) for i in range(len(parts))]
+
+    def _join(self, rel: str) -> str:
+        return os.path.join(self.root, *rel.split("/")) if rel else self.root
+
+    # ---- building ----
+
+    def _scan(self, rel: str, files: Dict[str, int], dirs: Dict[str, List[int]],
+              children: Dict[str, Set[str]]) -> Tuple[int, int, int]:
+        """Read ``rel`` from disk into the given maps; returns (bytes, files, dirs) including itself."""
+        path = self._join(rel)
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return 0, 0, 0
+        if not stat.S_ISDIR(st.st_mode):
+            files[rel] = st.st_size
+            return st.st_size, 1, 0
+        totals = [0, 0, 0]
+        names = set()
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            entries = []
+        for entry in entries:
+            names.add(entry.name)
+            sub = self._scan(f"{rel}/{entry.name}" if rel else entry.name, files, dirs, children)
+            for i in range(3):
+                totals[i] += sub[i]
+        dirs[rel] = totals
+        children[rel] = names
+        return totals[0], totals[1], totals[2] + 1
+
+    def build(self):
+        """Rescan the whole tree and swap the result in."""
+        with self._build_lock:
+            start = time.perf_counter()
+            with self._lock:
+                self._pending = set()
+            files: Dict[str, int] = {}
+            dirs: Dict[str, List[int]] = {}
+            children: Dict[str, Set[str]] = {}
+            self._scan("", files, dirs, children)
+            with self._lock:
+                if self.ready.is_set():
+                    self.drift += sum(1 for rel, totals in dirs.items() if self._dirs.get(rel) != totals)
+                self._files, self._dirs, self._children = files, dirs, children
+                # The scan may have read these before they changed
+                pending, self._pending = self._pending, None
+                for rel in sorted(pending):
+                    self._refresh(rel)
+                self.scans += 1
+                self.scan_seconds = time.perf_counter() - start
+            self.ready.set()
+
+    def start(self, interval: int = RECONCILE_SECONDS):
+        def run():
+            while True:
+                self.build()
+                time.sleep(interval)
+        threading.Thread(target=run, name="usage-reconcile", daemon=True).start()
+
+    # ---- incremental updates ----
+
+    def _forget(self, rel: str) -> Tuple[int, int, int]:
+        if rel in self._files:
+            return self._files.pop(rel), 1, 0
+        totals = self._dirs.pop(rel, None)
+        if totals is None:
+            return 0, 0, 0
+        for name in self._children.pop(rel, ()):
+            self._forget(f"{rel}/{name}" if rel else name)
+        return totals[0], totals[1], totals[2] + 1
+
+    def refresh(self, path: str):
+        """Re-read ``path`` (file, folder or something now gone) and update its ancestors."""
+        rel = self._rel(path)
+        if rel is None:
+            return
+        with self._lock:
+            if self._pending is not None:
+                self._pending.add(rel)
+            if self.ready.is_set():
+                self._refresh(rel)
+
+    def _refresh(self, rel: str):
+        # Parents created along the way (makedirs) are taken in as a whole
+        while rel and self._parent(rel) not in self._dirs:
+            rel = self._parent(rel)
+        old = self._forget(rel)
+        new = self._scan(rel, self._files, self._dirs, self._children)
+        if rel:
+            name = rel.rpartition("/")[2]
+            siblings = self._children[self._parent(rel)]
+            if new[1] or new[2]:
+                siblings.add(name)
+            else:
+                siblings.discard(name)
+        delta = [n - o for n, o in zip(new, old)]
+        for ancestor in self._ancestors(rel):
+            totals = self._dirs[ancestor]
+            for i in range(3):
+                totals[i] += delta[i]
+        self.refreshes += 1
+
+    # ---- queries ----
+
+    def totals(self, path: str) -> Optional[Tuple[int, int, int]]:
+        """(bytes, files, folders) at or below ``path``, a folder counting itself; None if unknown."""
+        rel = self._rel(path)
+        if rel is None:
+            return None
+        with self._lock:
+            if rel in self._files:
+                return self._files[rel], 1, 0
+            totals = self._dirs.get(rel)
+            if totals is None:
+                return None
+            return totals[0], totals[1], totals[2] + (1 if rel else 0)
+
+    def children(self, path: str) -> List[Tuple[str, Tuple[int, int, int]]]:
+        rel = self._rel(path)
+        with self._lock:
+            names = sorted(self._children.get(rel, ())) if rel is not None else []
+        return [(name, self.totals(os.path.join(path, name)) or (0, 0, 0)) for name in names]
+
+    def check(self, path: str, limits: List[Tuple[str, Quota]], nbytes: int, inodes: int = 1,
+              replace: bool = True):
+        """Raise QuotaExceeded if adding ``nbytes`` / ``inodes`` at ``path`` overflows a limit.
+
+        With ``replace``, an existing file at ``path`` is credited back first.
+        ``limits`` are (directory, Quota); only those above ``path`` apply.
+        """
+        if not self.ready.is_set():
+            return
+        path = os.path.normpath(path)
+        if replace:
+            existing = self.totals(path)
+            if existing is not None and existing[1] == 1 and existing[2] == 0:
+                nbytes -= existing[0]
+                inodes = 0
+        for directory, quota in limits:
+            directory = os.path.normpath(directory)
+            if path != directory and not path.startswith(directory + os.sep):
+                continue
+            used = self.totals(directory) or (0, 0, 0)
+            if quota.bytes is not None and nbytes > 0 and used[0] + nbytes > quota.bytes:
+                raise QuotaExceeded(f"Disk quota exceeded ({human(used[0])} of {human(quota.bytes)} used)")
+            if quota.inodes is not None and inodes > 0 and used[1] + used[2] + inodes > quota.inodes:
+                raise QuotaExceeded(f"Disk quota exceeded ({quota.inodes} files and folders)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            root = self._dirs.get("", [0, 0, 0])
+            return {
+                "ready": self.ready.is_set(),
+                "bytes": root[0],
+                "files": root[1],
+                "folders": root[2],
+                "tracked": len(self._files) + len(self._dirs),
+                "refreshes": self.refreshes,
+                "scans": self.scans,
+                "scan_ms": round(self.scan_seconds * 1000, 3),
+                "drift": self.drift,
+            }
@@ -0,0 +1,168 @@
+# watcher.py
+#
+# Recursive inotify watch on the files tree, so the change feed also sees
+# changes made outside this process: other workers, a shell on the host,
+# a restored backup. Uses the Linux inotify syscalls through ctypes, so
+# there is nothing to install; elsewhere start() returns False and the feed
+# carries API changes only.
+#
+# Storage writes go through hidden temp files (".name.XXXX.tmp", staged
+# ".lnk" links) that are renamed over the target. Those names are ignored,
+# and a rename from one of them is reported as a write of the target.
+
+import ctypes
+import ctypes.util
+import os
+import re
+import struct
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")     # wd, mask, cookie, name length
+
+TEMP_NAME_RE = re.compile(r"^\..+\.(tmp|lnk)$")
+
+# Kernel events are held this long before dispatch, so the API has published
+# its own changes by then and their echoes can be recognised
+SETTLE_SECONDS = 0.1
+
+
+def _libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") and hasattr(libc, "inotify_add_watch") else None
+
+
+class InotifyWatcher:
+    """Calls ``publish(op, path, dest=None)`` with '/'-rooted paths under ``root``."""
+
+    def __init__(self, root: str, publish: Callable[..., object]):
+        self.root = os.path.normpath(root)
+        self.publish = publish
+        self._libc = _libc()
+        self._fd: Optional[int] = None
+        self._paths: Dict[int, str] = {}        # watch descriptor -> absolute directory
+        self._lock = threading.Lock()
+        self.overflows = 0
+
+    def _virtual(self, path: str) -> str:
+        rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+        return "/" if rel == "." else "/" + rel
+
+    def _watch(self, directory: str, announce: bool = False):
+        """Watch ``directory`` and everything below it.
+
+        With ``announce``, entries already inside are published as created:
+        a new folder can fill up before its watch is in place.
+        """
+        for dirpath, dirnames, filenames in os.walk(directory):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK | IN_ONLYDIR)
+            if wd >= 0:
+                with self._lock:
+                    self._paths[wd] = dirpath
+            if announce:
+                for name in dirnames + [n for n in filenames if not TEMP_NAME_RE.match(n)]:
+                    self.publish("create", self._virtual(os.path.join(dirpath, name)))
+
+    def _renamed_dir(self, old: str, new: str) -> bool:
+        # Watches follow the inode, so only our wd -> path map needs rewriting
+        with self._lock:
+            moved = [wd for wd, path in self._paths.items() if path == old or path.startswith(old + os.sep)]
+            for wd in moved:
+                self._paths[wd] = new + self._paths[wd][len(old):]
+        return bool(moved)
+
+    def start(self) -> bool:
+        if self._libc is None or not os.path.isdir(self.root):
+            return False
+        fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            return False
+        self._fd = fd
+        self._watch(self.root)
+        threading.Thread(target=self._run, name="inotify-watcher", daemon=True).start()
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except OSError:
+                return
+            time.sleep(SETTLE_SECONDS)
+            self._dispatch(data)
+
+    def _dispatch(self, data: bytes):
+        moved_from: Dict[int, str] = {}     # cookie -> source path, paired within one read
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost; tell clients to relist everything
+                self.overflows += 1
+                self.publish("reset", "/")
+                continue
+            with self._lock:
+                directory = self._paths.get(wd)
+                if mask & IN_IGNORED:
+                    self._paths.pop(wd, None)
+            if directory is None or mask & (IN_IGNORED | IN_DELETE_SELF):
+                continue
+            name = os.fsdecode(name)
+            path = os.path.join(directory, name)
+            temp = bool(TEMP_NAME_RE.match(name))
+            is_dir = bool(mask & IN_ISDIR)
+
+            if mask & IN_MOVED_FROM:
+                moved_from[cookie] = path
+            elif mask & IN_MOVED_TO:
+                src = moved_from.pop(cookie, None)
+                if src is not None and TEMP_NAME_RE.match(os.path.basename(src)):
+                    self.publish("write", self._virtual(path))
+                elif src is not None:
+                    self.publish("move", self._virtual(src), self._virtual(path))
+                    if is_dir and not self._renamed_dir(src, path):
+                        # Moved before its own watch was set up
+                        self._watch(path, announce=True)
+                elif not temp:
+                    self.publish("create", self._virtual(path))
+                    if is_dir:
+                        self._watch(path, announce=True)
+            elif temp:
+                continue
+            elif mask & IN_CREATE:
+                self.publish("create", self._virtual(path))
+                if is_dir:
+                    self._watch(path, announce=True)
+            elif mask & IN_CLOSE_WRITE:
+                self.publish("write", self._virtual(path))
+            elif mask & IN_DELETE:
+                self.publish("delete", self._virtual(path))
+
+        # A rename whose other half is outside the tree is a delete from our point of view
+        for src in moved_from.values():
+            if not TEMP_NAME_RE.match(os.path.basename(src)):
+                self.publish("delete", self._virtual(src))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"running": self._fd is not None, "watches": len(self._paths), "overflows": self.overflows}
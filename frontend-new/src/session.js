@@ -0,0 +1,30 @@
+import axios from 'axios';
+
+const API_URL = import.meta.env.VITE_API_URL || (import.meta.env.PROD ? '/api' : 'http://localhost:8000/api');
+const STORAGE_KEY = 'cyber_session_id';
+
+// Each visitor gets a private copy-on-write view of the file system on the
+// server; the id the server hands out is kept across reloads and sent with
+// every API request as X-Session-Id.
+let pending = null;
+
+export const sessionId = () => {
+    const saved = localStorage.getItem(STORAGE_KEY);
+    if (saved) return Promise.resolve(saved);
+    if (!pending) {
+        pending = axios.post(`${API_URL}/sessions`)
+            .then(res => {
+                localStorage.setItem(STORAGE_KEY, res.data.session_id);
+                return res.data.session_id;
+            })
+            .finally(() => { pending = null; });
+    }
+    return pending;
+};
+
+axios.interceptors.request.use(async (config) => {
+    if (config.url.startsWith(API_URL) && config.url !== `${API_URL}/sessions`) {
+        config.headers['X-Session-Id'] = await sessionId();
+    }
+    return config;
+});
@@ -3,6 +3,7 @@ import axios from 'axios';
 
 const API_URL = import.meta.env.VITE_API_URL || (import.meta.env.PROD ? '/api' : 'http://localhost:8000/api');
 
+// Used for hints until the server's command list arrives, or if it can't be reached
 const COMMANDS = [
     'ls', 'cd', 'pwd', 'cat', 'touch', 'rm', 'mkdir', 'cp', 'mv', 'echo',
     'clear', 'help', 'whoami', 'neofetch', 'scan', 'ping', 'traceroute',
@@ -17,6 +18,7 @@ const TerminalWindow = ({ isOpen, onClose, onCommand, history, setHistory, isDra
     const [cmdHistory, setCmdHistory] = useState([]);
     const [historyIndex, setHistoryIndex] = useState(-1);
     const [tabHint, setTabHint] = useState('');
+    const [commands, setCommands] = useState(COMMANDS);
     const [isTyping, setIsTyping] = useState(false);
     const [commandCount, setCommandCount] = useState(() => {
         return parseInt(localStorage.getItem('cyber_cmd_count') || '0');
@@ -37,6 +39,13 @@ const TerminalWindow = ({ isOpen, onClose, onCommand, history, setHistory, isDra
         }
     }, []);
 
+    // Every command the server knows, for live hints
+    useEffect(() => {
+        axios.get(`${API_URL}/terminal/complete`, { params: { line: '', limit: 500 } })
+            .then(res => setCommands(res.data.completions))
+            .catch(() => {});
+    }, []);
+
     // Typewriter effect for response
     const typewriterAppend = useCallback((text, type = 'response') => {
         setIsTyping(true);
@@ -86,14 +95,7 @@ const TerminalWindow = ({ isOpen, onClose, onCommand, history, setHistory, isDra
         // Tab completion
         if (e.key === 'Tab') {
             e.preventDefault();
-            const partial = input.trim().toLowerCase();
-            if (partial) {
-                const match = COMMANDS.find(c => c.startsWith(partial));
-                if (match) {
-                    setInput(match + ' ');
-                    setTabHint('');
-                }
-            }
+            completeInput();
             return;
         }
 
@@ -142,7 +144,7 @@ const TerminalWindow = ({ isOpen, onClose, onCommand, history, setHistory, isDra
             const newInput = e.key.length === 1 ? input + e.key : input;
             const partial = newInput.trim().toLowerCase();
             if (partial && !partial.includes(' ')) {
-                const match = COMMANDS.find(c => c.startsWith(partial) && c !== partial);
+                const match = commands.find(c => c.startsWith(partial) && c !== partial);
                 setTabHint(match ? match.slice(partial.length) : '');
             } else {
                 setTabHint('');
@@ -150,6 +152,36 @@ const TerminalWindow = ({ isOpen, onClose, onCommand, history, setHistory, isDra
         }
     };
 
+    // Commands and paths completed by the server, like a shell: a single match is
+    // inserted whole, several are listed and their common prefix inserted
+    const completeInput = async () => {
+        const line = input;
+        setTabHint('');
+        let data;
+        try {
+            const res = await axios.get(`${API_URL}/terminal/complete`, { params: { line, cwd: currentPath } });
+            data = res.data;
+        } catch (err) {
+            const partial = line.trim().toLowerCase();
+            const match = partial && commands.find(c => c.startsWith(partial));
+            if (match) setInput(match + ' ');
+            return;
+        }
+        const { start, completions, common, suggestions } = data;
+        const before = line.slice(0, start);
+        if (completions.length === 1) {
+            const [only] = completions;
+            setInput(before + only + (only.endsWith('/') ? '' : ' '));
+        } else if (completions.length > 1) {
+            if (common.length > line.length - start) setInput(before + common);
+            setHistory(prev => [...prev,
+                { type: 'user', content: `${getPrompt()} ${line}` },
+                { type: 'response', content: completions.join('  ') }]);
+        } else if (suggestions.length > 0) {
+            setHistory(prev => [...prev, { type: 'system', content: `Did you mean: ${suggestions.join(', ')}` }]);
+        }
+    };
+
     const getPrompt = () => {
         const shortPath = currentPath === '/' ? '/' : currentPath.split('/').pop() || '/';
         return `user@cyber:~${currentPath === '/' ? '' : currentPath}$`;
@@ -206,12 +238,14 @@ const TerminalWindow = ({ isOpen, onClose, onCommand, history, setHistory, isDra
                 }
             } else if (operation === 'cd') {
                 if (!args[1] || args[1] === '~') {
+                    axios.post(`${API_URL}/terminal/command`, { command: 'cd /' }).catch(() => {});
                     setCurrentPath('/');
                     return;
                 }
                 const target = getTarget();
-                res = await axios.get(`${API_URL}/files/list?path=${target}`);
-                if (res.data.error) {
+                // The server keeps the session's cwd too, for the commands it runs
+                res = await axios.post(`${API_URL}/terminal/command`, { command: `cd ${target}` });
+                if (res.data.type === 'error') {
                     throw new Error(`cd: ${args[1]}: No such directory`);
                 } else {
                     setCurrentPath(target);